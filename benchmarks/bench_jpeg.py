@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: capture JPEG pipeline, old (decode full, compress twice) vs new
+(draft-mode decode, skip when already compliant, compress once).
+
+Usage:
+  python benchmarks/bench_jpeg.py                 # synthetic 1280/1920-wide frames
+  python benchmarks/bench_jpeg.py frame1.jpg ...  # real camera frames
+"""
+import os, sys, time
+from io import BytesIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from PIL import Image, ImageDraw
+
+import rpi
+
+ROUNDS = 10
+SETTINGS = [(1280, 75), (960, 70), (640, 60)]   # (max_width, quality) offered by the camera tab
+
+
+def legacy_compress_jpeg(jpg_bytes, max_width=1280, quality=75):
+    """The pre-draft implementation, kept verbatim for comparison."""
+    try:
+        im = Image.open(BytesIO(jpg_bytes))
+        im = im.convert("RGB")
+        w, h = im.size
+        if w > max_width:
+            nh = int(h * (max_width / float(w)))
+            im = im.resize((max_width, nh))
+        out = BytesIO()
+        im.save(out, format="JPEG", quality=quality, optimize=True)
+        return out.getvalue()
+    except Exception:
+        return jpg_bytes
+
+
+def legacy_capture(frame, max_width, quality):
+    # _fetch_camera_snapshot_bytes compressed with defaults, then capture_image again
+    return legacy_compress_jpeg(legacy_compress_jpeg(frame), max_width=max_width, quality=quality)
+
+
+def new_capture(frame, max_width, quality):
+    return rpi._compress_jpeg(frame, max_width=max_width, quality=quality)
+
+
+def synthetic_frame(width, quality=90):
+    im = Image.new("RGB", (width, width * 9 // 16))
+    d = ImageDraw.Draw(im)
+    for y in range(0, im.height, 3):
+        d.line((0, y, im.width, (y * 5) % im.height), fill=((y * 3) % 255, (y * 7) % 255, 160))
+    out = BytesIO()
+    im.save(out, format="JPEG", quality=quality)
+    return out.getvalue()
+
+
+def timed(fn, *args):
+    best = None
+    for _ in range(ROUNDS):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, out
+
+
+def bench(name, frame):
+    w = Image.open(BytesIO(frame)).size[0]
+    print(f"{name}: {w}px wide, {len(frame) / 1024:.0f} KB")
+    for max_width, quality in SETTINGS:
+        t_old, a = timed(legacy_capture, frame, max_width, quality)
+        t_new, b = timed(new_capture, frame, max_width, quality)
+        print(f"  -> {max_width:4d}px q{quality}: legacy {t_old * 1000:7.1f} ms ({len(a) / 1024:5.1f} KB)"
+              f"   new {t_new * 1000:7.1f} ms ({len(b) / 1024:5.1f} KB)   x{t_old / t_new:.1f}")
+
+
+def main(argv):
+    if argv:
+        for path in argv:
+            bench(os.path.basename(path), open(path, "rb").read())
+        return
+    for width in (1280, 1920):
+        bench(f"synthetic {width}", synthetic_frame(width))
+    bench("already compliant 640 q60", synthetic_frame(640, quality=60))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
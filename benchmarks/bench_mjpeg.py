@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark: MjpegDemuxer vs the old byte-by-byte _extract_first_jpeg_from_mjpeg.
+
+Usage:
+  python benchmarks/bench_mjpeg.py                      # synthetic 1280/1920-wide streams
+  python benchmarks/bench_mjpeg.py capture.mjpeg ...    # recorded stream captures
+  python benchmarks/bench_mjpeg.py --record http://192.168.0.164:8080/video 10 capture.mjpeg
+
+A recorded capture is the raw HTTP body of the camera's MJPEG endpoint. The
+Content-Type is stored next to it in <file>.ctype so the boundary is known.
+"""
+import os, sys, time
+from io import BytesIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import requests
+from PIL import Image, ImageDraw
+
+import rpi
+
+CHUNK = 4096
+ROUNDS = 5
+
+
+def legacy_extract_first_jpeg(resp, max_bytes=3_000_000, max_seconds=1.5):
+    """The pre-demuxer implementation, kept verbatim for comparison."""
+    buf = bytearray()
+    start = -1
+    t0 = time.time()
+    for chunk in resp.iter_content(chunk_size=4096):
+        if (time.time() - t0) > max_seconds:
+            break
+        if not chunk:
+            continue
+        buf.extend(chunk)
+        if start < 0:
+            s = buf.find(b"\xff\xd8")
+            if s >= 0:
+                start = s
+        if start >= 0:
+            e = buf.find(b"\xff\xd9", start)
+            if e >= 0:
+                return bytes(buf[start:e+2])
+        if len(buf) > max_bytes:
+            break
+    return None
+
+
+def legacy_iter_frames(resp):
+    """Old-style full-stream loop: re-run the first-frame scan on the remaining bytes."""
+    buf = bytearray()
+    for chunk in resp.iter_content(chunk_size=CHUNK):
+        buf.extend(chunk)
+        while True:
+            s = buf.find(b"\xff\xd8")
+            e = buf.find(b"\xff\xd9", s) if s >= 0 else -1
+            if e < 0:
+                break
+            yield bytes(buf[s:e+2])
+            del buf[:e+2]
+
+
+class RecordedResponse:
+    """Stand-in for a requests streaming response that replays recorded bytes."""
+
+    def __init__(self, data, content_type):
+        self._data = data
+        self.headers = {"Content-Type": content_type}
+
+    def iter_content(self, chunk_size=CHUNK):
+        # Always replay in camera-sized pieces so both parsers see the same chunking.
+        mv = memoryview(self._data)
+        for i in range(0, len(mv), CHUNK):
+            yield bytes(mv[i:i+CHUNK])
+
+
+def synthetic_stream(width, frames=10, boundary="Ba4oTvQMY8ew04N8dcnM"):
+    out = bytearray()
+    for i in range(frames):
+        im = Image.new("RGB", (width, width * 9 // 16))
+        d = ImageDraw.Draw(im)
+        for y in range(0, im.height, 4):
+            d.line((0, y, im.width, (y * 7 + i * 13) % im.height), fill=((y * 3) % 255, (y + i * 40) % 255, 200))
+        b = BytesIO()
+        im.save(b, format="JPEG", quality=90)
+        jpg = b.getvalue()
+        out += f"--{boundary}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpg)}\r\n\r\n".encode()
+        out += jpg + b"\r\n"
+    return bytes(out), f"multipart/x-mixed-replace;boundary={boundary}"
+
+
+def record(url, seconds, path):
+    with requests.get(url, stream=True, timeout=(5, 5)) as resp:
+        with open(path, "wb") as f:
+            t0 = time.time()
+            for chunk in resp.iter_content(chunk_size=CHUNK):
+                f.write(chunk)
+                if time.time() - t0 > seconds:
+                    break
+        with open(path + ".ctype", "w") as f:
+            f.write(resp.headers.get("Content-Type", ""))
+    print(f"recorded {os.path.getsize(path)} bytes to {path}")
+
+
+def best_of(fn):
+    best = None
+    for _ in range(ROUNDS):
+        t0 = time.perf_counter()
+        result = fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, result
+
+
+def bench(name, data, ctype):
+    first_old, a = best_of(lambda: legacy_extract_first_jpeg(RecordedResponse(data, ctype), max_seconds=60))
+    first_new, b = best_of(lambda: rpi._extract_first_jpeg_from_mjpeg(RecordedResponse(data, ctype), max_seconds=60))
+    all_old, n_old = best_of(lambda: sum(1 for _ in legacy_iter_frames(RecordedResponse(data, ctype))))
+    all_new, n_new = best_of(lambda: sum(1 for _ in rpi._iter_mjpeg_frames(RecordedResponse(data, ctype), chunk_size=CHUNK)))
+    mb = len(data) / 1e6
+    print(f"{name}: {mb:.1f} MB, first frame {len(b or b'') / 1024:.0f} KB (same={a == b})")
+    print(f"  first frame  legacy {first_old * 1000:8.2f} ms   demuxer {first_new * 1000:8.2f} ms   x{first_old / first_new:.1f}")
+    print(f"  full stream  legacy {all_old * 1000:8.2f} ms   demuxer {all_new * 1000:8.2f} ms   x{all_old / all_new:.1f}"
+          f"   ({n_old} vs {n_new} frames)")
+
+
+def main(argv):
+    if argv[:1] == ["--record"]:
+        record(argv[1], float(argv[2]), argv[3])
+        return
+    if argv:
+        for path in argv:
+            ctype_path = path + ".ctype"
+            ctype = open(ctype_path).read().strip() if os.path.exists(ctype_path) else "multipart/x-mixed-replace"
+            bench(os.path.basename(path), open(path, "rb").read(), ctype)
+        return
+    for width in (1280, 1920):
+        data, ctype = synthetic_stream(width)
+        bench(f"synthetic {width}px", data, ctype)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bytes per sample of the sync batch codec vs JSON.
+
+Usage:
+  python benchmarks/bench_sync_codec.py                 # synthetic 1 Hz NAV + weather
+  python benchmarks/bench_sync_codec.py ship_data.db    # nav_data / weather_data from a real DB
+
+Compares, for batches of rpi.SYNC_BATCH_ROWS rows:
+  json/sample   one JSON dict per sample (how the Firebase helpers push today)
+  zlib+json     the whole batch as a JSON array of rows, zlib-compressed
+  col1+zlib     rpi.encode_batch (columnar, delta, fixed-point) with zlib
+  col1+zstd     the same with zstd, if the zstandard package is installed
+Sizes are after base64, i.e. what actually goes over the link into Firebase.
+"""
+import base64, json, math, os, random, sqlite3, sys, time, zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import rpi
+
+
+def synthetic_nav(n, t0=1_790_000_000):
+    lat, lon, hdg, spd = 3.006633, 101.380133, 45.0, 8.0
+    rows = []
+    for i in range(n):
+        spd = max(5.0, min(12.0, spd + random.uniform(-0.05, 0.05)))
+        hdg = (hdg + random.uniform(-0.5, 0.5)) % 360
+        d = (spd * 1.852 / 3600) / 111
+        lat += d * math.cos(math.radians(hdg))
+        lon += d * math.sin(math.radians(hdg))
+        rows.append((i + 1, t0 + i, round(lat, 6), round(lon, 6), round(hdg, 1),
+                     round(spd, 1), round((hdg + random.uniform(-2, 2)) % 360, 0)))
+    return ["id", "ts", "latitude", "longitude", "heading", "speed", "cog"], rows
+
+
+def synthetic_weather(n, t0=1_790_000_000):
+    wind, wdir, temp, hum, pres = 5.0, 180.0, 28.0, 75.0, 1013.25
+    rows = []
+    for i in range(n):
+        wind = max(0.0, wind + random.uniform(-0.3, 0.3))
+        wdir = (wdir + random.uniform(-3, 3)) % 360
+        temp += random.uniform(-0.05, 0.05)
+        hum = max(40.0, min(100.0, hum + random.uniform(-0.2, 0.2)))
+        pres += random.uniform(-0.02, 0.02)
+        rows.append((i + 1, t0 + i, round(wind, 1), round(wdir, 0), round(hum, 1), round(temp, 1),
+                     round(pres, 2), random.randint(8, 14), random.randint(15, 25), 0.0, random.randint(38, 45)))
+    return ["id", "ts", "wind_speed", "wind_dir", "humidity", "temperature", "pressure",
+            "pm25", "pm10", "rainfall", "noise"], rows
+
+
+def from_db(path, table, n):
+    con = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    cur = con.execute(f"SELECT * FROM {table} ORDER BY id LIMIT ?", (n,))
+    return [d[0] for d in cur.description], cur.fetchall()
+
+
+def b64len(data):
+    return len(base64.b64encode(data))
+
+
+def bench(name, columns, rows):
+    n = len(rows)
+    per_sample = sum(len(json.dumps(dict(zip(columns, r)))) for r in rows)
+    batch_json = b64len(zlib.compress(json.dumps([list(r) for r in rows], separators=(",", ":")).encode(), 6))
+
+    results = [("json/sample", per_sample, None), ("zlib+json", batch_json, None)]
+    modes = [False, True] if rpi.ZSTD_AVAILABLE else [False]
+    for zstd in modes:
+        rpi.ZSTD_AVAILABLE = zstd
+        t0 = time.perf_counter()
+        codec, data = rpi.encode_batch(columns, rows)
+        enc = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        cols, back = rpi.decode_batch(codec, data)
+        dec = time.perf_counter() - t0
+        assert cols == list(columns) and len(back) == n
+        err = max(abs(a - b) for r, rb in zip(rows, back) for a, b in zip(r, rb)
+                  if isinstance(a, (int, float)) and b is not None)
+        results.append((codec, b64len(data), (enc, dec, err)))
+
+    print(f"{name}: {n} rows x {len(columns)} columns")
+    for label, size, extra in results:
+        line = f"  {label:12s} {size / n:8.2f} B/sample   x{per_sample / size:6.1f} vs json/sample"
+        if extra:
+            enc, dec, err = extra
+            line += f"   encode {enc * 1000:6.1f} ms  decode {dec * 1000:6.1f} ms  max abs error {err:.2g}"
+        print(line)
+
+
+def main(argv):
+    n = rpi.SYNC_BATCH_ROWS
+    if argv:
+        for table in ("nav_data", "weather_data"):
+            bench(table, *from_db(argv[0], table, n))
+        return
+    random.seed(1)
+    bench("synthetic nav 1 Hz", *synthetic_nav(n))
+    bench("synthetic weather 1 Hz", *synthetic_weather(n))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
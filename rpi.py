@@ -18,16 +18,21 @@ SYNC_ENABLED = True
 # -*- coding: utf-8 -*-
 from flask import (
     Flask, render_template_string, jsonify, request, Response,
-    send_file, redirect, url_for, session
+    redirect, url_for, session
 )
 from flask_cors import CORS
-import threading, time, random, math, json, requests, base64, os, uuid
-import sqlite3
-
-from datetime import datetime
+import threading, time, random, math, json, requests, base64, os, uuid, hashlib, atexit
+import gzip, shutil, zlib
+import sqlite3, queue
+from collections import deque
+from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
+
+from datetime import datetime, timezone
 from io import BytesIO, StringIO
 import csv
-from functools import wraps
+from functools import wraps, lru_cache
+from array import array
 # ---------- Firebase (Realtime DB + Storage) ----------
 FIREBASE_ENABLED = False
 
@@ -64,6 +69,13 @@ try:
 except Exception:
     WEASYPRINT_AVAILABLE = False
 
+# Optional zstd for sync batches (falls back to zlib)
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
 # ------------------------------------------------------------------------------
 # CONFIGURATION
 # ------------------------------------------------------------------------------
@@ -73,6 +85,9 @@ CAMERA_USERNAME = ""
 CAMERA_PASSWORD = ""
 AUTO_FALLBACK_TO_DEMO = True
 CAMERA_CONNECTION_TIMEOUT = 5
+CAMERA_MAX_CONNECTIONS = 3      # hard cap on sockets open to the camera (stream relay + probes/snapshots)
+# Optional single-JPEG endpoint (Android IP Webcam: http://<ip>:8080/shot.jpg). Served over keep-alive.
+CAMERA_SNAPSHOT_URL = None
 # ---------- Firebase Config ----------
 FIREBASE_KEY_PATH = os.path.join(os.path.dirname(__file__), "firebase_key.json")
 FIREBASE_DB_URL = "https://gds-vessel-simulator-default-rtdb.asia-southeast1.firebasedatabase.app"
@@ -81,6 +96,10 @@ VESSEL_ID = "demo_vessel"
 # Local offline database
 LOCAL_DB_ENABLED = True
 LOCAL_DB_PATH = "/home/rpi2/ship_system/db/ship_data.db"
+DB_READ_POOL_SIZE = 4   # idle read-only connections kept open for the polling endpoints
+# Captured JPEGs: "disk" (files under CAPTURE_STORE_DIR) or "sqlite" (BLOB table in LOCAL_DB_PATH)
+CAPTURE_STORE_BACKEND = "disk"
+CAPTURE_STORE_DIR = os.path.join(os.path.dirname(__file__), "captures")
 
 # Logo file in same folder
 LOGO_FILE = os.path.join(os.path.dirname(__file__), "GDS Logo.jpg")
@@ -122,6 +141,7 @@ camera_controls = {
     "led_brightness": 50, "led_enabled": False,
     "night_vision": False, "autofocus": True, "white_balance": "auto"
 }
+# Capture metadata only; the JPEG bytes live in capture_store, keyed by "sha256"
 captured_images = {"vjr_images": [], "vdr_images": []}
 
 nav_lock = threading.Lock()
@@ -131,7 +151,6 @@ camera_lock = threading.Lock()
 image_lock = threading.Lock()
 sync_lock = threading.Lock()
 
-nav_history = []
 nav_current = {
     "latitude": None,
     "longitude": None,
@@ -161,6 +180,9 @@ ptz_sync_enabled = False
 
 MAX_NAV_HISTORY = 800
 MAX_CAPTURE_IMAGES = 50
+CAPTURE_MAX_KB = 80          # per-image limit in DB-only mode
+CAPTURE_MIN_QUALITY = 35     # adaptive encoder never goes below this JPEG quality
+CAPTURE_MAX_ENCODES = 10     # hard cap on encode attempts per capture
 # ---------- Firebase init (run once) ----------
 _firebase_ready = False
 _firebase_lock = threading.Lock()
@@ -263,41 +285,78 @@ def firebase_marinelite_listener():
     ref.listen(_on_change)
 
 
-def upload_jpeg_to_firebase_storage(jpg_bytes: bytes, report_type: str):
-    """
-    Upload bytes to Firebase Storage and return (public_url, object_path).
-    Note: For production, prefer signed URLs or authenticated access; public is fine for testing.
+def _db_connect():
+    con = sqlite3.connect(LOCAL_DB_PATH, timeout=30, check_same_thread=False)
+    con.execute("PRAGMA journal_mode=WAL;")
+    return con
+
+
+class SQLiteReadPool:
+    """Pool of read-only connections to LOCAL_DB_PATH for the polling hot path.
+
+    Connections are opened once in read-only URI mode (query_only, so a bug can
+    never write from the web process) and handed out via connection(). Python's
+    sqlite3 keeps a per-connection prepared-statement cache, so reusing the same
+    SQL text also skips re-preparing the query. In WAL mode every SELECT sees the
+    latest committed row without blocking the ingest writer.
     """
-    if not init_firebase():
-        return None, None
 
-    ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    uid = uuid.uuid4().hex[:10]
-    report_type = (report_type or "vdr").lower()
-    object_path = f"vessels/{VESSEL_ID}/captures/{report_type}/{ts}_{uid}.jpg"
+    def __init__(self, size=DB_READ_POOL_SIZE):
+        self._idle = queue.LifoQueue(maxsize=size)
 
-    bucket = storage.bucket()
-    blob = bucket.blob(object_path)
-    blob.upload_from_string(jpg_bytes, content_type="image/jpeg")
+    def open_connection(self):
+        """A new read-only connection (not pooled; caller closes it)."""
+        con = sqlite3.connect(
+            f"file:{LOCAL_DB_PATH}?mode=ro", uri=True, timeout=5,
+            check_same_thread=False, cached_statements=64,
+        )
+        con.execute("PRAGMA query_only=ON")
+        con.execute("PRAGMA cache_size=-2048")      # 2 MB page cache per connection
+        con.execute("PRAGMA mmap_size=16777216")    # read pages via mmap instead of read()
+        return con
 
-    # For testing convenience (public). You can harden later.
-    blob.make_public()
-    return blob.public_url, object_path
+    @contextmanager
+    def connection(self):
+        try:
+            path, con = self._idle.get_nowait()
+        except queue.Empty:
+            path, con = LOCAL_DB_PATH, self.open_connection()
+        healthy = False
+        try:
+            yield con
+            healthy = True
+        finally:
+            # Broken connections (and ones to a path that has since changed) are not reused.
+            if healthy and path == LOCAL_DB_PATH:
+                try:
+                    self._idle.put_nowait((path, con))
+                    con = None
+                except queue.Full:
+                    pass
+            if con is not None:
+                con.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait()[1].close()
+            except queue.Empty:
+                return
+
+
+db_read_pool = SQLiteReadPool()
 
-def _db_connect():
-    con = sqlite3.connect(LOCAL_DB_PATH, timeout=30, check_same_thread=False)
-    con.execute("PRAGMA journal_mode=WAL;")
-    return con
 
+def db_get_latest_marinelite(con=None):
+    if con is None:
+        with db_read_pool.connection() as con:
+            return db_get_latest_marinelite(con)
 
-def db_get_latest_marinelite():
-    con = sqlite3.connect(LOCAL_DB_PATH)
     row = con.execute("""
         SELECT ts, latitude, longitude, heading
         FROM nav_data
         ORDER BY id DESC LIMIT 1
     """).fetchone()
-    con.close()
 
     if not row:
         return {}
@@ -312,15 +371,17 @@ def db_get_latest_marinelite():
 
 
 
-def db_get_latest_weather():
-    con = sqlite3.connect(LOCAL_DB_PATH)
+def db_get_latest_weather(con=None):
+    if con is None:
+        with db_read_pool.connection() as con:
+            return db_get_latest_weather(con)
+
     row = con.execute("""
         SELECT ts, wind_speed, wind_dir, humidity, temperature,
                pressure, pm25, pm10, rainfall, noise
         FROM weather_data
         ORDER BY id DESC LIMIT 1
     """).fetchone()
-    con.close()
 
     if not row:
         return {}
@@ -339,9 +400,376 @@ def db_get_latest_weather():
     }
 
 
+SENSOR_CACHE_CHECK_INTERVAL = 0.25   # seconds between PRAGMA data_version checks
+
+
+class LatestSampleCache:
+    """Latest nav_data / weather_data row, re-queried only when the table changed.
+
+    A single watcher connection polls PRAGMA data_version, which only moves when
+    another connection (the ingest process) commits. When it moves, max(id) per
+    table (an O(log n) primary-key probe) tells which table actually got a new
+    row, and only that one is re-read. Checks are rate-limited globally, so the
+    cost no longer grows with the number of polling browser tabs.
+    """
+
+    LOADERS = {
+        "nav_data": db_get_latest_marinelite,
+        "weather_data": db_get_latest_weather,
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._con = None
+        self._path = None
+        self._version = None
+        self._checked = 0.0
+        self._max_ids = {}
+        self._values = {}
+
+    def _refresh(self):
+        if self._con is None or self._path != LOCAL_DB_PATH:
+            self.close()
+            self._con = db_read_pool.open_connection()
+            self._path = LOCAL_DB_PATH
+        version = self._con.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._version and len(self._values) == len(self.LOADERS):
+            return
+        for table, loader in self.LOADERS.items():
+            max_id = self._con.execute(f"SELECT max(id) FROM {table}").fetchone()[0]
+            if table not in self._values or max_id != self._max_ids.get(table):
+                self._values[table] = loader(self._con)
+                self._max_ids[table] = max_id
+        self._version = version
+
+    def get(self, table):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked >= SENSOR_CACHE_CHECK_INTERVAL or table not in self._values:
+                try:
+                    self._refresh()
+                except sqlite3.Error:
+                    self.close()
+                    raise
+                self._checked = now
+            return dict(self._values.get(table) or {})
+
+    def close(self):
+        if self._con is not None:
+            try:
+                self._con.close()
+            except Exception:
+                pass
+        self._con = None
+        self._version = None
+        self._max_ids.clear()
+        self._values.clear()
+
+
+sensor_cache = LatestSampleCache()
+
+
+# ------------------------------------------------------------------------------
+# LOCAL DB SCHEMA (indexes, version, maintenance)
+# ------------------------------------------------------------------------------
+
+SCHEMA_CHECK_INTERVAL = 60               # seconds between checks for a missing DB / pending migrations
+SCHEMA_MAINTENANCE_INTERVAL = 6 * 3600   # seconds between ANALYZE / PRAGMA optimize runs
+SCHEMA_ANALYSIS_LIMIT = 1000             # rows sampled per index, keeps ANALYZE cheap on SD
+
+# (version, description, tables it needs, statements). The ingest process owns the
+# sensor tables; a migration whose tables do not exist yet is retried later.
+SCHEMA_MIGRATIONS = [
+    (1, "ts indexes on sensor tables", ("nav_data", "weather_data"), (
+        # covering: time-range track scans never touch the table b-tree
+        "CREATE INDEX IF NOT EXISTS idx_nav_data_ts ON nav_data(ts, latitude, longitude, heading)",
+        # weather rows are wide; covering them would double the table on SD, so ts only
+        "CREATE INDEX IF NOT EXISTS idx_weather_data_ts ON weather_data(ts)",
+    )),
+    (2, "sensor rollup tables", (), (
+        """CREATE TABLE IF NOT EXISTS sensor_rollup (
+            source TEXT NOT NULL,
+            resolution INTEGER NOT NULL,
+            metric TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            vmin REAL, vmax REAL, vsum REAL,
+            vx REAL, vy REAL,
+            vlast REAL, last_ts REAL,
+            PRIMARY KEY (source, resolution, metric, bucket)
+        ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS rollup_state (
+            source TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL
+        )""",
+    )),
+    (3, "rollup time index for sync", (), (
+        "CREATE INDEX IF NOT EXISTS idx_sensor_rollup_res_bucket ON sensor_rollup(resolution, bucket)",
+    )),
+]
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+
+def _table_exists(con, table):
+    return con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)
+    ).fetchone() is not None
+
+
+def db_schema_version(con):
+    """Highest migration recorded in dashboard_schema (0 if none)."""
+    if not _table_exists(con, "dashboard_schema"):
+        return 0
+    return con.execute("SELECT coalesce(max(version), 0) FROM dashboard_schema").fetchone()[0]
+
+
+def migrate_schema(con):
+    """Apply pending SCHEMA_MIGRATIONS in order; returns the resulting version.
+
+    Each migration runs in its own transaction together with its dashboard_schema
+    row. Building an index on a large table holds the write lock for a while; the
+    ingest writer simply waits on its busy timeout.
+    """
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS dashboard_schema (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at REAL NOT NULL
+        )
+    """)
+    con.commit()
+    current = db_schema_version(con)
+    applied = False
+    for version, description, tables, statements in SCHEMA_MIGRATIONS:
+        if version <= current:
+            continue
+        if not all(_table_exists(con, t) for t in tables):
+            break
+        with con:
+            con.execute("BEGIN")    # sqlite3 does not open a transaction before DDL by itself
+            for sql in statements:
+                con.execute(sql)
+            con.execute(
+                "INSERT INTO dashboard_schema (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, description, time.time()),
+            )
+        print(f"DB schema migrated to v{version}: {description}")
+        current = version
+        applied = True
+    if applied:
+        optimize_db(con)
+    return current
+
+
+def optimize_db(con):
+    """Refresh planner statistics (bounded by SCHEMA_ANALYSIS_LIMIT) so ts ranges keep using the indexes."""
+    con.execute(f"PRAGMA analysis_limit={int(SCHEMA_ANALYSIS_LIMIT)}")
+    con.execute("ANALYZE")
+    con.execute("PRAGMA optimize")
+    con.commit()
+
+
+def schema_maintenance_worker():
+    last_optimize = time.monotonic()
+    while True:
+        try:
+            # never create an empty database next to the ingest process
+            if LOCAL_DB_ENABLED and os.path.exists(LOCAL_DB_PATH):
+                con = _db_connect()
+                try:
+                    if db_schema_version(con) < SCHEMA_VERSION:
+                        migrate_schema(con)
+                        last_optimize = time.monotonic()
+                    elif time.monotonic() - last_optimize >= SCHEMA_MAINTENANCE_INTERVAL:
+                        optimize_db(con)
+                        last_optimize = time.monotonic()
+                finally:
+                    con.close()
+        except sqlite3.Error as e:
+            print("DB schema maintenance error:", e)
+        time.sleep(SCHEMA_CHECK_INTERVAL)
+
+
+# ------------------------------------------------------------------------------
+# SENSOR ROLLUPS (1 min / 10 min / 1 h)
+# ------------------------------------------------------------------------------
+
+ROLLUP_RESOLUTIONS = (60, 600, 3600)    # seconds; the first one is built from raw rows
+ROLLUP_BATCH_ROWS = 5000
+ROLLUP_INTERVAL = 30                    # seconds between catch-up passes
+ROLLUP_DEFAULT_SPAN = {60: 86400, 600: 7 * 86400, 3600: 30 * 86400}
+
+ROLLUP_METRICS = {
+    "nav_data": ("speed", "cog", "heading", "latitude", "longitude"),
+    "weather_data": ("wind_speed", "wind_dir", "humidity", "temperature",
+                     "pressure", "pm25", "pm10", "rainfall", "noise"),
+}
+# angles are averaged as unit vectors (vx, vy) so 359 and 1 average to 0, not 180
+ROLLUP_CIRCULAR = {"cog", "heading", "wind_dir"}
+ROLLUP_SOURCES = {"nav": "nav_data", "weather": "weather_data"}
+
+
+def _rollup_columns(con, table):
+    cols = {r[1] for r in con.execute(f"PRAGMA table_info({table})")}
+    return [m for m in ROLLUP_METRICS[table] if m in cols]
+
+
+def _rollup_fold(acc, key, n, vmin, vmax, vsum, vx, vy, vlast, last_ts):
+    a = acc.get(key)
+    if a is None:
+        acc[key] = [n, vmin, vmax, vsum, vx, vy, vlast, last_ts]
+        return
+    a[0] += n
+    a[1] = min(a[1], vmin)
+    a[2] = max(a[2], vmax)
+    a[3] += vsum
+    if vx is not None:
+        a[4] += vx
+        a[5] += vy
+    if last_ts >= a[7]:
+        a[6], a[7] = vlast, last_ts
+
+
+def rollup_batch(con, source):
+    """Fold the next ROLLUP_BATCH_ROWS raw rows of `source` into sensor_rollup.
+
+    The aggregates and the rollup_state high-water mark (last raw id consumed)
+    are written in one transaction, so a restart resumes exactly where the last
+    committed batch stopped. Existing buckets are merged, not overwritten, which
+    makes partial minutes at batch edges come out right. Returns rows consumed.
+    """
+    metrics = _rollup_columns(con, source)
+    row = con.execute("SELECT last_id FROM rollup_state WHERE source=?", (source,)).fetchone()
+    last_id = row[0] if row else 0
+    rows = con.execute(
+        f"SELECT id, ts, {', '.join(metrics)} FROM {source} WHERE id > ? ORDER BY id LIMIT ?",
+        (last_id, ROLLUP_BATCH_ROWS),
+    ).fetchall() if metrics else []
+    if not rows:
+        return 0
+
+    base = ROLLUP_RESOLUTIONS[0]
+    acc = {}    # (resolution, metric, bucket) -> [n, vmin, vmax, vsum, vx, vy, vlast, last_ts]
+    for r in rows:
+        try:
+            ts = float(r[1])
+        except (TypeError, ValueError):
+            continue
+        bucket = int(ts // base) * base
+        for metric, v in zip(metrics, r[2:]):
+            if v is None:
+                continue
+            v = float(v)
+            if metric in ROLLUP_CIRCULAR:
+                rad = math.radians(v)
+                vx, vy = math.cos(rad), math.sin(rad)
+            else:
+                vx = vy = None
+            _rollup_fold(acc, (base, metric, bucket), 1, v, v, v, vx, vy, v, ts)
+
+    # coarser levels fold the (few) 1-minute partials instead of the raw rows
+    for (_, metric, bucket), a in list(acc.items()):
+        for res in ROLLUP_RESOLUTIONS[1:]:
+            _rollup_fold(acc, (res, metric, bucket // res * res), *a)
+
+    with con:
+        con.executemany("""
+            INSERT INTO sensor_rollup (source, resolution, metric, bucket, n, vmin, vmax, vsum, vx, vy, vlast, last_ts)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (source, resolution, metric, bucket) DO UPDATE SET
+                n = n + excluded.n,
+                vmin = min(vmin, excluded.vmin),
+                vmax = max(vmax, excluded.vmax),
+                vsum = vsum + excluded.vsum,
+                vx = vx + excluded.vx,
+                vy = vy + excluded.vy,
+                vlast = CASE WHEN excluded.last_ts >= last_ts THEN excluded.vlast ELSE vlast END,
+                last_ts = max(last_ts, excluded.last_ts)
+        """, [(source, res, metric, bucket, *a) for (res, metric, bucket), a in acc.items()])
+        con.execute(
+            "INSERT OR REPLACE INTO rollup_state (source, last_id) VALUES (?, ?)",
+            (source, rows[-1][0]),
+        )
+    return len(rows)
+
+
+def rollup_worker():
+    while True:
+        try:
+            if LOCAL_DB_ENABLED and os.path.exists(LOCAL_DB_PATH):
+                con = _db_connect()
+                try:
+                    if db_schema_version(con) >= 2:
+                        for source in ROLLUP_METRICS:
+                            if not _table_exists(con, source):
+                                continue
+                            while rollup_batch(con, source) == ROLLUP_BATCH_ROWS:
+                                time.sleep(0.05)    # let the ingest writer in between batches
+                finally:
+                    con.close()
+        except sqlite3.Error as e:
+            print("Rollup error:", e)
+        time.sleep(ROLLUP_INTERVAL)
+
+
+def db_get_rollup(source, resolution, t_from, t_to, metrics=None):
+    """{metric: [[bucket, n, min, max, mean, last], ...]} for one resolution and time range."""
+    sql = """
+        SELECT metric, bucket, n, vmin, vmax, vsum, vx, vy, vlast
+        FROM sensor_rollup
+        WHERE source = ? AND resolution = ? AND bucket >= ? AND bucket <= ?
+    """
+    args = [source, resolution, int(t_from // resolution * resolution), int(t_to)]
+    if metrics:
+        sql += f" AND metric IN ({', '.join('?' * len(metrics))})"
+        args.extend(metrics)
+    sql += " ORDER BY metric, bucket"
+
+    series = {}
+    with db_read_pool.connection() as con:
+        for metric, bucket, n, vmin, vmax, vsum, vx, vy, vlast in con.execute(sql, args):
+            if vx is not None:
+                mean = math.degrees(math.atan2(vy, vx)) % 360.0
+            else:
+                mean = vsum / n
+            series.setdefault(metric, []).append([bucket, n, vmin, vmax, mean, vlast])
+    return series
+
+
+@app.route("/api/rollup/<source>")
+def api_rollup(source):
+    """Precomputed aggregates: /api/rollup/nav|weather?resolution=60|600|3600&from=&to=&metrics=a,b"""
+    table = ROLLUP_SOURCES.get(source)
+    if table is None:
+        return jsonify({"error": f"source must be one of {sorted(ROLLUP_SOURCES)}"}), 404
+    try:
+        resolution = int(request.args.get("resolution", ROLLUP_RESOLUTIONS[0]))
+        t_to = _parse_time_arg(request.args.get("to"), time.time())
+        t_from = _parse_time_arg(request.args.get("from"), t_to - ROLLUP_DEFAULT_SPAN.get(resolution, 86400))
+    except Exception:
+        return jsonify({"error": "from/to must be epoch seconds or ISO-8601"}), 400
+    if resolution not in ROLLUP_RESOLUTIONS:
+        return jsonify({"error": f"resolution must be one of {list(ROLLUP_RESOLUTIONS)}"}), 400
+    metrics = [m for m in request.args.get("metrics", "").split(",") if m]
+
+    try:
+        series = db_get_rollup(table, resolution, t_from, t_to, metrics)
+    except sqlite3.Error as e:
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({
+        "source": source,
+        "resolution": resolution,
+        "from": t_from,
+        "to": t_to,
+        "fields": ["bucket", "n", "min", "max", "mean", "last"],
+        "series": series,
+    })
+
+
 def push_capture_event_to_firebase(report_type: str, image_url: str, object_path: str, enc_cfg: dict):
-    """Store capture metadata + NAV snapshot in Realtime DB."""
-    if not init_firebase():
+    """Queue capture metadata + NAV snapshot for the Realtime DB (firebase_writer; returns at once)."""
+    if not FIREBASE_ENABLED:
         return False
 
     # snapshot nav at capture time
@@ -368,46 +796,601 @@ def push_capture_event_to_firebase(report_type: str, image_url: str, object_path
         "source": "IP_CAMERA",
     }
 
-    db.reference(f"vessels/{VESSEL_ID}/captures").push(payload)
+    firebase_writer.push(f"vessels/{VESSEL_ID}/captures", payload)
     return True
 
 # Navigation logging (persistent)
 NAV_LOG_FILE = os.path.join(os.path.dirname(__file__), "nav_log.csv")
-nav_log_lock = threading.Lock()
+NAV_LOG_FIELDS = ["date","time","latitude","longitude","speed","cog","heading","voltage","panic","ext_heading","raw_string"]
+NAV_LOG_FLUSH_ROWS = 30       # write a batch once this many samples are queued...
+NAV_LOG_FLUSH_SECONDS = 5     # ...or this long after the oldest queued sample
+NAV_LOG_FSYNC_SECONDS = 30    # fsync cadence; power loss costs at most FLUSH + FSYNC seconds of log
+NAV_LOG_QUEUE_MAX = 3600      # samples held while the SD card stalls (oldest dropped beyond this)
+NAV_LOG_DIR = os.path.join(os.path.dirname(__file__), "nav_log")   # rotated, gzipped segments
+NAV_LOG_ROTATE_BYTES = 16 * 1024 * 1024   # rotate at this size, and at local midnight
+NAV_LOG_SEGMENT_TIME_FMT = "%Y%m%dT%H%M%S"
+
+
+@lru_cache(maxsize=64)
+def _nav_date_epoch(date_str):
+    return datetime.strptime(date_str, "%d/%m/%Y").timestamp()
+
 
-def _ensure_nav_log_header():
-    """Create nav log file with header if it does not exist."""
+def _nav_row_epoch(date_str, time_str):
+    """Epoch seconds of a NAV log row ("dd/mm/YYYY", "HH:MM:SS", local time), or None."""
     try:
-        if not os.path.exists(NAV_LOG_FILE) or os.path.getsize(NAV_LOG_FILE) == 0:
-            with nav_log_lock:
-                with open(NAV_LOG_FILE, "a", newline="", encoding="utf-8") as f:
-                    w = csv.writer(f)
-                    w.writerow(["date","time","latitude","longitude","speed","cog","heading","voltage","panic","ext_heading","raw_string"])
-    except Exception:
-        pass
+        h, m, sec = time_str.split(":")
+        return _nav_date_epoch(date_str) + int(h) * 3600 + int(m) * 60 + float(sec)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+nav_manifest_lock = threading.Lock()
+
+def _nav_manifest_path():
+    return os.path.join(NAV_LOG_DIR, "manifest.json")
+
+def _nav_manifest_load():
+    try:
+        with open(_nav_manifest_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+def _nav_manifest_save(entries):
+    tmp = _nav_manifest_path() + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entries, f, indent=1)
+    os.replace(tmp, _nav_manifest_path())
+
+
+def _nav_segment_entry(path):
+    """Manifest entry of a segment file; its time range is in its name (nav_log_<start>_<end>[.n].csv)."""
+    name = os.path.basename(path)
+    start_s, end_s = name[len("nav_log_"):].split(".")[0].split("_")
+    fmt = NAV_LOG_SEGMENT_TIME_FMT
+    return {
+        "file": name,
+        "start": datetime.strptime(start_s, fmt).timestamp(),
+        "end": datetime.strptime(end_s, fmt).timestamp(),
+        "bytes": os.path.getsize(path),
+    }
+
+
+def _nav_manifest_put(entry, replaces=None):
+    with nav_manifest_lock:
+        entries = [e for e in _nav_manifest_load() if e["file"] not in (entry["file"], replaces)]
+        entries.append(entry)
+        entries.sort(key=lambda e: e["start"])
+        _nav_manifest_save(entries)
+
+
+def _compress_nav_segment(csv_path):
+    """gzip a closed segment, swap it in for the plain file in the manifest and drop the plain file.
+
+    An interrupted compression is simply redone by recover_nav_segments().
+    """
+    gz_path = csv_path + ".gz"
+    with open(csv_path, "rb") as src, gzip.open(gz_path + ".tmp", "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.replace(gz_path + ".tmp", gz_path)
+    entry = dict(_nav_segment_entry(csv_path), file=os.path.basename(gz_path),
+                 compressed_bytes=os.path.getsize(gz_path))
+    _nav_manifest_put(entry, replaces=os.path.basename(csv_path))
+    os.remove(csv_path)
+    return entry
+
+
+def _nav_open_log(path):
+    """Open a log file or segment for reading; a segment listed as plain .csv may have been gzipped since."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    try:
+        return open(path, "rb")
+    except FileNotFoundError:
+        if not os.path.exists(path + ".gz"):
+            raise
+        return gzip.open(path + ".gz", "rb")
+
+
+def recover_nav_segments():
+    """Compress segments left uncompressed by a crash or power loss mid-rotation."""
+    try:
+        names = sorted(os.listdir(NAV_LOG_DIR))
+    except FileNotFoundError:
+        return
+    for name in names:
+        if name.startswith("nav_log_") and name.endswith(".csv"):
+            try:
+                _compress_nav_segment(os.path.join(NAV_LOG_DIR, name))
+            except (OSError, ValueError) as e:
+                print("NAV log segment recovery failed:", name, e)
+
+
+def nav_log_segments(t_from=None, t_to=None):
+    """Manifest entries (with absolute "path") whose time range overlaps [t_from, t_to]."""
+    with nav_manifest_lock:
+        entries = _nav_manifest_load()
+    out = []
+    for e in entries:
+        if t_from is not None and e["end"] < t_from:
+            continue
+        if t_to is not None and e["start"] > t_to:
+            continue
+        out.append(dict(e, path=os.path.join(NAV_LOG_DIR, e["file"])))
+    return out
+
+
+class NavLogWriter:
+    """Buffered, batched writer for the navigation CSV log.
+
+    append() only queues the row. One daemon thread keeps the file handle open,
+    writes queued rows in batches and fsyncs on a cadence, so the SD card sees a
+    64 KB-buffered write every few seconds instead of an open/write/close (plus two
+    stats) per sample. If the file is moved away or deleted externally, the next
+    batch reopens it and starts it with a fresh header.
+
+    The writer also rotates the file itself, at NAV_LOG_ROTATE_BYTES or when the
+    local date changes. The closed segment is renamed into NAV_LOG_DIR with its
+    time range in the name and listed in manifest.json before the file lock is
+    released, so an export never misses it; it is gzipped outside the lock
+    (appends keep queueing meanwhile).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.dropped = 0
+        self._cond = threading.Condition()   # guards _pending / _first_at
+        self._pending = []
+        self._first_at = 0.0
+        self._io_lock = threading.Lock()     # guards the file handle; taken before _cond
+        self._f = None
+        self._writer = None
+        self._ino = None
+        self._seg_start = None     # sample time (epoch) of the live file's first / last row
+        self._seg_end = None
+        self._dirty = False
+        self._last_sync = time.monotonic()
+        self._thread = None
+
+    def append(self, row):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            if not self._pending:
+                self._first_at = time.monotonic()
+            self._pending.append(row)
+            if len(self._pending) > NAV_LOG_QUEUE_MAX:
+                del self._pending[0]
+                self.dropped += 1
+            if len(self._pending) == 1 or len(self._pending) >= NAV_LOG_FLUSH_ROWS:
+                self._cond.notify()
+
+    def flush(self, sync=False):
+        """Write everything queued so far (in order); fsync if asked or if the cadence is due."""
+        rotated = None
+        with self._io_lock:
+            with self._cond:
+                rows, self._pending = self._pending, []
+            try:
+                if self._f is not None and self._replaced():
+                    self._close_file()
+                if self._f is None:
+                    self._open()
+                first_ts = self._row_epoch(rows[0]) if rows else None
+                if self._due_for_rotation(first_ts):
+                    rotated = self._rotate()
+                if rows:
+                    self._writer.writerows(rows)
+                    self._f.flush()
+            except (OSError, ValueError):
+                # SD card full, directory gone...: keep the batch for the next tick
+                self._requeue(rows)
+                self._close_file()
+                raise
+            if rows:
+                self._dirty = True
+                if self._seg_start is None:
+                    self._seg_start = first_ts
+                self._seg_end = self._row_epoch(rows[-1])
+            if sync or time.monotonic() - self._last_sync >= NAV_LOG_FSYNC_SECONDS:
+                self._sync()
+        if rotated:
+            _compress_nav_segment(rotated)
+
+    def _requeue(self, rows):
+        """Put a batch that failed to write back in front of the queue, within NAV_LOG_QUEUE_MAX."""
+        with self._cond:
+            if not self._pending:
+                self._first_at = time.monotonic()
+            self._pending[:0] = rows
+            over = len(self._pending) - NAV_LOG_QUEUE_MAX
+            if over > 0:
+                del self._pending[:over]
+                self.dropped += over
+
+    def export_snapshot(self, t_from=None, t_to=None):
+        """Flush, then under the file lock: (segments overlapping the window, open live
+        file, its size, its segment start).
+
+        Taking the manifest and the live handle together means a rotation afterwards
+        cannot hide rows: the handle keeps reading the renamed file up to `size`.
+        Bytes past size may be mid-write.
+        """
+        self.flush()
+        with self._io_lock:
+            segments = nav_log_segments(t_from, t_to)
+            f = open(self.path, "rb")
+            size = self._f.tell() if self._f is not None else os.fstat(f.fileno()).st_size
+            return segments, f, size, self._seg_start
+
+    @staticmethod
+    def _row_epoch(row):
+        """Sample time of a queued row (its date/time columns), else now."""
+        ts = _nav_row_epoch(row[0], row[1]) if len(row) > 1 else None
+        return ts if ts is not None else time.time()
+
+    def _due_for_rotation(self, next_ts):
+        if self._seg_start is None:
+            return False
+        if self._f.tell() >= NAV_LOG_ROTATE_BYTES:
+            return True
+        if next_ts is None:
+            return False
+        return datetime.fromtimestamp(self._seg_start).date() != datetime.fromtimestamp(next_ts).date()
+
+    def _rotate(self):
+        """Move the live file into NAV_LOG_DIR (caller holds _io_lock); returns its new path.
+
+        The segment is named after the sample times of its first and last rows, which
+        is what range exports match against.
+        """
+        fmt = NAV_LOG_SEGMENT_TIME_FMT
+        start = datetime.fromtimestamp(self._seg_start).strftime(fmt)
+        end = datetime.fromtimestamp(self._seg_end or time.time()).strftime(fmt)
+        os.makedirs(NAV_LOG_DIR, exist_ok=True)
+        dest = os.path.join(NAV_LOG_DIR, f"nav_log_{start}_{end}.csv")
+        n = 1
+        while os.path.exists(dest) or os.path.exists(dest + ".gz"):
+            dest = os.path.join(NAV_LOG_DIR, f"nav_log_{start}_{end}.{n}.csv")
+            n += 1
+        self._close_file()
+        os.replace(self.path, dest)
+        try:
+            _nav_manifest_put(_nav_segment_entry(dest))
+        except (OSError, ValueError) as e:
+            print("NAV log manifest update failed:", e)
+        self._open()
+        return dest
+
+    def close(self):
+        if self._f is None and not self._pending:
+            return          # never written: do not create the log just to close it
+        try:
+            self.flush(sync=True)
+        except OSError:
+            pass
+        with self._io_lock:
+            self._close_file()
+
+    def _open(self):
+        f = open(self.path, "a", newline="", encoding="utf-8", buffering=64 * 1024)
+        if f.tell() == 0:
+            csv.writer(f).writerow(NAV_LOG_FIELDS)
+            self._seg_start = None
+            self._seg_end = None
+        else:
+            self._seg_start = self._existing_start()
+            self._seg_end = os.path.getmtime(self.path) if self._seg_start is not None else None
+        self._f, self._writer = f, csv.writer(f)
+        self._ino = os.fstat(f.fileno()).st_ino
+
+    def _existing_start(self):
+        """Segment start of a log left by a previous run: its first row, else its mtime (None if no rows)."""
+        try:
+            with open(self.path, "r", newline="", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                first = next(reader, None)
+            if first is None:
+                return None
+            if len(first) > 1:
+                ts = _nav_row_epoch(first[0], first[1])
+                if ts is not None:
+                    return ts
+            return os.path.getmtime(self.path)
+        except OSError:
+            return time.time()
+
+    def _replaced(self):
+        # one stat per batch, not per sample
+        try:
+            return os.stat(self.path).st_ino != self._ino
+        except FileNotFoundError:
+            return True
+
+    def _sync(self):
+        if self._f is not None and self._dirty:
+            os.fsync(self._f.fileno())
+            self._dirty = False
+        self._last_sync = time.monotonic()
+
+    def _close_file(self):
+        if self._f is not None:
+            try:
+                self._sync()
+                self._f.close()
+            except OSError:
+                pass
+        self._f = self._writer = self._ino = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending, timeout=NAV_LOG_FSYNC_SECONDS)
+                if self._pending and len(self._pending) < NAV_LOG_FLUSH_ROWS:
+                    deadline = self._first_at + NAV_LOG_FLUSH_SECONDS
+                    self._cond.wait_for(
+                        lambda: len(self._pending) >= NAV_LOG_FLUSH_ROWS,
+                        timeout=max(0.0, deadline - time.monotonic()),
+                    )
+            try:
+                self.flush()
+            except (OSError, ValueError) as e:
+                print("NAV log write error:", e)
+                time.sleep(1)
+
+
+nav_log_writer = NavLogWriter(NAV_LOG_FILE)
+atexit.register(nav_log_writer.close)
+
 
 def append_nav_log(sample: dict):
-    """Append one nav sample (thread-safe)."""
+    """Queue one nav sample for the log writer (thread-safe, never blocks on disk)."""
+    nav_log_writer.append([sample.get(k, "") for k in NAV_LOG_FIELDS])
+
+
+# Recent NAV samples (in-memory ring)
+class NavRing:
+    """Columnar ring buffer of the last `capacity` NAV samples.
+
+    One preallocated array('d') per field (sample time as epoch, missing values as
+    NaN): append is O(1) and stores 8 bytes per field instead of a dict with a
+    raw_string per sample. The raw strings stay in the NAV log.
+    """
+
+    FIELDS = ("timestamp", "latitude", "longitude", "speed", "cog", "heading",
+              "voltage", "panic", "ext_heading")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._cols = {f: array("d", [math.nan]) * capacity for f in self.FIELDS}
+        self._col_list = [self._cols[f] for f in self.FIELDS]
+        self._next = 0       # slot the next sample goes into
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, sample):
+        ts = _nav_row_epoch(sample.get("date"), sample.get("time"))
+        values = [ts if ts is not None else time.time()]
+        for f in self.FIELDS[1:]:
+            v = sample.get(f)
+            try:
+                values.append(float(v))
+            except (TypeError, ValueError):
+                values.append(math.nan)
+        with self._lock:
+            i = self._next
+            for col, v in zip(self._col_list, values):
+                col[i] = v
+            self._next = (i + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def _spans(self, n):
+        """(start, stop) slot ranges holding the last n samples, oldest first (caller holds _lock)."""
+        n = min(n, self._count)
+        start = (self._next - n) % self.capacity
+        if start + n <= self.capacity:
+            return [(start, start + n)]
+        return [(start, self.capacity), (0, self._next)]
+
+    def columns(self, n, fields=None):
+        """{field: [values]} for the last n samples, oldest first; NaN becomes None."""
+        fields = fields or self.FIELDS
+        with self._lock:
+            spans = self._spans(n)
+            out = {}
+            for f in fields:
+                view = memoryview(self._cols[f])
+                vals = []
+                for a, b in spans:
+                    vals.extend(view[a:b].tolist())
+                out[f] = [None if v != v else v for v in vals]
+        return out
+
+
+nav_history = NavRing(MAX_NAV_HISTORY)
+
+
+# ------------------------------------------------------------------------------
+# CAPTURE STORE (content-addressed JPEG blobs)
+# ------------------------------------------------------------------------------
+
+class CaptureStore:
+    """Content-addressed store for captured JPEGs.
+
+    Blobs are keyed by SHA-256, so identical frames are stored once, and live
+    either as files under CAPTURE_STORE_DIR or in a SQLite BLOB table in
+    LOCAL_DB_PATH. Only metadata is kept in RAM (captured_images); the metadata
+    index is persisted alongside the blobs so captures survive a restart.
+    """
+
+    def __init__(self, backend=CAPTURE_STORE_BACKEND, root=CAPTURE_STORE_DIR):
+        self.backend = backend
+        self.root = root
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _init(self):
+        if self._ready:
+            return
+        if self.backend == "sqlite":
+            con = _db_connect()
+            try:
+                con.execute("""
+                    CREATE TABLE IF NOT EXISTS capture_blobs (
+                        sha256 TEXT PRIMARY KEY,
+                        data BLOB NOT NULL,
+                        size INTEGER NOT NULL,
+                        created TEXT NOT NULL
+                    )
+                """)
+                con.execute("CREATE TABLE IF NOT EXISTS capture_index (k TEXT PRIMARY KEY, v TEXT NOT NULL)")
+                con.commit()
+            finally:
+                con.close()
+        else:
+            os.makedirs(self.root, exist_ok=True)
+        self._ready = True
+
+    def _blob_path(self, sha):
+        return os.path.join(self.root, sha[:2], sha + ".jpg")
+
+    def put(self, data: bytes) -> str:
+        """Store JPEG bytes (no-op if already present) and return their hash."""
+        sha = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self._init()
+            if self.backend == "sqlite":
+                con = _db_connect()
+                try:
+                    con.execute(
+                        "INSERT OR IGNORE INTO capture_blobs (sha256, data, size, created) VALUES (?, ?, ?, ?)",
+                        (sha, sqlite3.Binary(data), len(data), datetime.now().isoformat()),
+                    )
+                    con.commit()
+                finally:
+                    con.close()
+            else:
+                path = self._blob_path(sha)
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    tmp = path + ".tmp"
+                    with open(tmp, "wb") as f:
+                        f.write(data)
+                    os.replace(tmp, path)
+        return sha
+
+    def get(self, sha):
+        if not sha:
+            return None
+        try:
+            if self.backend == "sqlite":
+                con = _db_connect()
+                try:
+                    row = con.execute("SELECT data FROM capture_blobs WHERE sha256 = ?", (sha,)).fetchone()
+                finally:
+                    con.close()
+                return bytes(row[0]) if row else None
+            with open(self._blob_path(sha), "rb") as f:
+                return f.read()
+        except Exception:
+            return None
+
+    def delete(self, sha):
+        with self._lock:
+            try:
+                if self.backend == "sqlite":
+                    con = _db_connect()
+                    try:
+                        con.execute("DELETE FROM capture_blobs WHERE sha256 = ?", (sha,))
+                        con.commit()
+                    finally:
+                        con.close()
+                else:
+                    path = self._blob_path(sha)
+                    os.remove(path)
+                    if not os.listdir(os.path.dirname(path)):
+                        os.rmdir(os.path.dirname(path))
+            except Exception:
+                pass
+
+    def save_index(self, index: dict):
+        payload = json.dumps(index)
+        with self._lock:
+            self._init()
+            if self.backend == "sqlite":
+                con = _db_connect()
+                try:
+                    con.execute("INSERT OR REPLACE INTO capture_index (k, v) VALUES ('captured_images', ?)", (payload,))
+                    con.commit()
+                finally:
+                    con.close()
+            else:
+                path = os.path.join(self.root, "index.json")
+                with open(path + ".tmp", "w", encoding="utf-8") as f:
+                    f.write(payload)
+                os.replace(path + ".tmp", path)
+
+    def load_index(self):
+        try:
+            if self.backend == "sqlite":
+                con = _db_connect()
+                try:
+                    row = con.execute("SELECT v FROM capture_index WHERE k = 'captured_images'").fetchone()
+                finally:
+                    con.close()
+                return json.loads(row[0]) if row else None
+            with open(os.path.join(self.root, "index.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+
+capture_store = CaptureStore()
+
+
+def _load_captured_images():
+    """Restore capture metadata from the store (blobs are read on demand)."""
+    index = capture_store.load_index()
+    if not isinstance(index, dict):
+        return
+    with image_lock:
+        for key in ("vjr_images", "vdr_images"):
+            items = [it for it in index.get(key, []) if isinstance(it, dict) and it.get("sha256")]
+            captured_images[key] = items[:MAX_CAPTURE_IMAGES]
+
+
+def _persist_captured_images(removed=()):
+    """Save the metadata index and drop blobs no remaining capture refers to.
+
+    Caller holds image_lock.
+    """
     try:
-        _ensure_nav_log_header()
-        with nav_log_lock:
-            with open(NAV_LOG_FILE, "a", newline="", encoding="utf-8") as f:
-                w = csv.writer(f)
-                w.writerow([
-                    sample.get("date",""),
-                    sample.get("time",""),
-                    sample.get("latitude",""),
-                    sample.get("longitude",""),
-                    sample.get("speed",""),
-                    sample.get("cog",""),
-                    sample.get("heading",""),
-                    sample.get("voltage",""),
-                    sample.get("panic",""),
-                    sample.get("ext_heading",""),
-                    sample.get("raw_string",""),
-                ])
-    except Exception:
-        pass
+        capture_store.save_index(captured_images)
+    except Exception as e:
+        print("Capture index save failed:", e)
+    if removed:
+        live = {it.get("sha256") for arr in captured_images.values() for it in arr}
+        for sha in {it.get("sha256") for it in removed} - live:
+            if sha:
+                capture_store.delete(sha)
+
+
+def _capture_bytes(item):
+    return capture_store.get(item.get("sha256"))
+
+
+def _capture_b64(item):
+    data = _capture_bytes(item)
+    return base64.b64encode(data).decode() if data else ""
+
+
+_load_captured_images()
 
 
 # ------------------------------------------------------------------------------
@@ -453,78 +1436,212 @@ def logout():
 # LOGO / ASSETS
 # ------------------------------------------------------------------------------
 
+ASSET_MAX_AGE = 31536000          # one year: for content-addressed / versioned URLs
+ASSET_REVALIDATE_MAX_AGE = 3600   # unversioned asset URLs (revalidated with ETag afterwards)
+NO_SIGNAL_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mP8/x8AAwMB/6Xw2m8AAAAASUVORK5CYII="
+)
+_APP_START = datetime.now(timezone.utc).replace(microsecond=0)
+_logo_cache = {}
+_logo_cache_lock = threading.Lock()
+
+
+def _cached_response(data: bytes, mimetype: str, etag: str, last_modified=None,
+                     max_age=ASSET_MAX_AGE, immutable=True, private=False):
+    """Response with a strong ETag (+ Last-Modified) that answers conditional GETs with 304."""
+    resp = Response(data, mimetype=mimetype)
+    resp.set_etag(etag)
+    if last_modified is not None:
+        resp.last_modified = last_modified
+    resp.headers["Cache-Control"] = (
+        f"{'private' if private else 'public'}, max-age={max_age}" + (", immutable" if immutable else "")
+    )
+    return resp.make_conditional(request)
+
+
+def _logo_asset():
+    """(bytes, mimetype, etag, last_modified) of the logo; the file is re-read only when it changes."""
+    if os.path.exists(LOGO_FILE):
+        st = os.stat(LOGO_FILE)
+        key = (st.st_mtime, st.st_size)
+    else:
+        key = None
+    with _logo_cache_lock:
+        if _logo_cache.get("key") != key or "asset" not in _logo_cache:
+            if key is not None:
+                with open(LOGO_FILE, "rb") as f:
+                    data = f.read()
+                mime = "image/jpeg" if LOGO_FILE.lower().endswith((".jpg", ".jpeg")) else "image/png"
+                modified = datetime.fromtimestamp(int(st.st_mtime), timezone.utc)
+            else:
+                try:
+                    data = base64.b64decode(FALLBACK_LOGO_PNG_BASE64)
+                except Exception:
+                    # the embedded placeholder is truncated; never let it break page rendering
+                    data = NO_SIGNAL_PNG
+                mime = "image/png"
+                modified = _APP_START
+            etag = hashlib.sha256(data).hexdigest()[:16]
+            _logo_cache.update(key=key, asset=(data, mime, etag, modified))
+        return _logo_cache["asset"]
+
+
+@app.context_processor
+def _asset_urls():
+    # Versioned URL, so pages can let browsers cache the logo forever.
+    return {"logo_url": f"/assets/logo?v={_logo_asset()[2]}"}
+
+
 @app.route("/assets/logo")
 def gds_logo():
-    if os.path.exists(LOGO_FILE):
-        mime = "image/jpeg" if LOGO_FILE.lower().endswith((".jpg", ".jpeg")) else "image/png"
-        return send_file(LOGO_FILE, mimetype=mime)
-    png = base64.b64decode(FALLBACK_LOGO_PNG_BASE64)
-    return Response(png, mimetype="image/png")
+    data, mime, etag, modified = _logo_asset()
+    if request.args.get("v") == etag:
+        return _cached_response(data, mime, etag, modified)
+    return _cached_response(data, mime, etag, modified, max_age=ASSET_REVALIDATE_MAX_AGE, immutable=False)
 
 @app.route("/assets/no-signal.png")
 def no_signal():
-    png = base64.b64decode(
-        "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mP8/x8AAwMB/6Xw2m8AAAAASUVORK5CYII="
-    )
-    return Response(png, mimetype="image/png")
+    return _cached_response(NO_SIGNAL_PNG, "image/png", "no-signal-1", _APP_START)
 
 # ------------------------------------------------------------------------------
 # CAMERA HELPERS (DEMO-SAFE)
 # ------------------------------------------------------------------------------
 
+DEMO_FRAME_SIZE = (960, 540)
+_demo_layers = {}
+_demo_layers_lock = threading.Lock()
+
+
+def _demo_static_layer(text):
+    """Background, border, header, crosshair and caption: everything that never changes."""
+    with _demo_layers_lock:
+        img = _demo_layers.get(text)
+        if img is None:
+            img = Image.new("RGB", DEMO_FRAME_SIZE, (10, 10, 12))
+            draw = ImageDraw.Draw(img)
+
+            # Border + header bar
+            draw.rectangle((0, 0, 959, 539), outline=(204, 0, 0), width=6)
+            draw.rectangle((0, 0, 959, 70), fill=(30, 0, 0))
+            draw.text((18, 22), "GDS PTZ FEED", fill=(255, 255, 255))
+            draw.text((18, 110), text, fill=(255, 200, 200))
+
+            # Simple crosshair
+            cx, cy = 480, 320
+            draw.line((cx - 60, cy, cx + 60, cy), fill=(255, 31, 31), width=3)
+            draw.line((cx, cy - 60, cx, cy + 60), fill=(255, 31, 31), width=3)
+
+            _demo_layers[text] = img
+        return img
+
+
+@lru_cache(maxsize=16)
+def _render_demo_frame(text, ts, pan, tilt, zoom):
+    """Encoded frame for one (caption, second, PTZ) state; repeat calls are free."""
+    img = _demo_static_layer(text).copy()
+    draw = ImageDraw.Draw(img)
+    draw.text((18, 150), f"Timestamp: {ts}", fill=(220, 220, 220))
+    draw.text((18, 200), f"PAN: {pan}   TILT: {tilt}   ZOOM: {zoom}", fill=(220, 220, 220))
+
+    out = BytesIO()
+    img.save(out, format="JPEG", quality=85)
+    return out.getvalue()
+
+
 def _demo_camera_frame(text="DEMO CAMERA (NO SIGNAL)"):
     """
     Returns JPEG bytes. This ensures <img src="/camera/stream"> always shows something.
     """
-    img = Image.new("RGB", (960, 540), (10, 10, 12))
-    draw = ImageDraw.Draw(img)
-
-    # Border + header bar
-    draw.rectangle((0, 0, 959, 539), outline=(204, 0, 0), width=6)
-    draw.rectangle((0, 0, 959, 70), fill=(30, 0, 0))
-    draw.text((18, 22), "GDS PTZ FEED", fill=(255, 255, 255))
-
     ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    draw.text((18, 110), text, fill=(255, 200, 200))
-    draw.text((18, 150), f"Timestamp: {ts}", fill=(220, 220, 220))
-
     with camera_lock:
         pan = camera_controls.get("pan", 0)
         tilt = camera_controls.get("tilt", 0)
         zoom = camera_controls.get("zoom", 1.0)
-    draw.text((18, 200), f"PAN: {pan}   TILT: {tilt}   ZOOM: {zoom}", fill=(220, 220, 220))
+    return _render_demo_frame(text, ts, pan, tilt, zoom)
 
-    # Simple crosshair
-    cx, cy = 480, 320
-    draw.line((cx - 60, cy, cx + 60, cy), fill=(255, 31, 31), width=3)
-    draw.line((cx, cy - 60, cx, cy + 60), fill=(255, 31, 31), width=3)
+class CameraClient:
+    """Pooled keep-alive HTTP client for the IP camera.
+
+    All camera traffic goes through one requests.Session, so snapshot requests
+    reuse warm sockets. A semaphore caps the number of simultaneously open
+    responses at CAMERA_MAX_CONNECTIONS, and responses are only handed out via
+    open(), which always closes them.
+    """
+
+    def __init__(self, max_connections=CAMERA_MAX_CONNECTIONS):
+        self._lock = threading.Lock()
+        self._session = None
+        self._max = max_connections
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._in_use = 0
+
+    def _get_session(self):
+        with self._lock:
+            if self._session is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._max, max_retries=0)
+                s.mount("http://", adapter)
+                s.mount("https://", adapter)
+                s.headers["User-Agent"] = "GDS-VMS/1.0"
+                if CAMERA_USERNAME:
+                    s.auth = (CAMERA_USERNAME, CAMERA_PASSWORD)
+                self._session = s
+            return self._session
+
+    @contextmanager
+    def open(self, url=None, read_timeout=2):
+        """Context-managed streaming GET; the response is closed when the block exits."""
+        if not self._slots.acquire(timeout=CAMERA_CONNECTION_TIMEOUT):
+            raise Exception("Camera connection limit reached")
+        with self._lock:
+            self._in_use += 1
+        try:
+            resp = self._get_session().get(
+                url or IP_CAMERA_URL,
+                stream=True,
+                timeout=(CAMERA_CONNECTION_TIMEOUT, read_timeout),
+            )
+            try:
+                yield resp
+            finally:
+                resp.close()
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def in_use(self):
+        with self._lock:
+            return self._in_use
+
+    def reset(self):
+        """Drop all pooled sockets (camera rebooted / changed address)."""
+        with self._lock:
+            s, self._session = self._session, None
+        if s is not None:
+            s.close()
+
+
+camera_client = CameraClient()
 
-    out = BytesIO()
-    img.save(out, format="JPEG", quality=85)
-    return out.getvalue()
 
 def check_camera_connection():
     global camera_status
     try:
-        auth = (CAMERA_USERNAME, CAMERA_PASSWORD) if CAMERA_USERNAME else None
-
         # IMPORTANT: Android IP Webcam does NOT support HEAD
-        response = requests.get(
-            IP_CAMERA_URL,
-            auth=auth,
-            stream=True,
-            timeout=CAMERA_CONNECTION_TIMEOUT
-        )
+        with camera_client.open() as response:
+            status_code = response.status_code
 
-        if response.status_code < 400:
+        if status_code < 400:
             with camera_lock:
                 camera_status["connected"] = True
                 camera_status["mode"] = "ip"
                 camera_status["error"] = None
                 camera_status["last_check"] = datetime.now().isoformat()
+            camera_relay.set_background(CAMERA_BACKGROUND_GRAB)
             return True
 
-        raise Exception(f"Status {response.status_code}")
+        raise Exception(f"Status {status_code}")
 
     except Exception as e:
         if AUTO_FALLBACK_TO_DEMO:
@@ -533,6 +1650,7 @@ def check_camera_connection():
                 camera_status["mode"] = "demo"
                 camera_status["error"] = str(e)
                 camera_status["last_check"] = datetime.now().isoformat()
+        camera_relay.set_background(False)
         return False
 
 
@@ -593,11 +1711,6 @@ def simulate_navigation():
             raw_string = f"{date_str},{time_str},{sim_lat:.6f},{sim_lon:.6f},{sim_speed:.1f},{cog:.0f},{voltage},0,{sim_heading:.0f}"
 
             with nav_lock:
-                if nav_current.get("date"):
-                    nav_history.insert(0, nav_current.copy())
-                    if len(nav_history) > MAX_NAV_HISTORY:
-                        nav_history.pop()
-
                 nav_current = {
                     "date": date_str,
                     "time": time_str,
@@ -613,6 +1726,8 @@ def simulate_navigation():
                 }
 
 
+            nav_history.append(nav_current)
+
             # Persist NAV log
             append_nav_log(nav_current)
 
@@ -651,3844 +1766,1177 @@ def simulate_weather():
 #threading.Thread(target=firebase_marinelite_listener, daemon=True).start()
 
 
-
 # ------------------------------------------------------------------------------
-# ROUTES
+# OFFLINE SYNC (store-and-forward outbox)
 # ------------------------------------------------------------------------------
-@app.route("/api/connectivity/status")
-def api_connectivity_status():
-    """
-    Stub API.
-    Later this will read Wi-Fi + SIM + Ethernet status from RPi.
-    """
-    return jsonify({
-        "wifi": {
-            "available": True,
-            "connected": False,
-            "ssid": None,
-            "signal": None
-        },
-        "sim": {
-            "available": True,
-            "connected": False,
-            "operator": None,
-            "country": None,
-            "signal": None
-        },
-        "internet": False
-    })
-@app.route("/api/sync/status")
-def api_sync_status():
-    """
-    Stub API.
-    Later this will reflect SQLite sync state.
-    """
-    return jsonify({
-        "pending_records": 0,
-        "last_sync": None,
-        "sync_state": "idle"
-    })
-@app.route("/api/sync/start", methods=["POST"])
-def api_sync_start():
-    """
-    Stub API.
-    Later this will trigger background sync.
-    """
-    return jsonify({
-        "status": "accepted",
-        "message": "Sync will start when connectivity is available"
-    })
-
-@app.route("/")
-def index():
-    if not current_user():
-        return redirect(url_for("login"))
-    with camera_lock:
-        mode = camera_status["mode"]
-    role = current_role()
-    user = current_user()
-    return render_template_string(HTML_DASHBOARD, camera_mode=mode, role=role, user=user, weasy=WEASYPRINT_AVAILABLE)
-
-@app.route("/api/me")
-def api_me():
-    return jsonify({"user": current_user(), "role": current_role(), "weasyprint": WEASYPRINT_AVAILABLE})
-
-@app.route("/camera/capture", methods=["POST"])
-@require_role("Operator")
-def capture_image():
-    data = request.json or {}
-    report_type = data.get("report_type", "vdr")
-
-    # OFFLINE MODE: Firebase disabled here
-    upload_firebase = False
-
-    try:
-        jpg_quality = int(data.get("jpg_quality", 75))
-    except Exception:
-        jpg_quality = 75
-
-    try:
-        max_width = int(data.get("max_width", 1280))
-    except Exception:
-        max_width = 1280
-
-    jpg_quality = max(35, min(95, jpg_quality))
-    max_width = max(320, min(1920, max_width))
-
-    # ---- Capture image ----
-    content = _fetch_camera_snapshot_bytes()
-    if not content:
-        content = _demo_camera_frame("CAPTURED (FALLBACK)")
-
-    content = _compress_jpeg(content, max_width=max_width, quality=jpg_quality)
-    base64_data = base64.b64encode(content).decode()
-
-    # ---- SIZE GUARD (INSIDE FUNCTION) ----
-    size_kb = len(base64_data) * 0.75 / 1024
-    if size_kb > 80:
-        return jsonify({
-            "status": "error",
-            "message": f"Image too large for DB-only mode ({size_kb:.1f} KB)"
-        }), 400
-
-    item = {
-        "id": uuid.uuid4().hex,
-        "data": base64_data,
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "type": "jpeg"
-    }
-
-    # ---- Store locally for UI ----
-    with image_lock:
-        key = "vjr_images" if report_type == "vjr" else "vdr_images"
-        captured_images[key].insert(0, item)
-        if len(captured_images[key]) > MAX_CAPTURE_IMAGES:
-            captured_images[key].pop()
-
-    return jsonify({
-        "status": "success",
-        "report_type": report_type,
-        "size_kb": round(size_kb, 2)
-    })
-
-
-@app.route("/camera/control", methods=["POST"])
-@require_role("Operator")
-def control_camera():
-    """
-    Always returns OK so buttons feel functional even without hardware.
-    """
-    data = request.json or {}
-    action = data.get("action", "")
-    value = data.get("value", 0)
-
-    with camera_lock:
-        if action == "pan_left":
-            camera_controls["pan"] = max(-180, camera_controls["pan"] - 15)
-        elif action == "pan_right":
-            camera_controls["pan"] = min(180, camera_controls["pan"] + 15)
-        elif action == "tilt_up":
-            camera_controls["tilt"] = min(90, camera_controls["tilt"] + 15)
-        elif action == "tilt_down":
-            camera_controls["tilt"] = max(-90, camera_controls["tilt"] - 15)
-        elif action == "zoom_in":
-            camera_controls["zoom"] = min(10, camera_controls["zoom"] + 0.5)
-        elif action == "zoom_out":
-            camera_controls["zoom"] = max(1, camera_controls["zoom"] - 0.5)
-        elif action == "zoom_set":
-            try:
-                camera_controls["zoom"] = max(1, min(10, float(value)))
-            except Exception:
-                pass
-        elif action == "led_toggle":
-            camera_controls["led_enabled"] = not camera_controls["led_enabled"]
-        elif action == "led_brightness":
-            try:
-                camera_controls["led_brightness"] = max(0, min(100, int(value)))
-            except Exception:
-                pass
-        elif action == "night_vision_toggle":
-            camera_controls["night_vision"] = not camera_controls["night_vision"]
-
-        control_copy = camera_controls.copy()
-
-    return jsonify({"status": "ok", "message": f"Action executed: {action}", "controls": control_copy})
-
-@app.route("/camera/status")
-def get_camera_status():
-    with camera_lock:
-        st = camera_status.copy()
-        st["controls"] = camera_controls.copy()
-    with sync_lock:
-        st["ptz_sync_enabled"] = ptz_sync_enabled
-    return jsonify(st)
-
-@app.route("/camera/reconnect", methods=["POST"])
-@require_role("Operator")
-def reconnect_camera():
-    result = check_camera_connection()
-    with camera_lock:
-        status_copy = camera_status.copy()
-    return jsonify({"reconnected": result, "status": status_copy})
-
-@app.route("/camera/sync_cog", methods=["POST"])
-@require_role("Operator")
-def camera_sync_cog():
-    global ptz_sync_enabled
-    enabled = bool((request.json or {}).get("enabled", False))
-    with sync_lock:
-        ptz_sync_enabled = enabled
-    return jsonify({"status": "ok", "enabled": ptz_sync_enabled})
-
-
-def _extract_first_jpeg_from_mjpeg(resp, max_bytes=3_000_000, max_seconds=1.5):
-    """Extract the first JPEG frame from an MJPEG stream response.
-
-    Hard-stops after max_seconds to avoid UI feeling 'stuck' when the IP camera
-    stalls or buffers.
-    """
-    buf = bytearray()
-    start = -1
-    t0 = time.time()
-    for chunk in resp.iter_content(chunk_size=4096):
-        if (time.time() - t0) > max_seconds:
-            break
-        if not chunk:
-            continue
-        buf.extend(chunk)
-        if start < 0:
-            s = buf.find(b"\xff\xd8")
-            if s >= 0:
-                start = s
-        if start >= 0:
-            e = buf.find(b"\xff\xd9", start)
-            if e >= 0:
-                return bytes(buf[start:e+2])
-        if len(buf) > max_bytes:
-            break
-    return None
-
-
-def _compress_jpeg(jpg_bytes: bytes, max_width=1280, quality=75):
-    """Downscale and recompress JPEG for faster UI + smaller base64."""
-    try:
-        im = Image.open(BytesIO(jpg_bytes))
-        im = im.convert("RGB")
-        w, h = im.size
-        if w > max_width:
-            nh = int(h * (max_width / float(w)))
-            im = im.resize((max_width, nh))
-        out = BytesIO()
-        im.save(out, format="JPEG", quality=quality, optimize=True)
-        return out.getvalue()
-    except Exception:
-        return jpg_bytes
-
-def _fetch_camera_snapshot_bytes():
-    """Fast snapshot: get a single JPEG frame (works for MJPEG and JPEG endpoints)."""
-    with camera_lock:
-        mode = camera_status.get("mode", "demo")
-
-    if mode == "demo":
-        return _demo_camera_frame("CAPTURED (DEMO MODE)")
-
-    try:
-        auth = (CAMERA_USERNAME, CAMERA_PASSWORD) if CAMERA_USERNAME else None
-
-        # Use streaming so we can cut after the first JPEG instead of downloading the full MJPEG feed
-        resp = requests.get(
-            IP_CAMERA_URL,
-            auth=auth,
-            stream=True,
-            timeout=(CAMERA_CONNECTION_TIMEOUT, 2),
-            headers={"User-Agent": "GDS-VMS/1.0"},
-        )
-        if resp.status_code != 200:
-            return None
-
-        ctype = (resp.headers.get("Content-Type") or "").lower()
-        if "multipart" in ctype or "mjpeg" in ctype or "x-mixed-replace" in ctype:
-            frame = _extract_first_jpeg_from_mjpeg(resp)
-            if frame:
-                return _compress_jpeg(frame)
-            return None
-
-        # Non-multipart: assume direct JPEG snapshot endpoint
-        data = resp.content
-        if data:
-            return _compress_jpeg(data)
-    except Exception:
-        return None
-
-    return None
-
-
-
-
-
-
-
-@app.route("/camera/captured_images")
-def get_captured_images_count():
-    with image_lock:
-        return jsonify({"vjr_images": len(captured_images["vjr_images"]), "vdr_images": len(captured_images["vdr_images"])})
-
-@app.route("/camera/captured_images_full")
-def get_captured_images_full():
-    """
-    Used by UI galleries (VJR & VDR) to display thumbnails.
-    """
-    with image_lock:
-        return jsonify({
-            "vjr": captured_images["vjr_images"],
-            "vdr": captured_images["vdr_images"]
-        })
-
-@app.route("/camera/clear_captures", methods=["POST"])
-@require_role("Operator")
-def clear_captures():
-    data = request.json or {}
-    report_type = (data.get("report_type") or "").lower()
-    if report_type not in ("vjr", "vdr"):
-        return jsonify({"error": "Invalid report_type"}), 400
-
-    key = "vjr_images" if report_type == "vjr" else "vdr_images"
-    with image_lock:
-        captured_images[key].clear()
-
-    return jsonify({"status": "success", "cleared": report_type})
-
-@app.route("/camera/delete_capture", methods=["POST"])
-@require_role("Operator")
-def delete_capture():
-    """Delete one captured image.
-
-    Old behavior used an array index (fragile when UI re-renders).
-    New behavior supports stable deletion by capture_id.
-    """
-    data = request.json or {}
-    report_type = (data.get("report_type") or "").lower()
-
-    capture_id = data.get("capture_id") or data.get("id")
-    idx = data.get("index", None)
-
-    if report_type not in ("vjr", "vdr"):
-        return jsonify({"error": "Invalid report_type"}), 400
-
-    key = "vjr_images" if report_type == "vjr" else "vdr_images"
-
-    with image_lock:
-        arr = captured_images.get(key, [])
-
-        # Preferred: delete by capture_id (stable)
-        if capture_id:
-            for i, it in enumerate(arr):
-                if str(it.get("id")) == str(capture_id):
-                    arr.pop(i)
-                    return jsonify({"status": "success", "deleted_id": capture_id, "report_type": report_type})
-            return jsonify({"error": "capture_id not found"}), 404
-
-        # Backward-compatible: delete by index
-        if idx is None:
-            return jsonify({"error": "capture_id or index required"}), 400
-        try:
-            idx = int(idx)
-        except Exception:
-            return jsonify({"error": "index must be int"}), 400
-
-        if idx < 0 or idx >= len(arr):
-            return jsonify({"error": "index out of range"}), 400
-        arr.pop(idx)
-
-    return jsonify({"status": "success", "deleted_index": idx, "report_type": report_type})
-
-
-
-@app.route("/nav_data")
-def get_navigation_data():
-    if LOCAL_DB_ENABLED:
-        return jsonify(db_get_latest_marinelite())
-
-    # fallback (old behavior)
-    with nav_lock:
-        return jsonify({
-            "latitude": nav_current.get("latitude"),
-            "longitude": nav_current.get("longitude"),
-            "heading": nav_current.get("heading"),
-            "timestamp": nav_current.get("timestamp")
-        })
-
-
-
-@app.route("/weather_data")
-def get_weather_data():
-    if LOCAL_DB_ENABLED:
-        return jsonify(db_get_latest_weather())
-
-    with weather_lock:
-        return jsonify(weather_current)
-
-
-
-
-@app.route("/export_nav_csv")
-def export_nav_csv():
-    """Browser download of the persistent navigation log (CSV)."""
-    if not current_user():
-        return redirect(url_for("login"))
-    _ensure_nav_log_header()
-    try:
-        return send_file(
-            NAV_LOG_FILE,
-            as_attachment=True,
-            download_name=f"NAV_Log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mimetype="text/csv",
-        )
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-# ------------------------------------------------------------------------------
-# VDR RECORDS + EXPORTS
-# ------------------------------------------------------------------------------
-
-@app.route("/vdr_records")
-def get_vdr_records():
-    with vdr_lock:
-        return jsonify(vdr_records)
-
-@app.route("/save_vdr", methods=["POST"])
-@require_role("Operator")
-def save_vdr_record():
-    data = request.json or {}
-    with vdr_lock:
-        record = {k: data.get(k, "") for k in [
-            "date","vessel","imo","mmsi","callsign","client","location","country",
-            "activity","weather","sea_state","crew_count","deck_crew","engine_crew",
-            "officers","fuel_consumption","main_engine_hours","generator_hours",
-            "distance_traveled","incidents","maintenance_work","remarks"
-        ]}
-        record["id"] = (vdr_records[0]["id"] + 1) if vdr_records else 1
-        record["timestamp"] = datetime.now().isoformat()
-        vdr_records.insert(0, record)
-    return jsonify({"status": "ok", "total": len(vdr_records)})
-
-@app.route("/clear_vdr", methods=["POST"])
-@require_role("Captain")
-def clear_vdr_records():
-    with vdr_lock:
-        vdr_records.clear()
-    return jsonify({"status": "ok"})
-
-@app.route("/export_vdr_excel", methods=["POST"])
-@require_role("Operator")
-def export_vdr_excel():
-    if not openpyxl:
-        return jsonify({"error": "openpyxl not installed"}), 400
-
-    records = (request.json or {}).get("records", [])
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Daily Report"
-
-    headers = [
-        "ID","Date","Vessel","IMO","MMSI","Call Sign","Client","Location","Country",
-        "Activity","Weather","Sea State","Crew","Deck Crew","Engine Crew","Officers",
-        "Fuel","M/E Hours","Gen Hours","Distance","Incidents","Maintenance","Remarks"
-    ]
-    ws.append(headers)
-
-    for cell in ws[1]:
-        cell.fill = PatternFill(start_color="CC0000", end_color="CC0000", fill_type="solid")
-        cell.font = XLFont(color="FFFFFF", bold=True)
-
-    for r in records:
-        ws.append([r.get(k, "") for k in [
-            "id","date","vessel","imo","mmsi","callsign","client","location","country",
-            "activity","weather","sea_state","crew_count","deck_crew","engine_crew","officers",
-            "fuel_consumption","main_engine_hours","generator_hours","distance_traveled",
-            "incidents","maintenance_work","remarks"
-        ]])
-
-    for col in ws.columns:
-        max_len = max((len(str(cell.value or "")) for cell in col), default=0)
-        ws.column_dimensions[col[0].column_letter].width = min(max_len + 2, 30)
-
-    out = BytesIO()
-    wb.save(out)
-    out.seek(0)
-    return Response(
-        out.getvalue(),
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=VDR_Report.xlsx"}
-    )
-
-@app.route("/export_vdr_csv", methods=["POST"])
-@require_role("Operator")
-def export_vdr_csv():
-    records = (request.json or {}).get("records", [])
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow([
-        "ID","Date","Vessel","IMO","MMSI","Call Sign","Client","Location","Country",
-        "Activity","Weather","Sea State","Crew","Deck Crew","Engine Crew","Officers",
-        "Fuel","M/E Hours","Gen Hours","Distance","Incidents","Maintenance","Remarks"
-    ])
-    for r in records:
-        writer.writerow([r.get(k, "") for k in [
-            "id","date","vessel","imo","mmsi","callsign","client","location","country",
-            "activity","weather","sea_state","crew_count","deck_crew","engine_crew","officers",
-            "fuel_consumption","main_engine_hours","generator_hours","distance_traveled",
-            "incidents","maintenance_work","remarks"
-        ]])
-    return Response(output.getvalue(), mimetype="text/csv",
-                    headers={"Content-Disposition": "attachment; filename=VDR_Report.csv"})
-
-def _logo_b64():
-    if os.path.exists(LOGO_FILE):
-        return base64.b64encode(open(LOGO_FILE, "rb").read()).decode()
-    return FALLBACK_LOGO_PNG_BASE64
-
-@app.route("/export_vdr_pdf", methods=["POST"])
-@require_role("Operator")
-def export_vdr_pdf():
-    records = (request.json or {}).get("records", [])
-    with image_lock:
-        images = captured_images["vdr_images"][:18]
-
-    # TRY REPORTLAB FIRST (Windows-friendly, pure Python)
-    if REPORTLAB_AVAILABLE:
-        try:
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(
-                buffer,
-                pagesize=letter,
-                rightMargin=0.5*inch,
-                leftMargin=0.5*inch,
-                topMargin=0.75*inch,
-                bottomMargin=0.75*inch
-            )
-            
-            story = []
-            styles = getSampleStyleSheet()
-            
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=18,
-                textColor=colors.HexColor('#cc0000'),
-                spaceAfter=10
-            )
-            
-            story.append(Paragraph(
-                "<b><font color='#cc0000'>Vessel Daily Report (VDR)</font></b><br/>"
-                f"<font size=9>Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</font>",
-                title_style
-            ))
-            story.append(Spacer(1, 0.2*inch))
-            
-            # Records Table
-            if records:
-                table_data = [['Date', 'Vessel', 'Activity', 'Location', 'Weather', 'Remarks']]
-                for r in records[:50]:
-                    table_data.append([
-                        str(r.get('date', '')),
-                        str(r.get('vessel', '')),
-                        str(r.get('activity', '')),
-                        str(r.get('location', '')),
-                        str(r.get('weather', '')),
-                        str(r.get('remarks', ''))[:40]
-                    ])
-                
-                table = Table(table_data, colWidths=[0.8*inch, 0.9*inch, 0.8*inch, 0.9*inch, 0.9*inch, 1.2*inch])
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1a1a1a')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 9),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                    ('FONTSIZE', (0, 1), (-1, -1), 7),
-                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f5f5f5')]),
-                ]))
-                story.append(table)
-            
-            story.append(Spacer(1, 0.2*inch))
-            
-            # Images
-            if images:
-                img_data = []
-                for img in images[:18]:
-                    try:
-                        img_b64 = img.get('data', '')
-                        if img_b64:
-                            img_bytes = base64.b64decode(img_b64)
-                            pil_img = Image.open(BytesIO(img_bytes))
-                            pil_img.thumbnail((1.2*inch, 1.2*inch))
-                            img_path = f'/tmp/vdr_img_{int(time.time()*1000)}.png'
-                            pil_img.save(img_path)
-                            img_data.append(RLImage(img_path, width=1.1*inch, height=1.1*inch))
-                    except Exception:
-                        pass
-                
-                if img_data:
-                    img_grid = []
-                    for i in range(0, len(img_data), 2):
-                        if i+1 < len(img_data):
-                            img_grid.append([img_data[i], img_data[i+1]])
-                        else:
-                            img_grid.append([img_data[i], ''])
-                    
-                    img_table = Table(img_grid)
-                    img_table.setStyle(TableStyle([
-                        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                        ('PADDING', (5, 5), (-1, -1), 5),
-                    ]))
-                    story.append(img_table)
-            
-            story.append(Spacer(1, 0.1*inch))
-            story.append(Paragraph(f"<font size=7>GDS Maritime System  {datetime.now().year}</font>", styles['Normal']))
-            
-            doc.build(story)
-            pdf_bytes = buffer.getvalue()
-            buffer.close()
-            
-            return Response(
-                pdf_bytes,
-                mimetype="application/pdf",
-                headers={"Content-Disposition": "attachment; filename=VDR_Report.pdf"}
-            )
-        
-        except Exception as e:
-            print(f"ReportLab PDF generation failed: {e}, falling back to WeasyPrint")
-    
-    # FALLBACK TO WEASYPRINT
-    if not WEASYPRINT_AVAILABLE:
-        return jsonify({"error": "PDF generation failed. Install: pip install reportlab pillow"}), 400
-    
-    rows = ""
-    for r in records[:50]:
-        rows += f"""
-        <tr>
-          <td>{r.get('id','')}</td>
-          <td>{r.get('date','')}</td>
-          <td>{r.get('vessel','')}</td>
-          <td>{r.get('activity','')}</td>
-          <td>{r.get('location','')}</td>
-          <td>{r.get('weather','')}</td>
-          <td>{r.get('remarks','')}</td>
-        </tr>
-        """
-
-    gallery = ""
-    if images:
-        gallery += "<h2>Captured Images (VDR)</h2><div class='grid'>"
-        for img in images:
-            gallery += f"""
-            <div class="card">
-              <img src="data:image/jpeg;base64,{img['data']}" />
-              <div class="cap">{img['timestamp']}</div>
-            </div>
-            """
-        gallery += "</div>"
-
-    html = f"""
-    <!doctype html>
-    <html>
-    <head>
-      <meta charset="utf-8">
-      <style>
-        body {{ font-family: Arial, sans-serif; padding: 24px; color: #111; }}
-        .header {{ display:flex; align-items:center; gap:14px; border-bottom: 4px solid #cc0000; padding-bottom: 14px; margin-bottom: 14px; }}
-        .header img {{ height: 46px; }}
-        h1 {{ margin:0; color:#cc0000; font-size: 22px; }}
-        .sub {{ color:#555; font-size: 12px; margin-top: 4px; }}
-        table {{ width:100%; border-collapse:collapse; font-size: 11px; margin-top: 12px; }}
-        th, td {{ border:1px solid #ddd; padding: 8px; vertical-align: top; }}
-        th {{ background:#111; color:#fff; }}
-        tr:nth-child(even) {{ background:#fafafa; }}
-        h2 {{ color:#cc0000; margin: 18px 0 10px; font-size: 14px; border-bottom: 2px solid #cc0000; padding-bottom: 6px; }}
-        .grid {{ display:grid; grid-template-columns: repeat(2, 1fr); gap: 12px; }}
-        .card {{ border:1px solid #ddd; border-radius: 8px; overflow:hidden; }}
-        .card img {{ width:100%; height:auto; display:block; }}
-        .cap {{ padding: 8px; font-size: 10px; color:#555; }}
-        .foot {{ margin-top: 16px; border-top: 1px solid #ddd; padding-top: 10px; font-size: 10px; color:#666; text-align:center; }}
-      </style>
-    </head>
-    <body>
-      <div class="header">
-        <img src="data:image/png;base64,{_logo_b64()}" />
-        <div>
-          <h1>Vessel Daily Report (VDR)</h1>
-          <div class="sub">Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</div>
-        </div>
-      </div>
-
-      <h2>Records Summary</h2>
-      <table>
-        <thead>
-          <tr>
-            <th>ID</th><th>Date</th><th>Vessel</th><th>Activity</th><th>Location</th><th>Weather</th><th>Remarks</th>
-          </tr>
-        </thead>
-        <tbody>{rows if rows else '<tr><td colspan="7">No records</td></tr>'}</tbody>
-      </table>
-
-      {gallery}
-
-      <div class="foot">Generated by GDS - Maritime Management System | &copy; {datetime.now().year}</div>
-    </body>
-    </html>
-    """
-
-    pdf = HTML(string=html).write_pdf()
-    return Response(pdf, mimetype="application/pdf",
-                    headers={"Content-Disposition": "attachment; filename=VDR_Report.pdf"})
-
-# ------------------------------------------------------------------------------
-# VJR PDF EXPORT (NEW)
-# ------------------------------------------------------------------------------
-
-@app.route("/export_vjr_pdf", methods=["POST"])
-@require_role("Operator")
-def export_vjr_pdf():
-    vjr = (request.json or {}).get("vjr", {})
-    navlog = (request.json or {}).get("nav", [])
-    with image_lock:
-        images = captured_images["vjr_images"][:18]
-
-    # TRY REPORTLAB FIRST (Windows-friendly, pure Python)
-    if REPORTLAB_AVAILABLE:
-        try:
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(
-                buffer,
-                pagesize=letter,
-                rightMargin=0.5*inch,
-                leftMargin=0.5*inch,
-                topMargin=0.75*inch,
-                bottomMargin=0.75*inch
-            )
-            
-            story = []
-            styles = getSampleStyleSheet()
-            
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=18,
-                textColor=colors.HexColor('#cc0000'),
-                spaceAfter=10
-            )
-            
-            story.append(Paragraph(
-                "<b><font color='#cc0000'>Vessel Journey Report (VJR)</font></b><br/>"
-                f"<font size=9>Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</font>",
-                title_style
-            ))
-            story.append(Spacer(1, 0.2*inch))
-            
-            # Journey Details
-            details_data = [
-                ['Report Date:', vjr.get('date', '')],
-                ['Vessel:', vjr.get('vessel', '')],
-                ['IMO:', vjr.get('imo', '')],
-                ['Master:', vjr.get('master', '')],
-                ['Departure:', vjr.get('departure', '')],
-                ['Arrival:', vjr.get('arrival', '')],
-            ]
-            
-            details_table = Table(details_data, colWidths=[1.2*inch, 4*inch])
-            details_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f0f0f0')),
-                ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('PADDING', (8, 6), (-1, -1), 6),
-            ]))
-            story.append(details_table)
-            story.append(Spacer(1, 0.2*inch))
-            
-            # Images
-            if images:
-                img_data = []
-                for img in images[:16]:
-                    try:
-                        img_b64 = img.get('data', '')
-                        if img_b64:
-                            img_bytes = base64.b64decode(img_b64)
-                            pil_img = Image.open(BytesIO(img_bytes))
-                            pil_img.thumbnail((1.2*inch, 1.2*inch))
-                            img_path = f'/tmp/vjr_img_{int(time.time()*1000)}.png'
-                            pil_img.save(img_path)
-                            img_data.append(RLImage(img_path, width=1.1*inch, height=1.1*inch))
-                    except Exception:
-                        pass
-                
-                if img_data:
-                    img_grid = []
-                    for i in range(0, len(img_data), 2):
-                        if i+1 < len(img_data):
-                            img_grid.append([img_data[i], img_data[i+1]])
-                        else:
-                            img_grid.append([img_data[i], ''])
-                    
-                    img_table = Table(img_grid)
-                    img_table.setStyle(TableStyle([
-                        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                        ('PADDING', (5, 5), (-1, -1), 5),
-                    ]))
-                    story.append(img_table)
-            
-            story.append(Spacer(1, 0.1*inch))
-            story.append(Paragraph(f"<font size=7>GDS Maritime System {datetime.now().year}</font>", styles['Normal']))
-            
-            doc.build(story)
-            pdf_bytes = buffer.getvalue()
-            buffer.close()
-            
-            return Response(
-                pdf_bytes,
-                mimetype="application/pdf",
-                headers={"Content-Disposition": "attachment; filename=VJR_Report.pdf"}
-            )
-        
-        except Exception as e:
-            print(f"ReportLab PDF generation failed: {e}, falling back to WeasyPrint")
-    
-    # FALLBACK TO WEASYPRINT
-    if not WEASYPRINT_AVAILABLE:
-        return jsonify({"error": "PDF generation failed. Install: pip install reportlab pillow"}), 400
-
-    nav_rows = ""
-    for i, n in enumerate(navlog[:40], start=1):
-        nav_rows += f"""
-        <tr>
-          <td>{i}</td>
-          <td>{n.get('date','')}</td>
-          <td>{n.get('time','')}</td>
-          <td>{n.get('latitude','')}</td>
-          <td>{n.get('longitude','')}</td>
-          <td>{n.get('speed','')}</td>
-          <td>{n.get('cog','')}</td>
-        </tr>
-        """
-
-    gallery = ""
-    if images:
-        gallery += "<h2>Captured Images (VJR)</h2><div class='grid'>"
-        for img in images:
-            gallery += f"""
-            <div class="card">
-              <img src="data:image/jpeg;base64,{img['data']}" />
-              <div class="cap">{img['timestamp']}</div>
-            </div>
-            """
-        gallery += "</div>"
-
-    html = f"""
-    <!doctype html>
-    <html>
-    <head>
-      <meta charset="utf-8">
-      <style>
-        body {{ font-family: Arial, sans-serif; padding: 24px; color: #111; }}
-        .header {{ display:flex; align-items:center; gap:14px; border-bottom: 4px solid #cc0000; padding-bottom: 14px; margin-bottom: 14px; }}
-        .header img {{ height: 46px; }}
-        h1 {{ margin:0; color:#cc0000; font-size: 22px; }}
-        .sub {{ color:#555; font-size: 12px; margin-top: 4px; }}
-        .meta {{ display:grid; grid-template-columns: 1fr 1fr; gap: 10px; margin: 12px 0 6px; }}
-        .box {{ border:1px solid #ddd; border-radius: 8px; padding: 10px; font-size: 12px; }}
-        .k {{ color:#666; font-size:11px; }}
-        .v {{ font-weight:700; }}
-        table {{ width:100%; border-collapse:collapse; font-size: 11px; margin-top: 12px; }}
-        th, td {{ border:1px solid #ddd; padding: 8px; vertical-align: top; }}
-        th {{ background:#111; color:#fff; }}
-        tr:nth-child(even) {{ background:#fafafa; }}
-        h2 {{ color:#cc0000; margin: 18px 0 10px; font-size: 14px; border-bottom: 2px solid #cc0000; padding-bottom: 6px; }}
-        .grid {{ display:grid; grid-template-columns: repeat(2, 1fr); gap: 12px; }}
-        .card {{ border:1px solid #ddd; border-radius: 8px; overflow:hidden; }}
-        .card img {{ width:100%; height:auto; display:block; }}
-        .cap {{ padding: 8px; font-size: 10px; color:#555; }}
-        .foot {{ margin-top: 16px; border-top: 1px solid #ddd; padding-top: 10px; font-size: 10px; color:#666; text-align:center; }}
-      </style>
-    </head>
-    <body>
-      <div class="header">
-        <img src="data:image/png;base64,{_logo_b64()}" />
-        <div>
-          <h1>Vessel Journey Report (VJR)</h1>
-          <div class="sub">Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</div>
-        </div>
-      </div>
-
-      <div class="meta">
-        <div class="box"><div class="k">Report Date</div><div class="v">{vjr.get('date','')}</div></div>
-        <div class="box"><div class="k">Vessel</div><div class="v">{vjr.get('vessel','')}</div></div>
-        <div class="box"><div class="k">IMO</div><div class="v">{vjr.get('imo','')}</div></div>
-        <div class="box"><div class="k">Master</div><div class="v">{vjr.get('master','')}</div></div>
-        <div class="box"><div class="k">Departure</div><div class="v">{vjr.get('departure','')}</div></div>
-        <div class="box"><div class="k">Arrival</div><div class="v">{vjr.get('arrival','')}</div></div>
-      </div>
-
-      <h2>Navigation Log</h2>
-      <table>
-        <thead>
-          <tr>
-            <th>#</th><th>Date</th><th>Time</th><th>Lat</th><th>Lon</th><th>Speed</th><th>COG</th>
-          </tr>
-        </thead>
-        <tbody>{nav_rows if nav_rows else '<tr><td colspan="7">No navigation samples</td></tr>'}</tbody>
-      </table>
-
-      {gallery}
-
-      <div class="foot">Generated by GDS - Maritime Management System | &copy; {datetime.now().year}</div>
-    </body>
-    </html>
-    """
-
-    pdf = HTML(string=html).write_pdf()
-    return Response(pdf, mimetype="application/pdf",
-                    headers={"Content-Disposition": "attachment; filename=VJR_Report.pdf"})
-
-# ------------------------------------------------------------------------------
-# UI
-# ------------------------------------------------------------------------------
-
-LOGIN_HTML = r"""
-<!doctype html>
-<html>
-<head>
-  <meta charset="utf-8">
-  <meta name="viewport" content="width=device-width, initial-scale=1">
-  <title>GDS Login</title>
-  <style>
-    :root{
-      --bg:#070709; --panel:#0f0f13; --border:#262631;
-      --red:#cc0000; --red2:#ff1f1f; --text:#ffffff; --muted:#a7a7b3;
-    }
-    body{
-      background:
-        radial-gradient(1200px 600px at 10% 10%, rgba(204,0,0,.14), transparent 60%),
-        radial-gradient(900px 500px at 90% 20%, rgba(255,31,31,.10), transparent 55%),
-        var(--bg);
-      color:var(--text);font-family:Segoe UI,Arial,sans-serif;
-      display:flex;min-height:100vh;align-items:center;justify-content:center;margin:0;
-    }
-    .card{
-      width:380px;background:linear-gradient(180deg, rgba(255,255,255,.04), transparent 60%), var(--panel);
-      border:1px solid var(--border);border-radius:14px;box-shadow:0 18px 50px rgba(0,0,0,.55);padding:22px;
-    }
-    .head{display:flex;align-items:center;gap:12px;margin-bottom:14px;}
-    .head img{height:40px;filter: drop-shadow(0 10px 24px rgba(0,0,0,.5));}
-    h1{font-size:15px;margin:0;letter-spacing:.3px;}
-    .sub{font-size:12px;color:var(--muted);margin-top:3px;}
-    label{font-size:10px;color:var(--muted);text-transform:uppercase;letter-spacing:.8px;font-weight:800;display:block;margin-top:12px;margin-bottom:6px;}
-    input{width:100%;padding:11px 10px;background:rgba(0,0,0,.45);border:1px solid var(--border);border-radius:10px;color:var(--text);}
-    input:focus{outline:none;border-color:rgba(255,31,31,.65);box-shadow:0 0 0 3px rgba(255,31,31,.12);}
-    button{width:100%;margin-top:14px;padding:11px;border:0;border-radius:10px;background:linear-gradient(180deg, var(--red2), var(--red));
-           color:#fff;font-weight:900;text-transform:uppercase;letter-spacing:.8px;cursor:pointer;}
-    .err{margin-top:10px;background:rgba(255,31,31,.10);border:1px solid rgba(255,31,31,.6);color:#ff8a8a;padding:10px;border-radius:10px;font-size:12px;}
-    .hint{margin-top:10px;font-size:11px;color:var(--muted);line-height:1.5;}
-    code{background:rgba(255,255,255,.06);padding:2px 6px;border-radius:8px;border:1px solid rgba(255,255,255,.08);}
-  </style>
-</head>
-<body>
-  <div class="card">
-    <div class="head">
-      <img src="/assets/logo" alt="GDS">
-      <div>
-        <h1>GDS Vessel Management System</h1>
-        <div class="sub">Black/Red Operational Console</div>
-      </div>
-    </div>
-    <form method="POST">
-      <label>Username</label>
-      <input name="username" placeholder="captain / operator / viewer" autocomplete="username" required>
-      <label>Password</label>
-      <input type="password" name="password" autocomplete="current-password" required>
-      <button type="submit">Login</button>
-      {% if error %}<div class="err">{{ error }}</div>{% endif %}
-      <div class="hint">
-        Demo users:<br>
-        <code>captain / captain123</code><br>
-        <code>operator / operator123</code><br>
-        <code>viewer / viewer123</code>
-      </div>
-    </form>
-  </div>
-</body>
-</html>
-"""
-
-# NOTE: This HTML is your previous professional UI with added:
-# - Gallery panels in VJR & VDR
-# - VJR PDF button
-# - Live gallery loader in JS
-
-HTML_DASHBOARD = r'''<!DOCTYPE html>
-<html lang="en">
-<head>
-  <meta charset="UTF-8">
-  <meta name="viewport" content="width=device-width, initial-scale=1.0">
-  <title>GDS - Vessel Management</title>
-  <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css" />
-  <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
-  <style>
-  /* ===== NAVIGATION FEED ===== */
-
-.nav-grid{
-  display:grid;
-  grid-template-columns:1fr 1fr;
-  gap:14px;
-}
-
-.nav-card{
-  background:rgba(255,255,255,0.03);
-  border:1px solid rgba(255,255,255,0.08);
-  border-radius:10px;
-  padding:12px;
-  text-align:center;
-}
-
-.nav-card.wide{
-  grid-column:span 2;
-}
-
-.nav-label{
-  font-size:12px;
-  color:#aaa;
-  letter-spacing:0.5px;
-}
-
-.nav-value{
-  font-size:22px;
-  font-weight:600;
-  color:#00ff99;
-  margin-top:6px;
-}
-
-.nav-value.big{
-  font-size:38px;
-  font-weight:800;
-  letter-spacing:.6px;
-
-}
-
-.nav-unit{
-  font-size:11px;
-  color:#888;
-}
-
-.nav-status{
-  grid-column:span 2;
-  display:flex;
-  justify-content:space-between;
-  align-items:center;
-  padding:10px 14px;
-  border-radius:10px;
-  background:rgba(255,0,0,0.08);
-  border:1px solid rgba(255,0,0,0.3);
-}
-.sys-health{
-  display:flex;
-  gap:8px;
-}
-
-.health-pill{
-  padding:4px 10px;
-  border-radius:20px;
-  font-size:11px;
-  font-weight:700;
-  letter-spacing:.4px;
-}
-
-.health-pill.ok{
-  background:rgba(0,208,132,.15);
-  color:#00d084;
-  border:1px solid rgba(0,208,132,.4);
-}
-
-.health-pill.warn{
-  background:rgba(255,204,0,.15);
-  color:#ffcc00;
-  border:1px solid rgba(255,204,0,.4);
-}
-
-.health-pill.bad{
-  background:rgba(255,68,102,.15);
-  color:#ff4466;
-  border:1px solid rgba(255,68,102,.4);
-}
-
-.status-bad{
-  color:#ff4d4d;
-  font-weight:700;
-}
-
-.status-good{
-  color:#00ff99;
-  font-weight:700;
-}
-
-.nav-time{
-  grid-column:span 2;
-  text-align:right;
-  font-size:12px;
-  color:#aaa;
-}
-
-    :root{
-      --bg:#070709;
-      --panel:#0f0f13;
-      --panel2:#13131a;
-      --border:#262631;
-      --text:#ffffff;
-      --muted:#a7a7b3;
-      --red:#cc0000;
-      --red2:#ff1f1f;
-      --good:#00d084;
-      --warn:#ffcc00;
-      --bad:#ff4466;
-      --shadow: 0 18px 55px rgba(0,0,0,.55);
-    }
-    *{ margin:0; padding:0; box-sizing:border-box; }
-    html, body{ height:100%; background: var(--bg); color:var(--text); font-family: Segoe UI, Arial, sans-serif; }
-    body{
-      display:flex; flex-direction:column;
-      background:
-        radial-gradient(1200px 700px at 10% 10%, rgba(204,0,0,.14), transparent 60%),
-        radial-gradient(900px 600px at 90% 20%, rgba(255,31,31,.10), transparent 55%),
-        var(--bg);
-    }
-    .header{
-      display:flex; align-items:center; justify-content:space-between; gap:12px;
-      padding: 14px 16px;
-      border-bottom: 1px solid rgba(255,255,255,.06);
-      background: linear-gradient(180deg, rgba(255,255,255,.04), transparent 70%);
-      backdrop-filter: blur(8px);
-      flex-shrink:0;
-    }
-    .brand{ display:flex; align-items:center; gap:12px; min-width: 280px; }
-    .brand img{
-      height: 44px; width:auto; display:block;
-      filter: drop-shadow(0 10px 26px rgba(0,0,0,.55));
-    }
-    .brand h1{ font-size: 15px; letter-spacing:.3px; margin:0; }
-    .brand p{ font-size: 11px; color: var(--muted); margin-top:2px; }
-    .hdr-right{ display:flex; align-items:center; gap:10px; flex-wrap:wrap; justify-content:flex-end; }
-    .pill{
-      display:flex; align-items:center; gap:8px;
-      padding: 8px 10px;
-      border: 1px solid rgba(255,255,255,.08);
-      border-radius: 999px;
-      background: rgba(0,0,0,.35);
-      font-size: 11px;
-      color: var(--text);
-    }
-    .pill b{ color: var(--red2); }
-    .clock{
-      font-family: ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, "Courier New", monospace;
-      font-size: 12px;
-      padding: 8px 10px;
-      border-radius: 10px;
-      border: 1px solid rgba(255,31,31,.30);
-      background: rgba(255,31,31,.08);
-    }
-    .pill{
-  padding:4px 10px;
-  border-radius:999px;
-  font-size:12px;
-  font-weight:600;
-  border:1px solid rgba(255,255,255,.35);
-  color:#fff;
-  background:rgba(0,0,0,.25);
-  white-space:nowrap;
-}
-
-    .link{ color: #ffd1d1; text-decoration: none; font-weight: 800; font-size: 12px; }
-    .link:hover{ text-decoration: underline; }
-
-    .tabs{
-      display:flex; gap:8px; padding: 10px 14px;
-      border-bottom: 1px solid rgba(255,255,255,.06);
-      background: rgba(0,0,0,.18);
-      flex-shrink:0;
-      overflow-x:auto;
-    }
-    .tab-btn{
-      border: 1px solid rgba(255,255,255,.08);
-      background: rgba(0,0,0,.25);
-      color: var(--muted);
-      padding: 10px 14px;
-      border-radius: 999px;
-      cursor:pointer;
-      font-weight: 900;
-      font-size: 11px;
-      text-transform: uppercase;
-      letter-spacing: .8px;
-      white-space: nowrap;
-      transition: all .18s ease;
-    }
-    .tab-btn:hover{ border-color: rgba(255,31,31,.30); color: #fff; }
-    .tab-btn.active{
-      background: linear-gradient(180deg, rgba(255,31,31,.25), rgba(204,0,0,.18));
-      border-color: rgba(255,31,31,.55);
-      color:#fff;
-    }
-
-    .content-wrapper{ flex:1; overflow:hidden; display:flex; }
-    .tab-content{ display:none; width:100%; height:100%; }
-    .tab-content.active{ display:block; }
-
-    .grid2{
-      display:grid;
-      grid-template-columns: 1fr 1fr;
-      height:100%;
-      gap: 12px;
-      padding: 12px;
-      overflow:hidden;
-    }
-    .grid3{
-      display:grid;
-      grid-template-columns: 1fr 1fr 1fr;
-      height:100%;
-      gap: 12px;
-      padding: 12px;
-      overflow:hidden;
-    }
-
-    .panel{
-      background: linear-gradient(180deg, rgba(255,255,255,.04), transparent 60%), var(--panel);
-      border: 1px solid rgba(255,255,255,.08);
-      border-radius: 14px;
-      box-shadow: var(--shadow);
-      overflow:hidden;
-      display:flex;
-      flex-direction:column;
-      min-height: 0;
-    }
-/* ===============================
-   CONNECTIVITY STATUS COLORS
-   =============================== */
-
-.status-ok {
-  color: #2ecc71;   /* green */
-  font-weight: 600;
-}
-
-.status-warn {
-  color: #f39c12;   /* orange */
-  font-weight: 600;
-}
-
-.status-bad {
-  color: #e74c3c;   /* red */
-  font-weight: 600;
-}
-
-.status-muted {
-  color: #7f8c8d;   /* gray */
-}
-
-    .panel-header{
-      padding: 12px 14px;
-      display:flex;
-      justify-content:space-between;
-      align-items:center;
-      gap:10px;
-      border-bottom: 1px solid rgba(255,255,255,.06);
-      background: rgba(0,0,0,.22);
-      font-weight: 950;
-      font-size: 11px;
-      text-transform: uppercase;
-      letter-spacing: .9px;
-    }
-.panel-head .sub{
-  font-size:11px;
-  color:#aaa;
-  margin-left:8px;
-}
-
-    .panel-header .hint{ font-size: 11px; color: var(--muted); font-weight: 800; text-transform:none; letter-spacing:0; }
-    .panel-content{ padding: 14px; overflow:auto; min-height:0; }
-
-    .raw{
-      background: rgba(0,0,0,.45);
-      border: 1px solid rgba(255,255,255,.08);
-      border-radius: 12px;
-      padding: 12px;
-      color: #b9ffdb;
-      font-family: ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, "Courier New", monospace;
-      font-size: 11px;
-      word-break: break-all;
-      margin-bottom: 12px;
-    }
-
-    .data-grid{
-      display:grid;
-      grid-template-columns: 1fr 1fr;
-      gap: 10px;
-      margin-bottom: 10px;
-    }
-    .card{
-      background: rgba(0,0,0,.30);
-      border: 1px solid rgba(255,255,255,.08);
-      border-radius: 12px;
-      padding: 12px;
-    }
-    .label{
-      color: var(--muted);
-      font-size: 10px;
-      text-transform: uppercase;
-      letter-spacing: .9px;
-      font-weight: 900;
-      margin-bottom: 6px;
-    }
-    .value{
-      font-family: ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, "Courier New", monospace;
-      font-weight: 950;
-      color: var(--good);
-      font-size: 16px;
-      letter-spacing: .2px;
-    }
-    .value.red{ color: #ff8a8a; }
-
-    .form-group{ margin-bottom: 12px; }
-    .form-label{
-      display:block;
-      margin-bottom: 6px;
-      font-size: 10px;
-      font-weight: 900;
-      text-transform: uppercase;
-      letter-spacing: .9px;
-      color: var(--muted);
-    }
-    input, select, textarea{
-      width:100%;
-      padding: 10px 10px;
-      border-radius: 12px;
-      border: 1px solid rgba(255,255,255,.10);
-      background: rgba(0,0,0,.45);
-      color: #fff;
-      font-size: 12px;
-      outline:none;
-      transition: box-shadow .15s ease, border-color .15s ease;
-    }
-    input:focus, select:focus, textarea:focus{
-      border-color: rgba(255,31,31,.55);
-      box-shadow: 0 0 0 3px rgba(255,31,31,.14);
-    }
-    textarea{ min-height: 64px; resize: vertical; }
-
-    .btn{
-      width:100%;
-      padding: 11px 12px;
-      border: 0;
-      border-radius: 12px;
-      cursor:pointer;
-      font-weight: 950;
-      font-size: 11px;
-      letter-spacing: .9px;
-      text-transform: uppercase;
-      background: linear-gradient(180deg, var(--red2), var(--red));
-      color: #fff;
-      transition: transform .12s ease, box-shadow .12s ease, filter .12s ease;
-      box-shadow: 0 12px 28px rgba(204,0,0,.22);
-    }
-    .btn:hover{ transform: translateY(-1px); filter: brightness(1.02); }
-    .btn:active{ transform: translateY(0); }
-    .btn.secondary{
-      background: rgba(255,255,255,.06);
-      border: 1px solid rgba(255,255,255,.10);
-      box-shadow:none;
-    }
-    .btn.secondary:hover{ border-color: rgba(255,31,31,.35); }
-    .btn.danger{
-      background: linear-gradient(180deg, #ff4466, #c2183a);
-      box-shadow: 0 12px 28px rgba(255,68,102,.18);
-    }
-    .btn.disabled{ opacity:.45; pointer-events:none; }
-
-    .row2{ display:grid; grid-template-columns: 1fr 1fr; gap: 10px; }
-    .mapbox{
-      width:100%;
-      height: 360px;
-      border-radius: 14px;
-      border: 1px solid rgba(255,255,255,.10);
-      overflow:hidden;
-      background:#000;
-    }
-
-    .cam-wrap{
-      position:relative;
-      width:100%;
-      height: 260px;
-      border-radius: 14px;
-      border: 1px solid rgba(255,255,255,.10);
-      overflow:hidden;
-      background:#000;
-    }
-    .cam-wrap img{
-      width:100%;
-      height:100%;
-      object-fit: cover;
-      display:block;
-    }
-    .badge{
-      position:absolute;
-      left:12px;
-      top:12px;
-      padding: 7px 10px;
-      border-radius: 999px;
-      background: rgba(0,0,0,.55);
-      border: 1px solid rgba(255,255,255,.12);
-      font-size: 11px;
-      font-weight: 900;
-      color: #fff;
-    }
-    .badge b{ color: var(--red2); }
-
-    .joy{
-      width: 160px; height:160px; border-radius:50%;
-      margin: 0 auto;
-      background: rgba(0,0,0,.45);
-      border: 1px solid rgba(255,255,255,.12);
-      position:relative;
-      touch-action:none;
-      box-shadow: inset 0 0 0 1px rgba(255,31,31,.14);
-    }
-    .stick{
-      width: 48px; height:48px; border-radius: 50%;
-      position:absolute; left:50%; top:50%;
-      transform: translate(-50%,-50%);
-      background: radial-gradient(circle at 30% 25%, rgba(255,255,255,.22), rgba(255,255,255,.06)),
-                  linear-gradient(180deg, rgba(255,31,31,.95), rgba(204,0,0,.85));
-      box-shadow: 0 16px 28px rgba(0,0,0,.55);
-    }
-    /* ===== PTZ PANEL WRAPPER (NEW) ===== */
-
-.ptz-panel{
-  margin-top: 14px;
-  padding-top: 12px;
-  border-top: 1px solid rgba(255,255,255,.08);
-  text-align: center;
-}
-
-.ptz-title{
-  font-size: 11px;
-  font-weight: 900;
-  letter-spacing: .9px;
-  text-transform: uppercase;
-  color: var(--muted);
-  margin-bottom: 10px;
-}
-
-.ptz-zoom{
-  margin-top: 10px;
-  display: grid;
-  grid-template-columns: 1fr 1fr;
-  gap: 10px;
-}
-
-    table{ width:100%; border-collapse:collapse; font-size: 11px; }
-    th{
-      text-align:left;
-      padding: 10px;
-      background: rgba(0,0,0,.35);
-      border-bottom: 2px solid rgba(255,31,31,.35);
-      color: #ffd1d1;
-      font-weight: 950;
-    }
-    td{
-      padding: 9px 10px;
-      border-bottom: 1px solid rgba(255,255,255,.06);
-      color: #e9e9ee;
-    }
-    tr:hover td{ background: rgba(255,31,31,.06); }
-
-    .note{
-      padding: 12px;
-      background: rgba(255,31,31,.07);
-      border: 1px solid rgba(255,31,31,.25);
-      border-radius: 14px;
-      color: #ffd1d1;
-      font-size: 12px;
-      line-height: 1.55;
-    }
-
-    .notification{
-      position: fixed; right: 16px; bottom: 16px;
-      padding: 12px 14px;
-      border-radius: 14px;
-      background: rgba(0,0,0,.65);
-      border: 1px solid rgba(255,255,255,.10);
-      box-shadow: var(--shadow);
-      z-index: 9999;
-      font-weight: 900;
-      letter-spacing: .2px;
-      max-width: 360px;
-    }
-    .notification.ok{ border-color: rgba(0,208,132,.35); color: #b9ffdb; }
-    .notification.err{ border-color: rgba(255,68,102,.45); color: #ffd1d1; }
-    .notification.warn{ border-color: rgba(255,204,0,.45); color: #fff2b3; }
-
-    /* NEW: image galleries */
-    .image-grid{
-      display:grid;
-      grid-template-columns: repeat(auto-fill, minmax(140px, 1fr));
-      gap: 10px;
-    }
-    .thumb{
-      position:relative;
-      border: 1px solid rgba(255,255,255,.10);
-      border-radius: 12px;
-      overflow:hidden;
-      background: rgba(0,0,0,.35);
-    }
-    .thumb img{ width:100%; display:block; }
-
-    .xbtn{
-      position:absolute;
-      top:6px; right:6px;
-      width:28px; height:28px;
-      border-radius:10px;
-      border:1px solid rgba(255,255,255,.14);
-      background: rgba(0,0,0,.55);
-      color:#fff;
-      font-weight:900;
-      cursor:pointer;
-      line-height:26px;
-      text-align:center;
-      padding:0;
-    }
-    .xbtn:hover{ border-color: rgba(255,31,31,.55); }
-    .thumb .cap{
-      padding: 8px;
-      font-size: 10px;
-      color: var(--muted);
-      border-top: 1px solid rgba(255,255,255,.06);
-    }
-
-    @media (max-width: 1100px){
-      .grid3{ grid-template-columns: 1fr 1fr; }
-      .grid2{ grid-template-columns: 1fr; }
-      .brand{ min-width: auto; }
-      .mapbox{ height: 300px; }
-      .cam-wrap{ height: 240px; }
-    }
-    .dot{
-  width:10px;
-  height:10px;
-  border-radius:50%;
-  display:inline-block;
-  margin-right:6px;
-}
-
-.dot.red{ background:#ff4466; }
-.dot.green{ background:#00d084; }
-.dot.yellow{ background:#ffcc00; }
-
-  </style>
-</head>
-<body>
-  <div class="header">
-    <div class="brand">
-      <img src="/assets/logo" alt="GDS">
-      <div>
-        <h1>GDS Vessel Management System</h1>
-        <p>Black/Red Operational Console</p>
-      </div>
-    </div>
-    <div class="hdr-right">
-    <div class="pill" id="netStatus">MODE: --</div>
-      <div class="pill">User: <b>{{ user }}</b></div>
-      <div class="pill">Role: <b>{{ role }}</b></div>
-      <div class="clock" id="clock">--:--:--</div>
-      <a class="link" href="/logout">Logout</a>
-    </div>
-  </div>
-<div class="sys-health">
-  <span class="health-pill ok" id="gnss_health">GNSS: NO FIX</span>
-  <span class="health-pill warn" id="net_health">NET: OFFLINE</span>
-  <span class="health-pill ok" id="db_health">DB: LOCAL</span>
-</div>
-
-  <div class="tabs">
-    
-    <button class="tab-btn active" onclick="openTab('navigation')">Navigation</button>
-
-    <button class="tab-btn" onclick="openTab('connectivity')">Connectivity & Sync</button>
-
-    <button class="tab-btn" onclick="openTab('weather')">Weather</button>
-    <button class="tab-btn" onclick="openTab('camera')">Camera/PTZ</button>
-    <button class="tab-btn" onclick="openTab('vjr')">VJR</button>
-    <button class="tab-btn" onclick="openTab('vdr')">VDR</button>
-    <button class="tab-btn" onclick="openTab('logs')">Logs</button>
-    
-  </div>
-  <div class="tab-content active" id="tab-navigation">
-
-  <div class="grid2">
-
-    <!-- LEFT: NAVIGATION FEED -->
-    <div class="panel">
-  <div class="panel-header">
-    NAVIGATION FEED
-    <span class="hint">MarineLite GNSS (Realtime)</span>
-  </div>
-
-  <div class="panel-content nav-grid">
-
-    <!-- POSITION -->
-    <div class="nav-card">
-      <div class="nav-label">Latitude</div>
-      <div class="nav-value" id="nav_lat">--</div>
-      <div class="nav-unit"> N</div>
-    </div>
-
-    <div class="nav-card">
-      <div class="nav-label">Longitude</div>
-      <div class="nav-value" id="nav_lon">--</div>
-      <div class="nav-unit"> E</div>
-    </div>
-
-    <!-- HEADING -->
-    <div class="nav-card wide">
-      <div class="nav-label">Heading</div>
-      <div class="nav-value big" id="nav_heading">--</div>
-      <div class="nav-unit">deg</div>
-    </div>
-
-    <!-- STATUS -->
-    <div class="nav-status">
-  <span>GNSS STATUS</span>
-  <span class="status-bad" id="gnss_fix">NO FIX</span>
-</div>
-
-
-    <!-- TIME -->
-    <div class="nav-time">
-      Last Update:
-      <span id="nav_time">--</span>
-    </div>
-
-  </div>
-</div>
-
-
-    <!-- RIGHT: LIVE MAP -->
-    <div class="panel">
-      <div class="panel-header">
-        LIVE MAP
-        <span class="hint">Realtime Vessel Position</span>
-      </div>
-
-      <div class="panel-content">
-        <div class="mapbox" id="mapNav"></div>
-
-        <div class="note">
-          Vessel position is updated from MarineLite GNSS via local database (offline-capable).
-        </div>
-      </div>
-    </div>
-
-  </div>
-</div>
-
-</div>
-
-<div class="tab-content" id="tab-connectivity">
-
-  <div class="grid3">
-
-    <!-- ================= NETWORK STATUS ================= -->
-    <div class="panel">
-      <div class="panel-header">
-        Network Status
-        <span class="hint">Current connectivity</span>
-      </div>
-      <div class="panel-content">
-
-        <table>
-          <tr><th>Interface</th><th>Status</th><th>Details</th></tr>
-
-          <tr>
-  <td>Wi-Fi</td>
-  <td>
-    <span class="dot red" id="wifi_dot"></span>
-    <span id="wifi_status">--</span>
-  </td>
-  <td id="wifi_info">--</td>
-</tr>
-
-
-          <tr>
-  <td>SIM / LTE</td>
-  <td>
-    <span class="dot red" id="sim_dot"></span>
-    <span id="sim_status">--</span>
-  </td>
-  <td id="sim_info">--</td>
-</tr>
-
-
-          <tr>
-  <td>Internet</td>
-  <td>
-    <span class="dot red" id="net_dot"></span>
-    <span id="net_status">--</span>
-  </td>
-  <td id="net_info">--</td>
-</tr>
-
-
-          <tr>
-            <td>Active Path</td>
-            <td colspan="2" id="active_path">--</td>
-          </tr>
-
-        </table>
-
-      </div>
-    </div>
-
-    <!-- ================= CONNECTION MANAGEMENT ================= -->
-    <div class="panel">
-      <div class="panel-header">
-        Connection Management
-        <span class="hint">Policy & override</span>
-      </div>
-      <div class="panel-content">
-
-        <div class="radio-group">
-          <label>
-            <input type="radio" name="conn_mode" value="auto" checked
-                   onchange="setConnMode('auto')">
-            Automatic (System decides)
-          </label>
-
-          <label>
-            <input type="radio" name="conn_mode" value="manual"
-                   onchange="setConnMode('manual')">
-            Manual (Operator selects)
-          </label>
-        </div>
-
-        <div class="row2" style="margin-top:12px;">
-          <button class="btn secondary" id="btn_wifi"
-                  onclick="requestManualPath('wifi')" disabled>
-            Use Wi-Fi
-          </button>
-
-          <button class="btn secondary" id="btn_sim"
-                  onclick="requestManualPath('sim')" disabled>
-            Use SIM / LTE
-          </button>
-        </div>
-
-        <div class="note" style="margin-top:10px;">
-          Manual selection is only allowed when policy is set to Manual.
-        </div>
-
-      </div>
-    </div>
-
-    <!-- ================= OFFLINE SYNC ================= -->
-    <div class="panel">
-      <div class="panel-header">
-        Offline Data Sync
-      </div>
-      <div class="panel-content">
-
-        <div class="data-grid">
-          <div class="card">
-            <div class="label">Pending Records</div>
-            <div class="value" id="sync_pending">--</div>
-          </div>
-
-          <div class="card">
-            <div class="label">Last Sync</div>
-            <div class="value" id="sync_last">--</div>
-          </div>
-        </div>
-
-        <div style="margin-top:12px;">
-          <button class="btn primary" onclick="requestSync()">
-            Sync Offline Records
-          </button>
-
-          <button class="btn secondary" onclick="refreshConnectivity()">
-            Refresh Status
-          </button>
-        </div>
-
-      </div>
-    </div>
-
-  </div>
-</div>
-
-    </div>
-
-    
-
-  </div>
-</div>
-
-
-    <!-- ================= WEATHER TAB ================= -->
-<div class="tab-content" id="tab-weather">
-  <div class="grid2">
-
-    <!-- -------- LEFT: WEATHER DATA -------- -->
-    <div class="panel">
-      <div class="panel-header">Weather Feed</div>
-      <div class="panel-content">
-
-        <div class="data-grid">
-
-          <!-- Core Weather -->
-          <div class="card">
-            <div class="label">Wind Speed (m/s)</div>
-            <div class="value" id="wspd">--</div>
-          </div>
-
-          <div class="card">
-            <div class="label">Wind Direction </div>
-            <div class="value" id="wdir">--</div>
-          </div>
-
-          <div class="card">
-            <div class="label">Temperature (C)</div>
-            <div class="value" id="temp">--</div>
-          </div>
-
-          <div class="card">
-            <div class="label">Humidity (%RH)</div>
-            <div class="value" id="hum">--</div>
-          </div>
-
-          <div class="card">
-            <div class="label">Pressure (hPa)</div>
-            <div class="value" id="pres">--</div>
-          </div>
-
-          <div class="card">
-            <div class="label">Last Update</div>
-            <div class="value red" id="wts">--</div>
-          </div>
-
-          <!-- Environmental (from Firebase) -->
-          <div class="card">
-            <div class="label">Noise (dB)</div>
-            <div class="value" id="noise">--</div>
-          </div>
-
-          <div class="card">
-            <div class="label">PM2.5 </div>
-            <div class="value" id="pm25">--</div>
-          </div>
-
-          <div class="card">
-            <div class="label">PM10 </div>
-            <div class="value" id="pm10">--</div>
-          </div>
-
-          <div class="card">
-            <div class="label">Rainfall (mm)</div>
-            <div class="value" id="rain">--</div>
-          </div>
-
-        </div>
-
-        <div style="margin-top:10px">
-          <button class="btn secondary"
-                  onclick="notify('Weather feed is Active (Local DB)', 'ok')">
-            Status
-          </button>
-        </div>
-
-      </div>
-    </div>
-
-    <!-- -------- RIGHT: WEATHER MAP -------- -->
-    <div class="panel">
-      <div class="panel-header">Map (Weather Context)</div>
-      <div class="panel-content">
-
-        <div class="mapbox" id="mapWeather"></div>
-
-        <div style="height:10px"></div>
-
-        <div class="note">
-          Weather data is linked to vessel position for contextual awareness.
-        </div>
-
-      </div>
-    </div>
-
-  </div>
-</div>
-<!-- =============== END WEATHER TAB =============== -->
-
-
-    <!-- CAMERA TAB -->
-<div class="tab-content" id="tab-camera">
-  <div class="grid3">
-
-    <!-- ================= PTZ FEED ================= -->
-    <div class="panel">
-      <div class="panel-header">
-        PTZ Feed <span class="hint">Mode: {{ camera_mode }}</span>
-      </div>
-
-      <div class="panel-content">
-
-        <!-- CAMERA VIEW -->
-        <div class="cam-wrap">
-          <img id="camImg" src="/camera/stream" alt="Camera feed">
-          <div class="badge">
-            CAMERA: <b id="camMode">{{ camera_mode }}</b>
-          </div>
-        </div>
-<!-- IMAGE ENCODING + FIREBASE OPTIONS -->
-<div class="row2" style="margin-top:10px; align-items:center;">
-  <label class="hint" style="display:flex; gap:8px; align-items:center;">
-    <input type="checkbox" id="fbUpload">
-    Upload to Firebase (disabled offline)
-
-  </label>
-
-  <div style="display:flex; gap:10px; justify-content:flex-end; flex-wrap:wrap;">
-    <label class="hint">
-      JPEG Quality
-      <select id="jpgQuality">
-        <option value="60">60</option>
-        <option value="70">70</option>
-        <option value="75" selected>75</option>
-        <option value="85">85</option>
-      </select>
-    </label>
-
-    <label class="hint">
-      Max Width
-      <select id="jpgWidth">
-        <option value="640">640</option>
-        <option value="960">960</option>
-        <option value="1280" selected>1280</option>
-      </select>
-    </label>
-  </div>
-</div>
-
-        <!-- CAPTURE BUTTONS -->
-<div class="row2" style="margin-top:12px;">
-  <button class="btn secondary" onclick="captureFromPTZ('vjr')">
-    CAPTURE ? VJR
-  </button>
-
-  <button class="btn secondary" onclick="captureFromPTZ('vdr')">
-    CAPTURE ? VDR
-  </button>
-
-  <!-- NEW: FIREBASE CAPTURE BUTTON -->
-  <button class="btn primary" onclick="captureToFirebase()">
-    CAPTURE ? FIREBASE
-  </button>
-</div>
-
-
-        <!-- DELETE BUTTONS -->
-        <div class="row2" style="margin-top:10px;">
-          <button class="btn danger" onclick="deleteLastCapture('vjr')">
-            DELETE LAST (VJR)
-          </button>
-          <button class="btn danger" onclick="deleteLastCapture('vdr')">
-            DELETE LAST (VDR)
-          </button>
-        </div>
-
-        <!-- CONNECTION CONTROLS -->
-        <div style="height:10px"></div>
-        <div class="row2">
-          <button class="btn secondary" onclick="reconnectCamera()">
-            Reconnect
-          </button>
-          <button class="btn secondary" onclick="toggleCamRefresh()">
-            Refresh On/Off
-          </button>
-        </div>
-
-        <div style="height:10px"></div>
-        <div class="note" id="camNote">
-          PTZ controls are demo-safe (will respond even without hardware).
-        </div>
-
-      </div>
-    </div>
-
-    <!-- ================= PTZ CONTROLS ================= -->
-    <div class="panel">
-      <div class="panel-header">PTZ Controls</div>
-
-      <div class="panel-content">
-
-        <!-- JOYSTICK -->
-        <div class="joy" id="joy">
-          <div class="stick" id="stick"></div>
-        </div>
-
-        <div style="height:10px"></div>
-
-        <!-- ZOOM -->
-        <div class="row2">
-          <button class="btn secondary" onclick="controlCamera('zoom_in')">
-            Zoom +
-          </button>
-          <button class="btn secondary" onclick="controlCamera('zoom_out')">
-            Zoom -
-          </button>
-        </div>
-
-        <div style="height:10px"></div>
-
-        <!-- CAMERA MODES -->
-        <div class="row2">
-          <button class="btn secondary" onclick="controlCamera('led_toggle')">
-            LED
-          </button>
-          <button class="btn secondary" onclick="controlCamera('night_vision_toggle')">
-            Night
-          </button>
-        </div>
-
-        <div style="height:10px"></div>
-
-        <!-- PTZ SYNC -->
-        <div class="row2">
-          <button class="btn secondary" onclick="setPTZSync(true)">
-            Sync COG
-          </button>
-          <button class="btn secondary" onclick="setPTZSync(false)">
-            Unsync
-          </button>
-        </div>
-
-      </div>
-    </div>
-
-    <!-- ================= CAMERA STATUS ================= -->
-    <div class="panel">
-      <div class="panel-header">Camera Status</div>
-
-      <div class="panel-content">
-        <div class="raw" id="camStatus">Loading...</div>
-        <button class="btn secondary" onclick="updateCameraStatusUI()">
-          Refresh Status
-        </button>
-      </div>
-    </div>
-
-  </div>
-</div>
-
-
-    <!-- VJR TAB -->
-    <div class="tab-content" id="tab-vjr">
-      <div class="grid2">
-        <div class="panel">
-          <div class="panel-header">VJR - Journey Details</div>
-          <div class="panel-content">
-            <div class="form-group">
-              <label class="form-label">Report Date</label>
-              <input id="vjr_date" placeholder="YYYY-MM-DD">
-            </div>
-            <div class="form-group">
-              <label class="form-label">Vessel</label>
-              <input id="vjr_vessel" placeholder="Vessel name">
-            </div>
-            <div class="row2">
-              <div class="form-group">
-                <label class="form-label">IMO</label>
-                <input id="vjr_imo" placeholder="IMO">
-              </div>
-              <div class="form-group">
-                <label class="form-label">Master</label>
-                <input id="vjr_master" placeholder="Master name">
-              </div>
-            </div>
-            <div class="row2">
-              <div class="form-group">
-                <label class="form-label">Departure</label>
-                <input id="vjr_departure" placeholder="Port/Location">
-              </div>
-              <div class="form-group">
-                <label class="form-label">Arrival</label>
-                <input id="vjr_arrival" placeholder="Port/Location">
-              </div>
-            </div>
-
-            <div class="row2">
-              <button class="btn secondary" onclick="captureImage('vjr')">Capture Image (VJR)</button>
-              <button class="btn secondary" onclick="exportVJRPDF()">Export VJR PDF</button>
-            </div>
-            <div style="height:10px"></div>
-            <div class="row2">
-              <button class="btn danger" onclick="clearCaptures('vjr')">Clear Captures (VJR)</button>
-              <button class="btn secondary" onclick="notify('VJR will include navigation log + images.', 'ok')">Info</button>
-            </div>
-          </div>
-        </div>
-
-        <div class="panel">
-          <div class="panel-header">VJR - Captured Images <span class="hint" id="vjrCount">0</span></div>
-          <div class="panel-content">
-            <div class="image-grid" id="vjrGallery"></div>
-            <div style="height:10px"></div>
-            <div class="note">Captured images will be embedded into the VJR PDF report.</div>
-          </div>
-        </div>
-      </div>
-    </div>
-
-    <!-- VDR TAB -->
-    <div class="tab-content" id="tab-vdr">
-      <div class="grid2">
-        <div class="panel">
-          <div class="panel-header">VDR - Daily Report Entry</div>
-          <div class="panel-content">
-            <div class="form-group"><label class="form-label">Date</label><input id="vdr_date" placeholder="YYYY-MM-DD"></div>
-            <div class="row2">
-              <div class="form-group"><label class="form-label">Vessel</label><input id="vdr_vessel" placeholder="Vessel"></div>
-              <div class="form-group"><label class="form-label">IMO</label><input id="vdr_imo" placeholder="IMO"></div>
-            </div>
-            <div class="row2">
-              <div class="form-group"><label class="form-label">MMSI</label><input id="vdr_mmsi" placeholder="MMSI"></div>
-              <div class="form-group"><label class="form-label">Call Sign</label><input id="vdr_callsign" placeholder="Call Sign"></div>
-            </div>
-            <div class="row2">
-              <div class="form-group"><label class="form-label">Client</label><input id="vdr_client" placeholder="Client"></div>
-              <div class="form-group"><label class="form-label">Location</label><input id="vdr_location" placeholder="Location"></div>
-            </div>
-            <div class="row2">
-              <div class="form-group"><label class="form-label">Country</label><input id="vdr_country" placeholder="Country"></div>
-              <div class="form-group"><label class="form-label">Activity</label><input id="vdr_activity" placeholder="Activity"></div>
-            </div>
-            <div class="row2">
-              <div class="form-group"><label class="form-label">Weather</label><input id="vdr_weather" placeholder="Weather"></div>
-              <div class="form-group"><label class="form-label">Sea State</label><input id="vdr_sea_state" placeholder="Sea State"></div>
-            </div>
-            <div class="row2">
-              <div class="form-group"><label class="form-label">Crew Count</label><input id="vdr_crew_count" placeholder="Crew"></div>
-              <div class="form-group"><label class="form-label">Fuel Consumption</label><input id="vdr_fuel_consumption" placeholder="Fuel"></div>
-            </div>
-            <div class="form-group"><label class="form-label">Remarks</label><textarea id="vdr_remarks" placeholder="Remarks"></textarea></div>
-
-            <div class="row2">
-              <button class="btn secondary" onclick="captureImage('vdr')">Capture Image (VDR)</button>
-              <button class="btn secondary" onclick="saveVDRRecord()">Save VDR Record</button>
-            </div>
-            <div style="height:10px"></div>
-            <div class="row2">
-              <button class="btn secondary" onclick="exportVDRPDF()">Export VDR PDF</button>
-              <button class="btn danger" onclick="clearCaptures('vdr')">Clear Captures (VDR)</button>
-            </div>
-          </div>
-        </div>
-
-        <div class="panel">
-          <div class="panel-header">VDR - Records & Images <span class="hint" id="vdrCount">0</span></div>
-          <div class="panel-content">
-            <div class="row2">
-              <button class="btn secondary" onclick="exportVDRCSV()">Export CSV</button>
-              <button class="btn secondary" onclick="exportVDRExcel()">Export Excel</button>
-            </div>
-            <div style="height:10px"></div>
-            <div class="row2">
-              <button class="btn danger" onclick="deleteAllVDRRecords()">Delete All Records</button>
-              <button class="btn secondary" onclick="loadVDRList()">Refresh List</button>
-            </div>
-            <div style="height:12px"></div>
-            <div class="image-grid" id="vdrGallery"></div>
-            <div style="height:12px"></div>
-            <table>
-              <thead><tr><th>ID</th><th>Date</th><th>Vessel</th><th>Activity</th><th>Location</th><th>Weather</th></tr></thead>
-              <tbody id="vdrTable"><tr><td colspan="6">No records</td></tr></tbody>
-            </table>
-          </div>
-        </div>
-      </div>
-    </div>
-
-    <!-- LOGS TAB -->
-    <div class="tab-content" id="tab-logs">
-      <div class="grid2">
-        <div class="panel">
-          <div class="panel-header">System Logs</div>
-          <div class="panel-content">
-            <div class="note">
-              Navigation data is auto-logged into <b>nav_log.csv</b>. You can download it from the NAV tab.
-              VDR records are stored in memory (demo). Images are stored in memory (demo).
-            </div>
-          </div>
-        </div>
-
-        <div class="panel">
-          <div class="panel-header">Developer Info</div>
-          <div class="panel-content">
-            <div class="raw">
-              WeasyPrint available: {{ 'YES' if weasy else 'NO' }}
-              \nReportLab available: {{ 'YES' if True else 'NO' }}
-            </div>
-          </div>
-        </div>
-      </div>
-    </div>
-  </div>
-
-  <div id="toast" class="notification" style="display:none"></div>
-
-
-  <script>
-    // Role helpers
-    const ROLE_ORDER = {"Viewer":1,"Operator":2,"Captain":3};
-    let CURRENT_ROLE = "{{ role }}";
-
-    function can(minRole){
-      return (ROLE_ORDER[CURRENT_ROLE] || 0) >= (ROLE_ORDER[minRole] || 0);
-    }
-function updateNetStatus(){
-  const el = document.getElementById("netStatus");
-  if(!el) return;
-
-  if(navigator.onLine){
-    el.innerHTML = "MODE: <b>ONLINE</b>";
-    el.style.borderColor = "rgba(0,208,132,.45)";
-  }else{
-    el.innerHTML = "MODE: <b>OFFLINE</b>";
-    el.style.borderColor = "rgba(255,204,0,.45)";
-  }
-}
-
-window.addEventListener("online", updateNetStatus);
-window.addEventListener("offline", updateNetStatus);
-updateNetStatus();
-
-    function notify(msg, kind="ok"){
-      const t = document.getElementById("toast");
-      t.className = "notification " + kind;
-      t.textContent = msg;
-      t.style.display = "block";
-      clearTimeout(window.__toastTimer);
-      window.__toastTimer = setTimeout(()=>{ t.style.display = "none"; }, 2600);
-    }
-
-    // Clock
-    function tickClock(){
-      const now = new Date();
-      const pad = (n)=> String(n).padStart(2,"0");
-      document.getElementById("clock").textContent =
-        pad(now.getHours()) + ":" + pad(now.getMinutes()) + ":" + pad(now.getSeconds());
-    }
-    setInterval(tickClock, 1000); tickClock();
-
-    // Tabs
-    function openTab(tab){
-  document.querySelectorAll(".tab-btn").forEach(b=>b.classList.remove("active"));
-  document.querySelectorAll(".tab-content").forEach(c=>c.classList.remove("active"));
-  document.querySelector(`.tab-btn[onclick="openTab('${tab}')"]`).classList.add("active");
-  document.getElementById("tab-"+tab).classList.add("active");
-
-// ---- NEW: tab-specific actions ----
-  if(tab === "connectivity"){
-    refreshConnectivity();
-    refreshSyncStatus();
-  }
-  
-  // ?? FORCE WEATHER REFRESH WHEN WEATHER TAB OPENS
-  if(tab === "weather"){
-    fetchWeatherData();
-  }
-
-  // map fix
-  setTimeout(()=>{
-    try{ mapNav && mapNav.invalidateSize(); }catch(e){}
-    try{ mapWeather && mapWeather.invalidateSize(); }catch(e){}
-  }, 200);
-}
-
-
-    // Map - NAV (MarineLite Realtime Position Only)
-let mapNav, navMarker;
-
-mapNav = L.map('mapNav').setView([3.006633, 101.380133], 12);
-
-L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
-  maxZoom: 19
-}).addTo(mapNav);
-
-navMarker = L.marker([3.006633, 101.380133]).addTo(mapNav);
-
-
-    // Map - Weather
-    let mapWeather, weatherMarker;
-    mapWeather = L.map('mapWeather').setView([3.006633, 101.380133], 12);
-    L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', { maxZoom: 19 }).addTo(mapWeather);
-    weatherMarker = L.marker([3.006633, 101.380133]).addTo(mapWeather);
-
-    // NAV CSV download
-    function downloadNavCSV(){
-      window.location = "/export_nav_csv";
-    }
-
-    // Camera stream refresh toggle
-    let camRefresh = true;
-    function toggleCamRefresh(){
-      camRefresh = !camRefresh;
-      notify("Camera refresh " + (camRefresh ? "ON" : "OFF"), camRefresh ? "ok" : "warn");
-    }
-    
-
-    // Ensure all UI actions work (async fixes)
-    async function controlCamera(action, value=0){
-      if (!can("Operator")) return notify("Permission denied (Operator required).", "err");
-      try{
-        const res = await fetch("/camera/control", {
-          method:"POST",
-          headers:{ "Content-Type":"application/json" },
-          body: JSON.stringify({action, value})
-        });
-        const j = await res.json().catch(()=>({}));
-        if (res.ok){
-          notify(j.message || "Control OK", "ok");
-          updateCameraStatusUI();
-        } else {
-          notify(j.error || "Control failed", "err");
-        }
-      } catch(e){
-        notify("Control error: " + e, "err");
-      }
-    }
-
-    async function reconnectCamera(){
-      if (!can("Operator")) return notify("Permission denied (Operator required).", "err");
-      try{
-        const res = await fetch("/camera/reconnect", { method:"POST" });
-        const j = await res.json().catch(()=>({}));
-        if (res.ok){
-          notify("Reconnect: " + (j.reconnected ? "OK" : "FALLBACK"), j.reconnected ? "ok" : "warn");
-          updateCameraStatusUI();
-        } else {
-          notify("Reconnect failed", "err");
-        }
-      } catch(e){
-        notify("Reconnect error: " + e, "err");
-      }
-    }
-
-    async function setPTZSync(enabled){
-      if (!can("Operator")) return notify("Permission denied (Operator required).", "err");
-      try{
-        const res = await fetch("/camera/sync_cog", {
-          method:"POST",
-          headers:{ "Content-Type":"application/json" },
-          body: JSON.stringify({enabled})
-        });
-        const j = await res.json().catch(()=>({}));
-        if (res.ok){
-          notify("PTZ Sync: " + (j.enabled ? "ON" : "OFF"), "ok");
-          updateCameraStatusUI();
-        } else {
-          notify("Sync failed", "err");
-        }
-      } catch(e){
-        notify("Sync error: " + e, "err");
-      }
-    }
-
-    async function captureImage(type){
-      if (!can("Operator")) return notify("Permission denied (Operator required).", "err");
-      try{
-        const res = await fetch("/camera/capture", {
-          method:"POST",
-          headers:{ "Content-Type":"application/json" },
-          body: JSON.stringify({report_type:type})
-        });
-        const j = await res.json().catch(()=>({}));
-        if (res.ok && j.status === "success"){
-          notify("Captured image for " + type.toUpperCase(), "ok");
-          updateCaptureCounts();
-          loadCapturedImages();
-        } else {
-          notify("Capture failed: " + (j.error || j.message || res.status), "err");
-        }
-      } catch(e){
-        notify("Capture error: " + e, "err");
-      }
-    }
-function captureFromPTZ(reportType) {
-// Firebase upload is disabled in offline-first architecture
-const fbUpload = false;
-  const jpgQuality = Number(document.getElementById("jpgQuality")?.value || 75);
-  const jpgWidth = Number(document.getElementById("jpgWidth")?.value || 1280);
-
-  fetch("/camera/capture", {
-    method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({
-      report_type: reportType,
-      upload_firebase: fbUpload,
-      jpg_quality: jpgQuality,
-      max_width: jpgWidth
-    })
-  })
-  .then(r => r.json())
-  .then(d => {
-    console.log("Capture result:", d);
-
-    if (d.firebase_uploaded) {
-      console.log("Uploaded to Firebase:", d.firebase_url);
-    }
-  })
-  .catch(err => console.error("Capture error:", err));
-
-  // force live feed refresh (avoid frozen frame)
-  const img = document.getElementById("camImg");
-  if (img) {
-    img.src = "/camera/stream?t=" + Date.now();
-  }
-}
-/* ===== ADD THIS RIGHT BELOW ===== */
-
-function captureToFirebase() {
-  fetch("/camera/capture", {
-    method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({
-      report_type: "firebase",
-      upload_firebase: true,
-      include_pixel_data: true,
-      jpg_quality: 70,
-      max_width: 1280,
-      pixel_quality: 40
-    })
-  })
-  .then(r => r.json())
-  .then(d => {
-    console.log("Firebase capture:", d);
-    if (d.firebase_uploaded) {
-      alert("? Image sent to Firebase successfully");
-      console.log("Firebase URL:", d.firebase_url);
-    } else {
-      alert("? Capture done, but Firebase upload failed");
-    }
-  })
-  .catch(err => {
-    console.error("Firebase capture error:", err);
-    alert("? Firebase capture error (see console)");
-  });
-
-  const img = document.getElementById("camImg");
-  if (img) {
-    img.src = "/camera/stream?t=" + Date.now();
-  }
-}
-
-
-async function deleteLastCapture(reportType) {
-  if (!can("Operator")) return notify("Permission denied (Operator required).", "err");
-
-  try {
-    const res = await fetch("/camera/captured_images_full");
-    const data = await res.json().catch(() => ({}));
-
-    const list = (reportType === "vjr") ? (data.vjr || []) : (data.vdr || []);
-
-    if (!list.length) {
-      return notify("No images to delete for " + reportType.toUpperCase(), "warn");
-    }
-
-    const payload = { report_type: reportType };
-
-    if (list[0] && list[0].id){
-      payload.capture_id = list[0].id;
-    } else {
-      payload.index = 0;
-    }
-
-    const del = await fetch("/camera/delete_capture", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify(payload)
-    });
-
-    const j = await del.json().catch(() => ({}));
-
-    if (del.ok && j.status === "success") {
-      notify("Deleted last image (" + reportType.toUpperCase() + ")", "ok");
-      updateCaptureCounts();
-      loadCapturedImages();
-    } else {
-      notify("Delete failed", "err");
-    }
-  } catch (e) {
-    notify("Delete error: " + e, "err");
-  }
-}
-
-
-    async function updateCaptureCounts(){
-      try{
-        const res = await fetch("/camera/captured_images");
-        const j = await res.json().catch(()=>({}));
-        document.getElementById("vjrCount").textContent = j.vjr_images || 0;
-        document.getElementById("vdrCount").textContent = j.vdr_images || 0;
-      }catch(e){}
-    }
-
-    async function deleteCapture(type, captureId, index){
-      if (!can("Operator")) return notify("Permission denied (Operator required).", "err");
-      try{
-        const payload = { report_type: type };
-
-        // Prefer stable delete by capture_id. Fall back to index for old items.
-        if (captureId && String(captureId).trim().length > 0){
-          payload.capture_id = captureId;
-          console.log("Deleting", type, "capture_id", captureId);
-        } else {
-          payload.index = index;
-          console.log("Deleting", type, "index", index);
-        }
-
-        const res = await fetch("/camera/delete_capture", {
-          method:"POST",
-          headers:{ "Content-Type":"application/json" },
-          body: JSON.stringify(payload)
-        });
-
-        const j = await res.json().catch(()=>({}));
-        console.log("Delete response:", res.ok, j);
-
-        if (res.ok && j.status === "success"){
-          notify("Deleted image", "ok");
-          updateCaptureCounts();
-          loadCapturedImages();
-        } else {
-          notify("Delete failed: " + (j.error || j.message || res.status), "err");
-        }
-      } catch(e){
-        notify("Delete error: " + e, "err");
-      }
-    }
-
-    async function clearCaptures(type){
-      if (!can("Operator")) return notify("Permission denied (Operator required).", "err");
-      if (!confirm("Clear all captured images for " + type.toUpperCase() + "?")) return;
-      try{
-        const res = await fetch("/camera/clear_captures", {
-          method:"POST",
-          headers:{ "Content-Type":"application/json" },
-          body: JSON.stringify({report_type:type})
-        });
-        const j = await res.json().catch(()=>({}));
-        console.log("Clear response:", res.ok, j);
-        if (res.ok && j.status === "success"){
-          notify("Cleared captures for " + type.toUpperCase(), "ok");
-          updateCaptureCounts();
-          loadCapturedImages();
-        } else {
-          notify("Clear failed: " + (j.error || j.message || res.status), "err");
-        }
-      } catch(e){
-        notify("Clear error: " + e, "err");
-      }
-    }
-    async function loadCapturedImages(){
-      try{
-        const res = await fetch("/camera/captured_images_full");
-        const j = await res.json().catch(()=>({}));
-        const vjr = j.vjr || [];
-        const vdr = j.vdr || [];
-
-        const vjrG = document.getElementById("vjrGallery");
-        const vdrG = document.getElementById("vdrGallery");
-        vjrG.innerHTML = "";
-        vdrG.innerHTML = "";
-
-        vjr.forEach((img, idx)=>{
-          const d = document.createElement("div");
-          d.className = "thumb";
-          d.innerHTML = `
-            <img src="data:image/jpeg;base64,${img.data}" />
-<button class="xbtn" title="Delete" onclick="deleteCapture('vjr', '${img.id || ''}', ${idx})">&times;</button>
-            <div class="cap">${img.timestamp || ""}</div>
-          `;
-          vjrG.appendChild(d);
-        });
-
-        vdr.forEach((img, idx)=>{
-          const d = document.createElement("div");
-          d.className = "thumb";
-          d.innerHTML = `
-            <img src="data:image/jpeg;base64,${img.data}" />
-<button class="xbtn" title="Delete" onclick="deleteCapture('vdr', '${img.id || ''}', ${idx})">&times;</button>
-            <div class="cap">${img.timestamp || ""}</div>
-          `;
-          vdrG.appendChild(d);
-        });
-
-      }catch(e){
-        console.warn("loadCapturedImages error", e);
-      }
-    }
-
-    async function updateCameraStatusUI(){
-      try{
-        const res = await fetch("/camera/status");
-        const j = await res.json().catch(()=>({}));
-        document.getElementById("camMode").textContent = (j.mode || "demo").toUpperCase();
-        document.getElementById("camStatus").textContent = JSON.stringify(j, null, 2);
-        const note = document.getElementById("camNote");
-        if (j.mode === "ip"){
-          note.textContent = "Connected to IP camera. Snapshot capture uses first JPEG frame extraction.";
-        } else {
-          note.textContent = "Demo mode (no live camera). Controls remain functional.";
-        }
-      }catch(e){
-        document.getElementById("camStatus").textContent = "Status error: " + e;
-      }
-    }
-
-    // NAV + WEATHER polling
-    async function fetchNavigationData(){
-  try{
-    const res = await fetch("/nav_data");
-    const n = await res.json().catch(()=>({}));
-
-    if(!n.latitude || !n.longitude) return;
-
-    // Update NAV text fields
-    document.getElementById("nav_lat").textContent =
-  Math.abs(Number(n.latitude)).toFixed(6) + (Number(n.latitude) >= 0 ? " N" : " S");
-
-document.getElementById("nav_lon").textContent =
-  Math.abs(Number(n.longitude)).toFixed(6) + (Number(n.longitude) >= 0 ? " E" : " W");
-
-    const hdg = Number(n.heading);
-document.getElementById("nav_heading").textContent =
-  Number.isFinite(hdg) ? `${hdg.toFixed(0)}` : "N/A";
-
-
-    if(n.timestamp){
-      const t = new Date(n.timestamp * 1000);
-      document.getElementById("nav_time").textContent = t.toLocaleTimeString();
-    }
-// GNSS status indicator (no UI change)
-const fix = document.getElementById("nav_fix");
-if(!n.timestamp){
-  fix.textContent = "NO DATA";
-}else{
-  const age = Math.floor(Date.now()/1000 - Number(n.timestamp));
-  if(age <= 5) fix.textContent = "LIVE";
-  else if(age <= 30) fix.textContent = "STALE";
-  else fix.textContent = "NO FIX";
-}
-
-    // Update map marker
-    navMarker.setLatLng([n.latitude, n.longitude]);
-    mapNav.panTo([n.latitude, n.longitude], { animate: true });
-// Sync Weather map position with NAV (GNSS)
-weatherMarker.setLatLng([n.latitude, n.longitude]);
-mapWeather.panTo([n.latitude, n.longitude], { animate: true });
-
-
-  }catch(e){
-    console.error("NAV fetch failed", e);
-  }
-}
-
-
-    async function fetchWeatherData(){
-  try{
-    const res = await fetch("/weather_data");
-    const j = await res.json();
-
-    document.getElementById("wspd").innerText  = j.wind_speed ?? "--";
-    document.getElementById("wdir").innerText  = j.wind_direction ?? "--";
-    document.getElementById("temp").innerText  = j.temperature ?? "--";
-    document.getElementById("hum").innerText   = j.humidity ?? "--";
-    document.getElementById("pres").innerText  = j.pressure ?? "--";
-    document.getElementById("noise").innerText = j.noise ?? "--";
-    document.getElementById("pm25").innerText  = j.pm25 ?? "--";
-    document.getElementById("pm10").innerText  = j.pm10 ?? "--";
-    document.getElementById("rain").innerText  = j.rainfall ?? "--";
-
-    if(j.timestamp){
-      document.getElementById("wts").innerText =
-        new Date(j.timestamp * 1000).toLocaleString();
-    }else{
-      document.getElementById("wts").innerText = "--";
-    }
-
-  }catch(e){
-    console.error("Weather fetch failed", e);
-  }
-}
-
-
-    // Export VJR PDF
-    async function exportVJRPDF(){
-      if (!can("Operator")) return notify("Permission denied (Operator required).", "err");
-
-      const vjr = {
-        date: document.getElementById("vjr_date").value,
-        vessel: document.getElementById("vjr_vessel").value,
-        imo: document.getElementById("vjr_imo").value,
-        master: document.getElementById("vjr_master").value,
-        departure: document.getElementById("vjr_departure").value,
-        arrival: document.getElementById("vjr_arrival").value
-      };
-
-      // take nav samples from the live endpoint (most recent)
-      let nav = [];
-      try{
-        const resNav = await fetch("/nav_data");
-        const jNav = await resNav.json().catch(()=>({}));
-        nav = (jNav.history || []).slice(0, 40);
-      }catch(e){}
-
-      try{
-        const res = await fetch("/export_vjr_pdf", {
-          method:"POST",
-          headers:{ "Content-Type":"application/json" },
-          body: JSON.stringify({vjr, nav})
-        });
-        if (!res.ok){
-          const j = await res.json().catch(()=>({}));
-          return notify("PDF failed: " + (j.error || res.status), "err");
-        }
-        const blob = await res.blob();
-        const url = URL.createObjectURL(blob);
-        const a = document.createElement("a");
-        a.href = url;
-        a.download = "VJR_Report.pdf";
-        document.body.appendChild(a);
-        a.click();
-        a.remove();
-        URL.revokeObjectURL(url);
-        notify("VJR PDF downloaded.", "ok");
-      }catch(e){
-        notify("PDF error: " + e, "err");
-      }
-    }
-
-    // VDR record operations
-    async function saveVDRRecord(){
-      if (!can("Operator")) return notify("Permission denied (Operator required).", "err");
-
-      const record = {
-        date: document.getElementById("vdr_date").value,
-        vessel: document.getElementById("vdr_vessel").value,
-        imo: document.getElementById("vdr_imo").value,
-        mmsi: document.getElementById("vdr_mmsi").value,
-        callsign: document.getElementById("vdr_callsign").value,
-        client: document.getElementById("vdr_client").value,
-        location: document.getElementById("vdr_location").value,
-        country: document.getElementById("vdr_country").value,
-        activity: document.getElementById("vdr_activity").value,
-        weather: document.getElementById("vdr_weather").value,
-        sea_state: document.getElementById("vdr_sea_state").value,
-        crew_count: document.getElementById("vdr_crew_count").value,
-        fuel_consumption: document.getElementById("vdr_fuel_consumption").value,
-        remarks: document.getElementById("vdr_remarks").value
-      };
-
-      try{
-        const res = await fetch("/save_vdr", {
-          method:"POST",
-          headers:{ "Content-Type":"application/json" },
-          body: JSON.stringify(record)
-        });
-        const j = await res.json().catch(()=>({}));
-        if (res.ok){
-          notify("VDR record saved. Total: " + (j.total || 0), "ok");
-          loadVDRList();
-        }else{
-          notify("Save failed: " + (j.error || res.status), "err");
-        }
-      }catch(e){
-        notify("Save error: " + e, "err");
-      }
-    }
-
-    async function loadVDRList(){
-      try{
-        const res = await fetch("/vdr_records");
-        const rows = await res.json().catch(()=>[]);
-        const tbody = document.getElementById("vdrTable");
-        if (!rows.length){
-          tbody.innerHTML = `<tr><td colspan="6">No records</td></tr>`;
-          return;
-        }
-        tbody.innerHTML = rows.slice(0, 30).map(r => `
-          <tr>
-            <td>${r.id || ""}</td>
-            <td>${r.date || ""}</td>
-            <td>${r.vessel || ""}</td>
-            <td>${r.activity || ""}</td>
-            <td>${r.location || ""}</td>
-            <td>${r.weather || ""}</td>
-          </tr>
-        `).join("");
-      }catch(e){}
-    }
-
-    async function exportVDRCSV(){
-      if (!can("Operator")) return notify("Permission denied (Operator required).", "err");
-      try{
-        const resList = await fetch("/vdr_records");
-        const records = await resList.json().catch(()=>[]);
-        const res = await fetch("/export_vdr_csv", {
-          method:"POST",
-          headers:{ "Content-Type":"application/json" },
-          body: JSON.stringify({records})
-        });
-        const blob = await res.blob();
-        const url = URL.createObjectURL(blob);
-        const a = document.createElement("a");
-        a.href = url;
-        a.download = "VDR_Report.csv";
-        document.body.appendChild(a);
-        a.click();
-        a.remove();
-        URL.revokeObjectURL(url);
-        notify("CSV downloaded.", "ok");
-      }catch(e){
-        notify("CSV error: " + e, "err");
-      }
-    }
-
-    async function exportVDRExcel(){
-      if (!can("Operator")) return notify("Permission denied (Operator required).", "err");
-      try{
-        const resList = await fetch("/vdr_records");
-        const records = await resList.json().catch(()=>[]);
-        const res = await fetch("/export_vdr_excel", {
-          method:"POST",
-          headers:{ "Content-Type":"application/json" },
-          body: JSON.stringify({records})
-        });
-        if (!res.ok){
-          const j = await res.json().catch(()=>({}));
-          return notify("Excel failed: " + (j.error || res.status), "err");
-        }
-        const blob = await res.blob();
-        const url = URL.createObjectURL(blob);
-        const a = document.createElement("a");
-        a.href = url;
-        a.download = "VDR_Report.xlsx";
-        document.body.appendChild(a);
-        a.click();
-        a.remove();
-        URL.revokeObjectURL(url);
-        notify("Excel downloaded.", "ok");
-      }catch(e){
-        notify("Excel error: " + e, "err");
-      }
-    }
-
-    async function exportVDRPDF(){
-      if (!can("Operator")) return notify("Permission denied (Operator required).", "err");
-      try{
-        const resList = await fetch("/vdr_records");
-        const records = await resList.json().catch(()=>[]);
-        const res = await fetch("/export_vdr_pdf", {
-          method:"POST",
-          headers:{ "Content-Type":"application/json" },
-          body: JSON.stringify({records})
-        });
-        if (!res.ok){
-          const j = await res.json().catch(()=>({}));
-          return notify("PDF failed: " + (j.error || res.status), "err");
-        }
-        const blob = await res.blob();
-        const url = URL.createObjectURL(blob);
-        const a = document.createElement("a");
-        a.href = url;
-        a.download = "VDR_Report.pdf";
-        document.body.appendChild(a);
-        a.click();
-        a.remove();
-        URL.revokeObjectURL(url);
-        notify("VDR PDF downloaded.", "ok");
-      }catch(e){
-        notify("PDF error: " + e, "err");
-      }
-    }
-
-    async function deleteAllVDRRecords(){
-      if (!can("Captain")) return notify("Permission denied (Captain required).", "err");
-      if (!confirm("Delete ALL VDR records?")) return;
-      try{
-        const res = await fetch("/clear_vdr", { method:"POST" });
-        const j = await res.json().catch(()=>({}));
-        if (res.ok){
-          notify("All VDR records deleted.", "ok");
-          loadVDRList();
-        } else {
-          notify("Delete failed: " + (j.error || res.status), "err");
-        }
-      }catch(e){
-        notify("Delete error: " + e, "err");
-      }
-    }
-
-    // Joystick
-    const joy = document.getElementById("joy");
-    const stick = document.getElementById("stick");
-    let dragging = false;
-
-    function setStick(dx, dy){
-      const r = 60;
-      const len = Math.min(r, Math.hypot(dx, dy));
-      const ang = Math.atan2(dy, dx);
-      const x = len * Math.cos(ang);
-      const y = len * Math.sin(ang);
-      stick.style.transform = `translate(${x}px, ${y}px)`;
-      return {x, y};
-    }
-
-    async function up(dx, dy){
-      // map stick to PTZ actions
-      const ax = Math.abs(dx), ay = Math.abs(dy);
-      if (ax < 10 && ay < 10) return;
-      if (ax > ay){
-        await controlCamera(dx > 0 ? "pan_right" : "pan_left");
-      }else{
-        await controlCamera(dy > 0 ? "tilt_down" : "tilt_up");
-      }
-    }
-
-    joy.addEventListener("pointerdown", (e)=>{
-      dragging = true;
-      joy.setPointerCapture(e.pointerId);
-    });
-    joy.addEventListener("pointerup", ()=>{
-      dragging = false;
-      stick.style.transform = "translate(-50%,-50%)";
-    });
-    joy.addEventListener("pointermove", (e)=>{
-      if (!dragging) return;
-      const rect = joy.getBoundingClientRect();
-      const dx = e.clientX - (rect.left + rect.width/2);
-      const dy = e.clientY - (rect.top + rect.height/2);
-      setStick(dx, dy);
-      up(dx, dy);
-    });
-
-    // Init
-    updateCameraStatusUI();
-    updateCaptureCounts();
-    loadCapturedImages();
-    loadVDRList();
-
-    setInterval(fetchNavigationData, 1000);
-    setInterval(fetchWeatherData, 2000);
-    fetchNavigationData(); fetchWeatherData();
-  /* ================= PTZ JOYSTICK LOGIC ================= */
-
-let joyActive = false;
-let joyCenter = { x: 0, y: 0 };
-
-document.addEventListener("DOMContentLoaded", () => {
-  const joy = document.getElementById("joy");
-  const stick = document.getElementById("stick");
-
-  if (!joy || !stick) return;
-
-  // Start dragging
-  joy.addEventListener("pointerdown", (e) => {
-    joyActive = true;
-    const r = joy.getBoundingClientRect();
-    joyCenter = {
-      x: r.left + r.width / 2,
-      y: r.top + r.height / 2
-    };
-    joy.setPointerCapture(e.pointerId);
-  });
-
-  // Drag move
-  document.addEventListener("pointermove", (e) => {
-    if (!joyActive) return;
-
-    let dx = e.clientX - joyCenter.x;
-    let dy = e.clientY - joyCenter.y;
-
-    const max = 45; // joystick radius
-    dx = Math.max(-max, Math.min(max, dx));
-    dy = Math.max(-max, Math.min(max, dy));
-
-    stick.style.transform = `translate(${dx}px, ${dy}px)`;
-
-    // Send PTZ commands
-    if (Math.abs(dx) > 12) {
-      controlCamera(dx > 0 ? "pan_right" : "pan_left");
-    }
-    if (Math.abs(dy) > 12) {
-      controlCamera(dy > 0 ? "tilt_down" : "tilt_up");
-    }
-  });
-
-  // Release joystick
-  document.addEventListener("pointerup", () => {
-    if (!joyActive) return;
-    joyActive = false;
-    stick.style.transform = "translate(-50%, -50%)";
-  });
-});
-document.addEventListener("DOMContentLoaded", () => {
-    fetchWeatherData();
-    setInterval(fetchWeatherData, 2000);
-  });
-  let currentConnMode = "auto";
-
-/* ---- Refresh connectivity status ---- */
-function refreshConnectivity(){
-  fetch("/api/connectivity/status")
-    .then(r => r.json())
-    .then(d => {
-      // Wi-Fi
-      document.getElementById("wifi_status").innerText =
-        d.wifi.connected ? "Connected" : "Disconnected";
-        document.getElementById("wifi_dot").className =
-  "dot " + (d.wifi.connected ? "green" : "red");
-
-      document.getElementById("wifi_info").innerText =
-        d.wifi.ssid || "--";
-
-      // SIM
-      document.getElementById("sim_status").innerText =
-        d.sim.connected ? "Connected" : "Disconnected";
-        document.getElementById("sim_dot").className =
-  "dot " + (d.sim.connected ? "green" : "red");
-
-      document.getElementById("sim_info").innerText =
-        d.sim.operator || "--";
-
-      // Internet
-      document.getElementById("net_status").innerText =
-        d.internet ? "Available" : "Offline";
-        document.getElementById("net_dot").className =
-  "dot " + (d.internet ? "green" : "red");
-
-      document.getElementById("net_info").innerText =
-        d.internet ? "Online" : "No route";
-
-      // Active path
-      document.getElementById("active_path").innerText =
-        d.active_path || "None";
-
-      // Policy
-      currentConnMode = d.policy?.mode || "auto";
-      document.querySelector(
-        `input[name="conn_mode"][value="${currentConnMode}"]`
-      ).checked = true;
-
-      updateManualButtons();
-    })
-    .catch(()=>{
-      notify("Failed to read connectivity status", "error");
-    });
-}
-
-
-function refreshSyncStatus(){
-  fetch("/api/sync/status")
-    .then(r => r.json())
-    .then(d => {
-      document.getElementById("sync_pending").innerText =
-        d.pending_records;
-      document.getElementById("sync_last").innerText =
-        d.last_sync || "--";
-    })
-    .catch(()=>{});
-}
-
-function requestSync(){
-  fetch("/api/sync/start", {method:"POST"})
-    .then(r => r.json())
-    .then(d => notify(d.message, "info"))
-    .catch(()=>notify("Sync request failed","error"));
-}
-
-
-/* ---- Auto / Manual toggle ---- */
-function setConnMode(mode){
-  currentConnMode = mode;
-  updateManualButtons();
-
-  fetch("/api/connectivity/policy", {
-    method: "POST",
-    headers: {"Content-Type":"application/json"},
-    body: JSON.stringify({ mode: mode })
-  }).catch(()=>{});
-}
-
-/* ---- Enable / disable buttons ---- */
-function updateManualButtons(){
-  const manual = (currentConnMode === "manual");
-  document.getElementById("btn_wifi").disabled = !manual;
-  document.getElementById("btn_sim").disabled = !manual;
-}
-
-/* ---- Manual Wi-Fi / SIM request ---- */
-function requestManualPath(path){
-  fetch("/api/connectivity/policy", {
-    method: "POST",
-    headers: {"Content-Type":"application/json"},
-    body: JSON.stringify({
-      mode: "manual",
-      preferred: path
-    })
-  })
-  .then(()=>{
-    notify(`Manual path requested: ${path.toUpperCase()}`, "info");
-  })
-  .catch(()=>{
-    notify("Request failed", "error");
-  });
-}
-  </script>
-</body>
-</html>
-'''
-# ======================================================
-# Firebase initialization & background listeners
-# ======================================================
-
-# Initialize Firebase ONCE before starting any listeners
-""" if not init_firebase():
-    print("? Firebase failed to initialize at startup")
-else:
-    print("? Firebase initialized at startup")
-
-# Start listeners AFTER Firebase init
-threading.Thread(
-    target=firebase_weather_listener,
-    daemon=True
-).start()
-
-threading.Thread(
-    target=firebase_marinelite_listener,
-    daemon=True
-).start() """
-""" def firebase_poll_loop():
-    global nav_current, weather_current
-
-    print("?? Firebase polling loop started")
-
-    while True:
-        try:
-            nav = db.reference(
-                "gsd_vessel_sensor_data/marinelite/current"
-            ).get()
-
-            if isinstance(nav, dict):
-                with nav_lock:
-                    nav_current["latitude"]  = nav.get("latitude")
-                    nav_current["longitude"] = nav.get("longitude")
-                    nav_current["heading"]   = nav.get("heading")
-                    nav_current["timestamp"] = nav.get("timestamp")
-
-            weather = db.reference(
-                "gsd_vessel_sensor_data/weather/current"
-            ).get()
-
-            if isinstance(weather, dict):
-                with weather_lock:
-                    weather_current.update({
-                        "wind_speed": weather.get("wind_speed"),
-                        "wind_direction": weather.get("wind_dir"),
-                        "temperature": weather.get("temperature"),
-                        "humidity": weather.get("humidity"),
-                        "pressure": weather.get("pressure"),
-                        "noise": weather.get("noise"),
-                        "pm25": weather.get("pm25"),
-                        "pm10": weather.get("pm10"),
-                        "rainfall": weather.get("rainfall"),
-                        "timestamp": weather.get("timestamp"),
-                    })
-
-            print("? Firebase polled")
-
-        except Exception as e:
-            print("? Firebase poll error:", e)
-
-        time.sleep(1)  # 1 Hz is perfect """
-
-# ------------------------------------------------------------------------------
-# MAIN
-# ------------------------------------------------------------------------------
-
-if __name__ == "__main__":
-    init_camera()
-    app.run(host="0.0.0.0", port=5000, debug=False)
-
-
-
-#!/usr/bin/env python3
-"""
-GDS - Vessel Management System (Black/Red Theme)
-Fixes/Features added (without breaking previous professional UI):
-- Camera buttons functional even without camera (demo-safe)
-- Demo camera stream returns a real JPEG frame (img tag works)
-- Show captured images in VJR & VDR pages (gallery)
-- Embed captured images in VJR PDF and VDR PDF
-- Add PDF export button to BOTH VJR and VDR
-- Keep live map in NAV, VJR, VDR using dummy ST6100-like data
-- User roles: Captain / Operator / Viewer
-- PTZ sync to vessel COG (toggle)
-"""
-OFFLINE_MODE = True
-CONNECTIVITY_UI = True
-SYNC_ENABLED = True
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-from flask import (
-    Flask, render_template_string, jsonify, request, Response,
-    send_file, redirect, url_for, session
-)
-from flask_cors import CORS
-import threading, time, random, math, json, requests, base64, os, uuid
-import sqlite3
-
-from datetime import datetime
-from io import BytesIO, StringIO
-import csv
-from functools import wraps
-# ---------- Firebase (Realtime DB + Storage) ----------
-FIREBASE_ENABLED = False
-
-if FIREBASE_ENABLED:
-    import firebase_admin
-    from firebase_admin import credentials, db, storage
-
-
-# Image generation for demo camera frames
-from PIL import Image, ImageDraw, ImageFont
-
-try:
-    import openpyxl
-    from openpyxl.styles import Font as XLFont, PatternFill
-except ImportError:
-    openpyxl = None
-
-# Optional PDF - ReportLab (Windows-friendly, pure Python)
-try:
-    from reportlab.lib.pagesizes import letter
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image as RLImage
-    from reportlab.lib import colors
-    from reportlab.lib.enums import TA_CENTER
-    REPORTLAB_AVAILABLE = True
-except ImportError:
-    REPORTLAB_AVAILABLE = False
-
-# WeasyPrint (fallback)
-try:
-    from weasyprint import HTML
-    WEASYPRINT_AVAILABLE = True
-except Exception:
-    WEASYPRINT_AVAILABLE = False
-
-# ------------------------------------------------------------------------------
-# CONFIGURATION
-# ------------------------------------------------------------------------------
-
-IP_CAMERA_URL = "http://192.168.0.164:8080/video"
-CAMERA_USERNAME = ""
-CAMERA_PASSWORD = ""
-AUTO_FALLBACK_TO_DEMO = True
-CAMERA_CONNECTION_TIMEOUT = 5
-# ---------- Firebase Config ----------
-FIREBASE_KEY_PATH = os.path.join(os.path.dirname(__file__), "firebase_key.json")
-FIREBASE_DB_URL = "https://gds-vessel-simulator-default-rtdb.asia-southeast1.firebasedatabase.app"
-FIREBASE_STORAGE_BUCKET = "gds-vessel-simulator.appspot.com"  # usually <project-id>.appspot.com
-VESSEL_ID = "demo_vessel"
-# Local offline database
-LOCAL_DB_ENABLED = True
-LOCAL_DB_PATH = "/home/rpi2/ship_system/db/ship_data.db"
-
-# Logo file in same folder
-LOGO_FILE = os.path.join(os.path.dirname(__file__), "GDS Logo.jpg")
-
-# Embedded fallback logo PNG (small placeholder)
-FALLBACK_LOGO_PNG_BASE64 = (
-    "iVBORw0KGgoAAAANSUhEUgAAAJYAAAAqCAYAAABkGxjYAAAACXBIWXMAAAsSAAALEgHS3X78AAAB"
-    "x0lEQVR4nO3bMW7TQBiG4d8gBqQ0aUqkY0iQpDkA0mZQwB0hUQqg5cI3o0FQj9i5hQ9vZtqGQp7"
-    "3m8qfZc9m1uW2yQAAAAAAAAAAAAAAAAAAAAAAAPg3y0xg1uC7h5cJtZ0fZp7x3b0c3g8x2oR6B"
-    "mZq2Qb6i7m0d0m0c0m9sQyq7K3+fZb7cE2nqQWmP8f1g5s9qG2d2Q8j3l9pQqYwq0WmZc6m8o2"
-    "o8w1b3q8v2y+Yh6b0w0m0fQk8x5lqz9xw0m0VQm8xqf3m1b0m0VQm8xqf3m1b0m0VQm8xqf3m1"
-    "b0m0VQm8xqf3m1b0m0VQm8xqf3m1b0m0VQm8xqf3m1b0m0VQm8xqf3m1b0m0VQm8xqf3m1b0m0"
-    "VQm8xqf3m1b0m0VQm8xqf3m1b0m0VQm8xqf3m1b0m0VQm8xqf3m1b0m0VQm8xqf3m0AAAAAAAA"
-    "AAAAAAAAAAAAAAADwp/0B7c7f0w3zVnQAAAAASUVORK5CYII="
-)
-
-# Simple local users (change before production)
-USERS = {
-    "captain":  {"password": "captain123",  "role": "Captain"},
-    "operator": {"password": "operator123", "role": "Operator"},
-    "viewer":   {"password": "viewer123",   "role": "Viewer"},
-}
-ROLE_ORDER = {"Viewer": 1, "Operator": 2, "Captain": 3}
-
-app = Flask(__name__)
-app.secret_key = "CHANGE_THIS_TO_A_LONG_RANDOM_SECRET"
-CORS(app)
-
-# ------------------------------------------------------------------------------
-# GLOBAL STATE
-# ------------------------------------------------------------------------------
-
-camera_status = {
-    "connected": False, "mode": "demo", "url": IP_CAMERA_URL,
-    "error": None, "last_check": None
-}
-camera_controls = {
-    "pan": 0, "tilt": 0, "zoom": 1.0,
-    "led_brightness": 50, "led_enabled": False,
-    "night_vision": False, "autofocus": True, "white_balance": "auto"
-}
-captured_images = {"vjr_images": [], "vdr_images": []}
-
-nav_lock = threading.Lock()
-weather_lock = threading.Lock()
-vdr_lock = threading.Lock()
-camera_lock = threading.Lock()
-image_lock = threading.Lock()
-sync_lock = threading.Lock()
-
-nav_history = []
-nav_current = {
-    "latitude": None,
-    "longitude": None,
-    "heading": None,
-    "timestamp": None
-}
 
-weather_current = {
-    "wind_speed": None,
-    "wind_direction": None,
-    "temperature": None,
-    "humidity": None,
-    "pressure": None,
-    "noise": None,
-    "pm25": None,
-    "pm10": None,
-    "rainfall": None,
-    "timestamp": None
+SYNC_OUTBOX_PATH = os.path.join(os.path.dirname(__file__), "sync_outbox.db")
+SYNC_BATCH_ROWS = 5000        # rows per uploaded batch (one compressed node)
+SYNC_BACKOFF_MIN = 2          # seconds; doubles per consecutive failure...
+SYNC_BACKOFF_MAX = 300        # ...up to this
+SYNC_IDLE_INTERVAL = 30       # seconds between passes once nothing is pending
+SYNC_TABLE_FEEDS = ("nav_data", "weather_data")   # read straight from LOCAL_DB_PATH by id
+SYNC_ROLLUP_RESOLUTION = 600  # rollup level uploaded as the "rollup" feed
+SYNC_ROLLUP_BUCKETS = 144     # buckets per rollup batch (one day of 10-minute buckets)
+SYNC_ROLLUP_SETTLE = 120      # seconds after a bucket closes before it is treated as final
+
+# Priority classes, most important first. A link may send classes up to its
+# max_class; once its daily budget is spent only class 0 still goes out.
+SYNC_FEEDS = (
+    ("position", 0),          # latest fix, overwritten in place
+    ("outbox", 1),            # VDR records, capture metadata
+    ("rollup", 2),            # 10-minute sensor rollups
+    ("nav_data", 3),          # full-resolution sensor rows
+    ("weather_data", 3),
+)                             # class 4, capture JPEGs, is sent by CaptureUploader
+
+# Token bucket (bytes/s refill, burst bytes) and daily byte budget per uplink type
+LINK_PROFILES = {
+    "ethernet": {"rate": 4_000_000, "burst": 8_000_000, "daily": None, "max_class": 4},
+    "wifi": {"rate": 2_000_000, "burst": 4_000_000, "daily": None, "max_class": 4},
+    "sim": {"rate": 24_000, "burst": 256_000, "daily": 50_000_000, "max_class": 2},
+    "none": {"rate": 0, "burst": 0, "daily": 0, "max_class": -1},
 }
+CONNECTIVITY_CHECK_INTERVAL = 5   # seconds between default-route checks
 
-vdr_records = []
-
-sim_lat, sim_lon, sim_heading, sim_speed = 3.006633, 101.380133, 45.0, 8.0
-
-# PTZ sync to COG
-ptz_sync_enabled = False
-
-MAX_NAV_HISTORY = 800
-MAX_CAPTURE_IMAGES = 50
-# ---------- Firebase init (run once) ----------
-_firebase_ready = False
-_firebase_lock = threading.Lock()
-
-def init_firebase():
-    """Initialize firebase_admin once (DB + Storage). Safe to call multiple times."""
-    global _firebase_ready
-    if not FIREBASE_ENABLED:
-        return False
-
-    with _firebase_lock:
-        if _firebase_ready:
-            return True
-
-        try:
-            if not os.path.exists(FIREBASE_KEY_PATH):
-                print("Firebase key not found:", FIREBASE_KEY_PATH)
-                return False
-
-            cred = credentials.Certificate(FIREBASE_KEY_PATH)
-
-            # ?? IMPORTANT FIX
-            if not firebase_admin._apps:
-                firebase_admin.initialize_app(cred, {
-                    "databaseURL": FIREBASE_DB_URL,
-                    "storageBucket": FIREBASE_STORAGE_BUCKET,
-                })
-
-            _firebase_ready = True
-            print("Firebase initialized OK.")
-            return True
-
-        except Exception as e:
-            print("Firebase init error:", e)
-            return False
-
-
-def firebase_weather_listener():
-    global weather_current
-
-    if not init_firebase():
-        return
-
-    ref = db.reference("gds_vessel_sensor_data/weather/current")
-
-    def _on_change(event):
-        if not event.data:
-            return
-
-        with weather_lock:
-            weather_current.update({
-                "wind_speed": event.data.get("wind_speed"),
-                "wind_direction": event.data.get("wind_dir"),
-                "temperature": event.data.get("temperature"),
-                "humidity": event.data.get("humidity"),
-                "pressure": event.data.get("pressure"),
-                "noise": event.data.get("noise"),
-                "pm25": event.data.get("pm25"),
-                "pm10": event.data.get("pm10"),
-                "rainfall": event.data.get("rainfall"),
-                "timestamp": event.data.get("timestamp"),
-            })
-
-        print("?? Weather updated:", weather_current)
-
-    ref.listen(_on_change)
-
-def firebase_marinelite_listener():
-    global nav_current
-
-    print("?? Starting MarineLite Firebase listener...")
-
-    if not init_firebase():
-        print("? Firebase init failed (MarineLite)")
-        return
-
-    try:
-        ref = db.reference("gds_vessel_sensor_data/marinelite/current")
-    except Exception as e:
-        print("? Firebase reference error:", e)
-        return
-
-    def _on_change(event):
-        global nav_current
-
-        if not event.data:
-            print("?? MarineLite event with no data")
-            return
-
-        print("?? Raw MarineLite Firebase data:", event.data)
-
-        with nav_lock:
-            nav_current["latitude"]  = event.data.get("latitude")
-            nav_current["longitude"] = event.data.get("longitude")
-            nav_current["heading"]   = event.data.get("heading")
-            nav_current["timestamp"] = event.data.get("timestamp")
-
-        print("? NAV updated:", nav_current)
-
-    ref.listen(_on_change)
-
-
-def upload_jpeg_to_firebase_storage(jpg_bytes: bytes, report_type: str):
-    """
-    Upload bytes to Firebase Storage and return (public_url, object_path).
-    Note: For production, prefer signed URLs or authenticated access; public is fine for testing.
-    """
-    if not init_firebase():
-        return None, None
-
-    ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    uid = uuid.uuid4().hex[:10]
-    report_type = (report_type or "vdr").lower()
-    object_path = f"vessels/{VESSEL_ID}/captures/{report_type}/{ts}_{uid}.jpg"
-
-    bucket = storage.bucket()
-    blob = bucket.blob(object_path)
-    blob.upload_from_string(jpg_bytes, content_type="image/jpeg")
-
-    # For testing convenience (public). You can harden later.
-    blob.make_public()
-    return blob.public_url, object_path
-
-def _db_connect():
-    con = sqlite3.connect(LOCAL_DB_PATH, timeout=30, check_same_thread=False)
-    con.execute("PRAGMA journal_mode=WAL;")
-    return con
-
-
-def db_get_latest_marinelite():
-    con = sqlite3.connect(LOCAL_DB_PATH)
-    row = con.execute("""
-        SELECT ts, latitude, longitude, heading
-        FROM nav_data
-        ORDER BY id DESC LIMIT 1
-    """).fetchone()
-    con.close()
-
-    if not row:
-        return {}
-
-    return {
-        "timestamp": row[0],
-        "latitude": row[1],
-        "longitude": row[2],
-        "heading": row[3]
-    }
-
-
-
-
-def db_get_latest_weather():
-    con = sqlite3.connect(LOCAL_DB_PATH)
-    row = con.execute("""
-        SELECT ts, wind_speed, wind_dir, humidity, temperature,
-               pressure, pm25, pm10, rainfall, noise
-        FROM weather_data
-        ORDER BY id DESC LIMIT 1
-    """).fetchone()
-    con.close()
-
-    if not row:
-        return {}
-
-    return {
-        "timestamp": row[0],
-        "wind_speed": row[1],
-        "wind_dir": row[2],
-        "humidity": row[3],
-        "temperature": row[4],
-        "pressure": row[5],
-        "pm25": row[6],
-        "pm10": row[7],
-        "rainfall": row[8],
-        "noise": row[9]
-    }
-
-
-def push_capture_event_to_firebase(report_type: str, image_url: str, object_path: str, enc_cfg: dict):
-    """Store capture metadata + NAV snapshot in Realtime DB."""
-    if not init_firebase():
-        return False
-
-    # snapshot nav at capture time
-    with nav_lock:
-        nav_snapshot = nav_current.copy()
-
-    payload = {
-        "timestamp": datetime.utcnow().isoformat(),
-        "vessel_id": VESSEL_ID,
-        "report_type": (report_type or "vdr").lower(),
-        "image_url": image_url,
-        "storage_path": object_path,
-        "encoding": enc_cfg,
-        "nav": {
-            "latitude": nav_snapshot.get("latitude"),
-            "longitude": nav_snapshot.get("longitude"),
-            "speed": nav_snapshot.get("speed"),
-            "heading": nav_snapshot.get("heading"),
-            "cog": nav_snapshot.get("cog"),
-            "voltage": nav_snapshot.get("voltage"),
-            "time": nav_snapshot.get("time"),
-            "date": nav_snapshot.get("date"),
-        },
-        "source": "IP_CAMERA",
-    }
-
-    db.reference(f"vessels/{VESSEL_ID}/captures").push(payload)
-    return True
+FIREBASE_FLUSH_INTERVAL = 1.0     # seconds between multi-path update()s of the Realtime DB writer
+FIREBASE_UPDATE_PATHS = 500       # paths per update() call
 
-# Navigation logging (persistent)
-NAV_LOG_FILE = os.path.join(os.path.dirname(__file__), "nav_log.csv")
-nav_log_lock = threading.Lock()
+STORAGE_UPLOAD_CLASS = 4          # capture JPEGs: Wi-Fi/Ethernet only under the default LINK_PROFILES
+STORAGE_CHUNK_BYTES = 256 * 1024  # resumable upload chunk (GCS wants multiples of 256 KiB)
+STORAGE_SESSION_TTL = 6 * 86400   # GCS drops resumable sessions after a week; renew a day early
+STORAGE_TIMEOUT = (5, 30)         # connect/read seconds per chunk request
+STORAGE_MAX_ATTEMPTS = 8          # failed tries (not counting link outages) before a capture is given up
 
-def _ensure_nav_log_header():
-    """Create nav log file with header if it does not exist."""
-    try:
-        if not os.path.exists(NAV_LOG_FILE) or os.path.getsize(NAV_LOG_FILE) == 0:
-            with nav_log_lock:
-                with open(NAV_LOG_FILE, "a", newline="", encoding="utf-8") as f:
-                    w = csv.writer(f)
-                    w.writerow(["date","time","latitude","longitude","speed","cog","heading","voltage","panic","ext_heading","raw_string"])
-    except Exception:
-        pass
 
-def append_nav_log(sample: dict):
-    """Append one nav sample (thread-safe)."""
-    try:
-        _ensure_nav_log_header()
-        with nav_log_lock:
-            with open(NAV_LOG_FILE, "a", newline="", encoding="utf-8") as f:
-                w = csv.writer(f)
-                w.writerow([
-                    sample.get("date",""),
-                    sample.get("time",""),
-                    sample.get("latitude",""),
-                    sample.get("longitude",""),
-                    sample.get("speed",""),
-                    sample.get("cog",""),
-                    sample.get("heading",""),
-                    sample.get("voltage",""),
-                    sample.get("panic",""),
-                    sample.get("ext_heading",""),
-                    sample.get("raw_string",""),
-                ])
-    except Exception:
-        pass
+class SyncUnavailable(Exception):
+    """No uplink: Firebase disabled, not initialised or unreachable."""
 
 
-# ------------------------------------------------------------------------------
-# AUTH / ROLES
-# ------------------------------------------------------------------------------
+class SyncThrottled(Exception):
+    """The link's token bucket cannot cover the payload yet; `wait` is the refill time in seconds."""
 
-def current_user():
-    return session.get("user")
+    def __init__(self, wait):
+        super().__init__(f"throttled for {wait:.1f}s")
+        self.wait = wait
 
-def current_role():
-    return session.get("role", "Viewer")
 
-def require_role(min_role: str):
-    def decorator(fn):
-        @wraps(fn)
-        def wrapper(*args, **kwargs):
-            role = current_role()
-            if ROLE_ORDER.get(role, 0) < ROLE_ORDER.get(min_role, 0):
-                return jsonify({"error": "forbidden", "required": min_role, "role": role}), 403
-            return fn(*args, **kwargs)
-        return wrapper
-    return decorator
+def _sync_upload(feed, key, envelope):
+    """Write one batch to Firebase; `key` is deterministic, so a retry overwrites, never duplicates."""
+    if not init_firebase():
+        raise SyncUnavailable("Firebase not available")
+    db.reference(f"vessels/{VESSEL_ID}/sync/{feed}/{key}").set(envelope)
 
-@app.route("/login", methods=["GET", "POST"])
-def login():
-    if request.method == "GET":
-        return render_template_string(LOGIN_HTML, error=None)
-    username = (request.form.get("username") or "").strip()
-    password = request.form.get("password") or ""
-    u = USERS.get(username)
-    if not u or u["password"] != password:
-        return render_template_string(LOGIN_HTML, error="Invalid username or password.")
-    session["user"] = username
-    session["role"] = u["role"]
-    return redirect(url_for("index"))
 
-@app.route("/logout")
-def logout():
-    session.clear()
-    return redirect(url_for("login"))
+def _firebase_update(updates):
+    """One multi-location update() at the root: {"a/b/c": value, ...} in a single round trip."""
+    if not init_firebase():
+        raise SyncUnavailable("Firebase not available")
+    db.reference("/").update(updates)
 
-# ------------------------------------------------------------------------------
-# LOGO / ASSETS
-# ------------------------------------------------------------------------------
 
-@app.route("/assets/logo")
-def gds_logo():
-    if os.path.exists(LOGO_FILE):
-        mime = "image/jpeg" if LOGO_FILE.lower().endswith((".jpg", ".jpeg")) else "image/png"
-        return send_file(LOGO_FILE, mimetype=mime)
-    png = base64.b64decode(FALLBACK_LOGO_PNG_BASE64)
-    return Response(png, mimetype="image/png")
+def _storage_session(object_path, size):
+    """Open a resumable upload session for one JPEG; returns the session URL."""
+    if not init_firebase():
+        raise SyncUnavailable("Firebase not available")
+    blob = storage.bucket().blob(object_path)
+    return blob.create_resumable_upload_session(content_type="image/jpeg", size=size)
 
-@app.route("/assets/no-signal.png")
-def no_signal():
-    png = base64.b64decode(
-        "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mP8/x8AAwMB/6Xw2m8AAAAASUVORK5CYII="
-    )
-    return Response(png, mimetype="image/png")
 
-# ------------------------------------------------------------------------------
-# CAMERA HELPERS (DEMO-SAFE)
-# ------------------------------------------------------------------------------
+def _storage_put(session_url, chunk, offset, size):
+    """PUT `chunk` at `offset` of a resumable session (an empty chunk only asks for progress).
 
-def _demo_camera_frame(text="DEMO CAMERA (NO SIGNAL)"):
-    """
-    Returns JPEG bytes. This ensures <img src="/camera/stream"> always shows something.
+    Returns the number of bytes the server holds (== size when the object is complete),
+    or None if the session has expired and the upload must start over.
     """
-    img = Image.new("RGB", (960, 540), (10, 10, 12))
-    draw = ImageDraw.Draw(img)
+    if chunk:
+        content_range = f"bytes {offset}-{offset + len(chunk) - 1}/{size}"
+    else:
+        content_range = f"bytes */{size}"
+    r = requests.put(session_url, data=chunk, headers={"Content-Range": content_range}, timeout=STORAGE_TIMEOUT)
+    if r.status_code in (200, 201):
+        return size
+    if r.status_code == 308:
+        rng = r.headers.get("Range")           # "bytes=0-N": bytes 0..N are stored
+        return int(rng.rsplit("-", 1)[1]) + 1 if rng else 0
+    if r.status_code in (404, 410):
+        return None
+    raise RuntimeError(f"Storage upload HTTP {r.status_code}")
 
-    # Border + header bar
-    draw.rectangle((0, 0, 959, 539), outline=(204, 0, 0), width=6)
-    draw.rectangle((0, 0, 959, 70), fill=(30, 0, 0))
-    draw.text((18, 22), "GDS PTZ FEED", fill=(255, 255, 255))
 
-    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    draw.text((18, 110), text, fill=(255, 200, 200))
-    draw.text((18, 150), f"Timestamp: {ts}", fill=(220, 220, 220))
+def _storage_publish(object_path):
+    blob = storage.bucket().blob(object_path)
+    blob.make_public()
+    return blob.public_url
+
+
+# ---------- Sync batch codec (columnar, delta, fixed-point) ----------
+SYNC_CODEC_MAGIC = b"SC1"
+# Decimal places kept per column; values with fewer decimals are stored exactly.
+SYNC_COLUMN_DECIMALS = {
+    "ts": 3, "timestamp": 3, "created": 3, "last_ts": 3,
+    "latitude": 7, "longitude": 7,              # ~1 cm
+    "heading": 1, "cog": 1, "wind_dir": 1,
+    "speed": 2, "wind_speed": 2, "temperature": 2, "pressure": 2, "rainfall": 2,
+    "humidity": 1, "pm25": 1, "pm10": 1, "noise": 1,
+}
+SYNC_DEFAULT_DECIMALS = 6
+_COL_NUMERIC, _COL_JSON = 0, 1
 
-    with camera_lock:
-        pan = camera_controls.get("pan", 0)
-        tilt = camera_controls.get("tilt", 0)
-        zoom = camera_controls.get("zoom", 1.0)
-    draw.text((18, 200), f"PAN: {pan}   TILT: {tilt}   ZOOM: {zoom}", fill=(220, 220, 220))
 
-    # Simple crosshair
-    cx, cy = 480, 320
-    draw.line((cx - 60, cy, cx + 60, cy), fill=(255, 31, 31), width=3)
-    draw.line((cx, cy - 60, cx, cy + 60), fill=(255, 31, 31), width=3)
+def _put_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
 
-    out = BytesIO()
-    img.save(out, format="JPEG", quality=85)
-    return out.getvalue()
 
-def check_camera_connection():
-    global camera_status
+def _get_varint(buf, pos):
+    n = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _column_decimals(name, values):
+    cap = SYNC_COLUMN_DECIMALS.get(name, SYNC_DEFAULT_DECIMALS)
+    for e in range(cap + 1):
+        k = 10 ** e
+        if all(abs(v * k - round(v * k)) < 1e-6 for v in values):
+            return e
+    return cap
+
+
+def _encode_column(name, values):
+    present = [v for v in values if v is not None]
+    numeric = all(
+        isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v) for v in present
+    )
+    out = bytearray()
+    if not numeric:
+        out.append(_COL_JSON)
+        out += json.dumps(values, separators=(",", ":"), default=str).encode("utf-8")
+        return out
+
+    e = _column_decimals(name, present)
+    k = 10 ** e
+    out.append(_COL_NUMERIC)
+    out.append(e)
+    if len(present) < len(values):
+        out.append(1)
+        bitmap = bytearray((len(values) + 7) // 8)
+        for i, v in enumerate(values):
+            if v is not None:
+                bitmap[i >> 3] |= 1 << (i & 7)
+        out += bitmap
+    else:
+        out.append(0)
+    prev = 0
+    for v in present:
+        q = int(round(v * k))
+        d = q - prev
+        prev = q
+        _put_varint(out, d * 2 if d >= 0 else -d * 2 - 1)     # zigzag
+    return out
+
+
+def _decode_column(buf, nrows):
+    if buf[0] == _COL_JSON:
+        return json.loads(bytes(buf[1:]).decode("utf-8"))
+    e, has_nulls = buf[1], buf[2]
+    pos = 3
+    if has_nulls:
+        nbytes = (nrows + 7) // 8
+        bitmap = buf[pos:pos + nbytes]
+        pos += nbytes
+        mask = [bool(bitmap[i >> 3] & (1 << (i & 7))) for i in range(nrows)]
+    else:
+        mask = [True] * nrows
+    k = 10 ** e
+    out, prev = [], 0
+    for present in mask:
+        if not present:
+            out.append(None)
+            continue
+        z, pos = _get_varint(buf, pos)
+        prev += (z >> 1) if not z & 1 else -((z + 1) >> 1)
+        out.append(prev if e == 0 else prev / k)
+    return out
+
+
+def encode_batch(columns, rows):
+    """(codec, bytes) for a batch of rows: columnar, delta + zigzag varints of fixed-point
+    numbers (SYNC_COLUMN_DECIMALS), JSON for anything else, then zstd or zlib."""
+    out = bytearray(SYNC_CODEC_MAGIC)
+    _put_varint(out, len(rows))
+    _put_varint(out, len(columns))
+    for i, name in enumerate(columns):
+        name_b = name.encode("utf-8")
+        _put_varint(out, len(name_b))
+        out += name_b
+        col = _encode_column(name, [r[i] for r in rows])
+        _put_varint(out, len(col))
+        out += col
+    if ZSTD_AVAILABLE:
+        return "col1+zstd", zstandard.ZstdCompressor(level=10).compress(bytes(out))
+    return "col1+zlib", zlib.compress(bytes(out), 9)
+
+
+def decode_batch(codec, data):
+    """Inverse of encode_batch: (columns, rows). Numbers come back at their stored precision."""
+    if codec == "col1+zstd":
+        buf = zstandard.ZstdDecompressor().decompress(data)
+    elif codec == "col1+zlib":
+        buf = zlib.decompress(data)
+    else:
+        raise ValueError(f"unknown sync codec {codec!r}")
+    if buf[:3] != SYNC_CODEC_MAGIC:
+        raise ValueError("not a sync batch")
+    nrows, pos = _get_varint(buf, 3)
+    ncols, pos = _get_varint(buf, pos)
+    columns, data_cols = [], []
+    for _ in range(ncols):
+        n, pos = _get_varint(buf, pos)
+        columns.append(bytes(buf[pos:pos + n]).decode("utf-8"))
+        pos += n
+        n, pos = _get_varint(buf, pos)
+        data_cols.append(_decode_column(buf[pos:pos + n], nrows))
+        pos += n
+    return columns, [list(r) for r in zip(*data_cols)] if columns else []
+
+
+class TokenBucket:
+    """Byte-rate limiter: refills `rate` bytes/s up to `burst`.
+
+    A request larger than the burst is let through from a full bucket and paid back
+    as debt, so one big batch cannot stall forever on a slow link.
+    """
+
+    def __init__(self, rate, burst):
+        self._lock = threading.Lock()
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._t = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._t) * self.rate)
+        self._t = now
+
+    def configure(self, rate, burst):
+        with self._lock:
+            self._refill()
+            self.rate, self.burst = rate, burst
+            self.tokens = min(self.tokens, burst)
+
+    def wait_time(self, n):
+        """Seconds until `n` bytes may be sent (0 = now, None = never at this rate)."""
+        with self._lock:
+            self._refill()
+            need = min(n, self.burst)
+            if self.tokens >= need and self.burst > 0:
+                return 0.0
+            if self.rate <= 0:
+                return None
+            return (need - self.tokens) / self.rate
+
+    def consume(self, n):
+        with self._lock:
+            self._refill()
+            self.tokens -= n
+
+
+def _link_kind(iface):
+    if iface.startswith(("wlan", "wl")):
+        return "wifi"
+    if iface.startswith(("wwan", "ww", "ppp", "usb", "rmnet")):
+        return "sim"
+    return "ethernet"
+
+
+def _default_routes():
+    """Interfaces with an IPv4 default route, best metric first; None if unknown (not Linux)."""
+    routes = []
     try:
-        auth = (CAMERA_USERNAME, CAMERA_PASSWORD) if CAMERA_USERNAME else None
+        with open("/proc/net/route", "r") as f:
+            next(f, None)
+            for line in f:
+                p = line.split()
+                if len(p) > 6 and p[1] == "00000000" and int(p[3], 16) & 1:   # RTF_UP
+                    routes.append((int(p[6]), p[0]))
+    except (OSError, ValueError):
+        return None
+    return [iface for _, iface in sorted(routes)]
 
-        # IMPORTANT: Android IP Webcam does NOT support HEAD
-        response = requests.get(
-            IP_CAMERA_URL,
-            auth=auth,
-            stream=True,
-            timeout=CAMERA_CONNECTION_TIMEOUT
-        )
 
-        if response.status_code < 400:
-            with camera_lock:
-                camera_status["connected"] = True
-                camera_status["mode"] = "ip"
-                camera_status["error"] = None
-                camera_status["last_check"] = datetime.now().isoformat()
-            return True
+class ConnectivityMonitor:
+    """Active uplink type, its token bucket and today's bytes per link.
 
-        raise Exception(f"Status {response.status_code}")
+    The active link is the default route with the best metric, or the operator's
+    preferred link under the manual policy (paused if that link is down). When it
+    changes the bucket is reconfigured and listeners (the sync engine) are woken.
+    """
 
-    except Exception as e:
-        if AUTO_FALLBACK_TO_DEMO:
-            with camera_lock:
-                camera_status["connected"] = False
-                camera_status["mode"] = "demo"
-                camera_status["error"] = str(e)
-                camera_status["last_check"] = datetime.now().isoformat()
-        return False
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.policy = {"mode": "auto", "preferred": None}
+        self.links = {}           # kind -> interface
+        self.active = "none"
+        self.bucket = TokenBucket(0, 0)
+        self._usage_day = None
+        self._usage = {}
+        self._listeners = []
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self.refresh()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def on_change(self, fn):
+        self._listeners.append(fn)
+
+    def refresh(self):
+        routes = _default_routes()
+        if routes is None:
+            links = {"ethernet": None}      # no route table: assume an unmetered link
+        else:
+            links = {}
+            for iface in routes:
+                links.setdefault(_link_kind(iface), iface)
+        with self._lock:
+            self.links = links
+            preferred = self.policy["preferred"]
+            if self.policy["mode"] == "manual" and preferred:
+                active = preferred if preferred in links else "none"
+            elif routes is None:
+                active = "ethernet"
+            else:
+                active = _link_kind(routes[0]) if routes else "none"
+            changed = active != self.active
+            if changed:
+                self.active = active
+                profile = LINK_PROFILES[active]
+                self.bucket.configure(profile["rate"], profile["burst"])
+        if changed:
+            print("Uplink:", active)
+            for fn in self._listeners:
+                fn(active)
+        return active
+
+    def set_policy(self, mode, preferred=None):
+        with self._lock:
+            self.policy = {"mode": mode, "preferred": preferred if mode == "manual" else None}
+        return self.refresh()
+
+    def _today_usage(self):
+        today = datetime.now().date()
+        if today != self._usage_day:
+            self._usage_day, self._usage = today, {}
+        return self._usage
+
+    def record(self, link, nbytes):
+        with self._lock:
+            usage = self._today_usage()
+            usage[link] = usage.get(link, 0) + nbytes
+
+    def allowed_class(self):
+        """Lowest-priority class the active link may send now (-1: nothing)."""
+        with self._lock:
+            profile = LINK_PROFILES[self.active]
+            used = self._today_usage().get(self.active, 0)
+            if profile["daily"] is not None and used >= profile["daily"]:
+                return min(profile["max_class"], 0)
+            return profile["max_class"]
+
+    def status(self):
+        with self._lock:
+            profile = LINK_PROFILES[self.active]
+            return {
+                "active": self.active,
+                "links": dict(self.links),
+                "policy": dict(self.policy),
+                "rate_bytes_per_sec": profile["rate"],
+                "daily_budget_bytes": profile["daily"],
+                "used_today_bytes": dict(self._today_usage()),
+            }
+
+    def _run(self):
+        while True:
+            time.sleep(CONNECTIVITY_CHECK_INTERVAL)
+            try:
+                self.refresh()
+            except Exception as e:
+                print("Connectivity check error:", e)
 
 
-def init_camera():
-    check_camera_connection()
+connectivity = ConnectivityMonitor()
 
-def clamp(v, lo, hi):
-    return max(lo, min(hi, v))
 
-def map_heading_to_pan(heading_deg: float) -> int:
-    h = float(heading_deg) % 360.0
-    pan = int(round(h if h <= 180 else h - 360))
-    return clamp(pan, -180, 180)
+class SyncEngine:
+    """Durable store-and-forward uploader, scheduled by priority and link budget.
 
-def ptz_sync_worker():
-    global ptz_sync_enabled
-    while True:
+    Feeds (SYNC_FEEDS) drain into Firebase in encode_batch() batches:
+    - the latest position, overwritten in place whenever it changes;
+    - discrete events (captures, VDR records) enqueue()d into the sync_outbox
+      table of SYNC_OUTBOX_PATH;
+    - closed 10-minute rollups and the raw sensor tables, read from LOCAL_DB_PATH,
+      so a week offline does not copy a million rows into a second queue.
+
+    Every batch goes to the highest-priority feed with pending data that the active
+    link allows (ConnectivityMonitor.allowed_class), through the link's token bucket,
+    so on SIM the position and events go first and raw rows wait for Wi-Fi. Each feed
+    has a cursor in sync_cursor, advanced only after the upload returned; a batch is
+    keyed by its first id, so a retry after a lost acknowledgement lands on the same
+    node. Failures back off exponentially with jitter; /api/sync/start and link
+    changes wake it early.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()   # guards the outbox connection
+        self._con = None
+        self._wake = threading.Event()
+        self._thread = None
+        self._failures = 0
+        self._last_position = None
+        self.state = "idle"
+        self.last_sync = None
+        self.last_error = None
+        self.next_attempt = 0.0
+        self.rows_per_sec = 0.0         # smoothed upload throughput
+        self.uploaded = 0
+
+    def _db(self):
+        if self._con is None:
+            con = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.executescript("""
+                CREATE TABLE IF NOT EXISTS sync_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL UNIQUE,
+                    created REAL NOT NULL,
+                    payload TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS sync_cursor (
+                    feed TEXT PRIMARY KEY,
+                    last_id INTEGER NOT NULL
+                );
+            """)
+            self._con = con
+        return self._con
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def enqueue(self, kind, payload, key=None):
+        """Durably queue one event; a repeated `key` is ignored. Never raises into the caller."""
+        key = key or uuid.uuid4().hex
         try:
-            with sync_lock:
-                enabled = ptz_sync_enabled
-            if enabled:
-                with nav_lock:
-                    cog = nav_current.get("cog", 0.0)
-                desired_pan = map_heading_to_pan(cog)
-                with camera_lock:
-                    camera_controls["pan"] = desired_pan
-            time.sleep(1)
-        except Exception:
-            time.sleep(1)
+            with self._lock:
+                con = self._db()
+                with con:
+                    con.execute(
+                        "INSERT OR IGNORE INTO sync_outbox (kind, key, created, payload) VALUES (?, ?, ?, ?)",
+                        (kind, key, time.time(), json.dumps(payload, default=str)),
+                    )
+        except sqlite3.Error as e:
+            print("Sync outbox error:", e)
+        self._wake.set()
+        return key
+
+    def request_sync(self, *_):
+        self._failures = 0
+        self.next_attempt = 0.0
+        self._wake.set()
+
+    def _feeds(self):
+        local_db = LOCAL_DB_ENABLED and os.path.exists(LOCAL_DB_PATH)
+        return [(feed, cls) for feed, cls in SYNC_FEEDS
+                if local_db or feed not in SYNC_TABLE_FEEDS + ("rollup",)]
+
+    def _cursor(self, feed):
+        with self._lock:
+            row = self._db().execute("SELECT last_id FROM sync_cursor WHERE feed=?", (feed,)).fetchone()
+        return row[0] if row else 0
+
+    def _advance(self, feed, last_id):
+        with self._lock:
+            con = self._db()
+            with con:
+                con.execute("INSERT OR REPLACE INTO sync_cursor (feed, last_id) VALUES (?, ?)", (feed, last_id))
+                if feed == "outbox":
+                    con.execute("DELETE FROM sync_outbox WHERE id <= ?", (last_id,))
+
+    @staticmethod
+    def _last_closed_bucket(con):
+        """Newest rollup bucket that is final: over for SYNC_ROLLUP_SETTLE and fully rolled up.
+
+        While rollup_worker is behind on a source (startup backfill, lag), the cap is
+        the bucket before the last raw row it consumed, so a half-aggregated bucket is
+        never uploaded and skipped by the cursor.
+        """
+        res = SYNC_ROLLUP_RESOLUTION
+        last = int((time.time() - SYNC_ROLLUP_SETTLE - res) // res * res)
+        try:
+            for source in ROLLUP_METRICS:
+                if not _table_exists(con, source):
+                    continue
+                top = con.execute(f"SELECT max(id) FROM {source}").fetchone()[0]
+                row = con.execute("SELECT last_id FROM rollup_state WHERE source=?", (source,)).fetchone()
+                done = row[0] if row else 0
+                if top is None or done >= top:
+                    continue
+                row = con.execute(f"SELECT ts FROM {source} WHERE id <= ? ORDER BY id DESC LIMIT 1",
+                                  (done,)).fetchone()
+                if row is None or row[0] is None:
+                    return -1
+                last = min(last, int(float(row[0]) // res * res) - res)
+        except sqlite3.OperationalError:
+            return -1                    # rollup tables not created yet
+        return last
+
+    def _pending(self, feed):
+        """Rows not yet uploaded (rollup: capped at SYNC_BATCH_ROWS); cheap enough for the SSE producer."""
+        if feed == "position":
+            return 0 if _nav_payload() == self._last_position else 1
+        if feed == "rollup":
+            with db_read_pool.connection() as con:
+                return con.execute("""
+                    SELECT count(*) FROM (
+                        SELECT 1 FROM sensor_rollup
+                        WHERE resolution = ? AND bucket > ? AND bucket <= ? LIMIT ?
+                    )
+                """, (SYNC_ROLLUP_RESOLUTION, self._cursor(feed), self._last_closed_bucket(con),
+                      SYNC_BATCH_ROWS)).fetchone()[0]
+        if feed == "outbox":
+            with self._lock:
+                top = self._db().execute("SELECT coalesce(max(id), 0) FROM sync_outbox").fetchone()[0]
+        else:
+            with db_read_pool.connection() as con:
+                top = con.execute(f"SELECT coalesce(max(id), 0) FROM {feed}").fetchone()[0]
+        return max(0, top - self._cursor(feed))
+
+    def _read_batch(self, feed, after):
+        """(columns, id column, rows) of the next batch of a feed after cursor `after`."""
+        if feed == "outbox":
+            with self._lock:
+                cur = self._db().execute(
+                    "SELECT id, kind, key, created, payload FROM sync_outbox WHERE id > ? ORDER BY id LIMIT ?",
+                    (after, SYNC_BATCH_ROWS),
+                )
+                rows = [(i, kind, key, created, json.loads(p)) for i, kind, key, created, p in cur]
+            return ["id", "kind", "key", "created", "payload"], 0, rows
+        with db_read_pool.connection() as con:
+            if feed == "rollup":
+                res = SYNC_ROLLUP_RESOLUTION
+                try:
+                    first = con.execute(
+                        "SELECT min(bucket) FROM sensor_rollup WHERE resolution = ? AND bucket > ?", (res, after)
+                    ).fetchone()[0]
+                except sqlite3.OperationalError:
+                    return [], 0, []         # rollup tables not created yet
+                last = self._last_closed_bucket(con)
+                if first is None or first > last:
+                    return [], 0, []
+                cur = con.execute("""
+                    SELECT bucket, source, metric, n, vmin, vmax, vsum, vx, vy, vlast
+                    FROM sensor_rollup
+                    WHERE resolution = ? AND bucket >= ? AND bucket <= ?
+                    ORDER BY bucket
+                """, (res, first, min(last, first + (SYNC_ROLLUP_BUCKETS - 1) * res)))
+            else:
+                cur = con.execute(f"SELECT * FROM {feed} WHERE id > ? ORDER BY id LIMIT ?", (after, SYNC_BATCH_ROWS))
+            rows = cur.fetchall()
+            columns = [d[0] for d in cur.description]
+        return columns, columns.index("bucket" if feed == "rollup" else "id"), rows
+
+    def _next_batch(self, feed):
+        """(key, envelope, rows, commit) for the next upload of `feed`, or None if nothing is pending."""
+        if feed == "position":
+            try:
+                pos = _nav_payload()
+            except sqlite3.Error:
+                return None
+            if not pos or pos == self._last_position:
+                return None
+            def commit():
+                self._last_position = pos
+            return "latest", dict(pos, sent_at=time.time()), 1, commit
+
+        columns, id_col, rows = self._read_batch(feed, self._cursor(feed))
+        if not rows:
+            return None
+        first_id, last_id = rows[0][id_col], rows[-1][id_col]
+        codec, data = encode_batch(columns, rows)
+        envelope = {
+            "feed": feed,
+            "first_id": first_id,
+            "last_id": last_id,
+            "count": len(rows),
+            "codec": codec,
+            "data": base64.b64encode(data).decode("ascii"),
+            "sent_at": time.time(),
+        }
+        return f"{first_id:012d}", envelope, len(rows), lambda: self._advance(feed, last_id)
 
-threading.Thread(target=ptz_sync_worker, daemon=True).start()
+    def sync_once(self):
+        """Upload one batch of the most important pending feed the link allows.
 
-# ------------------------------------------------------------------------------
-# SIMULATION THREADS (dummy ST6100-like)
-# ------------------------------------------------------------------------------
+        Returns rows uploaded, 0 when nothing allowed is pending, or None when the
+        token bucket asked to wait (the caller re-plans; a higher class may be due).
+        """
+        link = connectivity.active
+        if link == "none":
+            raise SyncUnavailable("no uplink")
+        allowed = connectivity.allowed_class()
+        for feed, cls in self._feeds():
+            if cls > allowed:
+                continue
+            batch = self._next_batch(feed)
+            if batch is not None:
+                break
+        else:
+            return 0
+
+        key, envelope, count, commit = batch
+        size = len(json.dumps(envelope, separators=(",", ":"), default=str))
+        wait = connectivity.bucket.wait_time(size)
+        if wait is None:
+            raise SyncUnavailable(f"no budget on {link}")
+        if wait > 0:
+            self.state = "throttled"
+            if self._wake.wait(wait):
+                self._wake.clear()
+            return None
 
-def simulate_navigation():
-    global sim_lat, sim_lon, sim_heading, sim_speed, nav_current
-    while True:
+        self.state = "syncing"
+        t0 = time.monotonic()
+        _sync_upload(feed, key, envelope)
+        connectivity.bucket.consume(size)
+        connectivity.record(link, size)
+        rate = count / max(time.monotonic() - t0, 1e-3)
+        self.rows_per_sec = rate if not self.rows_per_sec else 0.7 * self.rows_per_sec + 0.3 * rate
+        commit()
+        self.uploaded += count
+        self.last_sync = datetime.now().isoformat(timespec="seconds")
+        return count
+
+    def _run(self):
+        while True:
+            if not SYNC_ENABLED:
+                self.state = "disabled"
+            elif time.time() >= self.next_attempt:
+                self._drain()
+            if self.state in ("offline", "backoff"):
+                delay = max(0.0, self.next_attempt - time.time())
+            else:
+                delay = SYNC_IDLE_INTERVAL
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def _drain(self):
         try:
-            sim_speed += random.uniform(-0.3, 0.3)
-            sim_speed = max(5, min(12, sim_speed))
-            sim_heading = (sim_heading + random.uniform(-2, 2)) % 360
+            self.state = "syncing"
+            while self.sync_once() != 0:
+                pass
+            self.state = "idle"
+            self._failures = 0
+            self.last_error = None
+        except Exception as e:
+            self._failures += 1
+            backoff = min(SYNC_BACKOFF_MAX, SYNC_BACKOFF_MIN * 2 ** (self._failures - 1))
+            self.next_attempt = time.time() + backoff * random.uniform(0.8, 1.2)
+            self.state = "offline" if isinstance(e, SyncUnavailable) else "backoff"
+            self.last_error = str(e)
+
+    def status(self):
+        allowed = connectivity.allowed_class()
+        pending, deferred = {}, []
+        for feed, cls in self._feeds():
+            try:
+                pending[feed] = self._pending(feed)
+            except sqlite3.Error:
+                pending[feed] = None
+            if pending[feed] and cls > allowed:
+                deferred.append(feed)
+        return {
+            "pending_records": sum(v for f, v in pending.items() if v and f != "position"),
+            "pending": pending,
+            "deferred": deferred,
+            "last_sync": self.last_sync,
+            "sync_state": self.state if SYNC_ENABLED else "disabled",
+            "link": connectivity.active,
+            "rows_per_sec": round(self.rows_per_sec, 1),
+            "uploaded": self.uploaded,
+            "last_error": self.last_error,
+            "next_attempt_in": max(0, round(self.next_attempt - time.time())) if self.state in ("offline", "backoff") else 0,
+        }
 
-            distance = (sim_speed * 1.852 / 3600) / 111  # approx degrees per sec
-            sim_lat += distance * math.cos(math.radians(sim_heading))
-            sim_lon += distance * math.sin(math.radians(sim_heading))
-            sim_lat = max(1.5, min(6.0, sim_lat))
-            sim_lon = max(100.0, min(104.5, sim_lon))
 
-            cog = (sim_heading + random.uniform(-2, 2)) % 360
-            voltage = random.randint(1190, 1240)
+_PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
 
-            now = datetime.now()
-            date_str = now.strftime("%d/%m/%Y")
-            time_str = now.strftime("%H:%M:%S")
 
-            raw_string = f"{date_str},{time_str},{sim_lat:.6f},{sim_lon:.6f},{sim_speed:.1f},{cog:.0f},{voltage},0,{sim_heading:.0f}"
+def _firebase_push_key():
+    """Client-side push() id: 8 chars of milliseconds + 12 random, ordered by time like Firebase's own."""
+    ms = int(time.time() * 1000)
+    head = ""
+    for _ in range(8):
+        head = _PUSH_CHARS[ms % 64] + head
+        ms //= 64
+    return head + "".join(random.choice(_PUSH_CHARS) for _ in range(12))
 
-            with nav_lock:
-                if nav_current.get("date"):
-                    nav_history.insert(0, nav_current.copy())
-                    if len(nav_history) > MAX_NAV_HISTORY:
-                        nav_history.pop()
 
-                nav_current = {
-                    "date": date_str,
-                    "time": time_str,
-                    "latitude": round(sim_lat, 6),
-                    "longitude": round(sim_lon, 6),
-                    "speed": round(sim_speed, 1),
-                    "heading": round(sim_heading, 0),
-                    "cog": round(cog, 0),
-                    "voltage": voltage,
-                    "panic": 0,
-                    "ext_heading": round(sim_heading, 0),
-                    "raw_string": raw_string
-                }
+class FirebaseWriter:
+    """Buffered Realtime DB writer: one multi-location update() per flush interval.
 
+    write()/push() only record {path: value} in memory and return at once; a path
+    written twice keeps its last value. A daemon thread sends the buffer every
+    FIREBASE_FLUSH_INTERVAL as a single update() at the root, so a burst of captures
+    costs one round trip. With no uplink (or no class-1 budget left) or a failed
+    update, the batch is spilled to the firebase_spill table of SYNC_OUTBOX_PATH and
+    replayed oldest first, with exponential backoff, before anything newer is sent.
+    """
 
-            # Persist NAV log
-            append_nav_log(nav_current)
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()      # guards the buffer
+        self._db_lock = threading.Lock()   # guards the spill connection
+        self._con = None
+        self._buf = {}
+        self._wake = threading.Event()
+        self._thread = None
+        self._failures = 0
+        self.next_attempt = 0.0
+        self.state = "idle"
+        self.last_flush = None
+        self.last_error = None
+        self.written = 0
+
+    def _db(self):
+        if self._con is None:
+            con = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS firebase_spill (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created REAL NOT NULL,
+                    updates TEXT NOT NULL
+                )
+            """)
+            self._con = con
+        return self._con
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def write(self, path, value):
+        """Queue `value` for `path` (relative to the DB root); never touches the network."""
+        path = path.strip("/")
+        with self._lock:
+            self._buf[path] = value
+        return path
+
+    def push(self, parent, value):
+        """Like db.reference(parent).push(value), but the key is made locally; returns it."""
+        key = _firebase_push_key()
+        self.write(f"{parent.strip('/')}/{key}", value)
+        return key
+
+    def request_flush(self, *_):
+        self._failures = 0
+        self.next_attempt = 0.0
+        self._wake.set()
+
+    def _spill(self, updates):
+        with self._db_lock:
+            con = self._db()
+            with con:
+                con.execute("INSERT INTO firebase_spill (created, updates) VALUES (?, ?)",
+                            (time.time(), json.dumps(updates, default=str)))
+
+    def _spilled(self):
+        with self._db_lock:
+            return self._db().execute("SELECT COUNT(*) FROM firebase_spill").fetchone()[0]
+
+    def _send(self, updates):
+        items = list(updates.items())
+        for i in range(0, len(items), FIREBASE_UPDATE_PATHS):
+            chunk = dict(items[i:i + FIREBASE_UPDATE_PATHS])
+            link = connectivity.active
+            if connectivity.allowed_class() < 1:
+                raise SyncUnavailable(f"no uplink for events on {link}")
+            size = len(json.dumps(chunk, separators=(",", ":"), default=str))
+            wait = connectivity.bucket.wait_time(size)
+            if wait is None:
+                raise SyncUnavailable(f"no budget on {link}")
+            if wait > 0:
+                raise SyncThrottled(wait)
+            _firebase_update(chunk)
+            connectivity.bucket.consume(size)
+            connectivity.record(link, size)
+            self.written += len(chunk)
+
+    def _replay(self):
+        """Send spilled batches oldest first, merged up to FIREBASE_UPDATE_PATHS paths per update()."""
+        while True:
+            with self._db_lock:
+                rows = self._db().execute(
+                    "SELECT id, updates FROM firebase_spill ORDER BY id LIMIT 100").fetchall()
+            if not rows:
+                return
+            merged, last_id = {}, None
+            for rid, data in rows:
+                if merged and len(merged) >= FIREBASE_UPDATE_PATHS:
+                    break
+                merged.update(json.loads(data))   # later batches win, as they did in the buffer
+                last_id = rid
+            self._send(merged)
+            with self._db_lock:
+                con = self._db()
+                with con:
+                    con.execute("DELETE FROM firebase_spill WHERE id <= ?", (last_id,))
+
+    def flush(self):
+        """Send (or spill) everything buffered; returns the number of paths written."""
+        with self._lock:
+            updates, self._buf = self._buf, {}
+        spilled = self._spilled()
+        waiting = time.time() < self.next_attempt
+        if updates and (spilled or waiting):
+            self._spill(updates)       # stay behind what is already queued on disk
+            spilled, updates = spilled + 1, {}
+        if waiting or not (updates or spilled):
+            return 0
+        before = self.written
+        try:
+            self.state = "flushing"
+            if spilled:
+                self._replay()
+            if updates:
+                self._send(updates)
+            self.state = "idle"
+            self._failures = 0
+            self.last_error = None
+            self.last_flush = datetime.now().isoformat(timespec="seconds")
+        except SyncThrottled as e:
+            if updates:
+                self._spill(updates)
+            self.next_attempt = time.time() + e.wait    # not a failure: wait for the refill
+            self.state = "throttled"
+        except Exception as e:
+            if updates:
+                self._spill(updates)
+            self._failures += 1
+            backoff = min(SYNC_BACKOFF_MAX, SYNC_BACKOFF_MIN * 2 ** (self._failures - 1))
+            self.next_attempt = time.time() + backoff * random.uniform(0.8, 1.2)
+            self.state = "offline" if isinstance(e, SyncUnavailable) else "backoff"
+            self.last_error = str(e)
+        return self.written - before
+
+    def close(self):
+        """At exit: keep the unsent buffer on disk instead of waiting on the network."""
+        with self._lock:
+            updates, self._buf = self._buf, {}
+        if updates:
+            try:
+                self._spill(updates)
+            except sqlite3.Error as e:
+                print("Firebase spill error:", e)
 
-            time.sleep(1)
-        except Exception:
-            time.sleep(1)
+    def status(self):
+        with self._lock:
+            buffered = len(self._buf)
+        try:
+            spilled = self._spilled()
+        except sqlite3.Error:
+            spilled = None
+        return {
+            "state": self.state,
+            "buffered_paths": buffered,
+            "spilled_batches": spilled,
+            "written": self.written,
+            "last_flush": self.last_flush,
+            "last_error": self.last_error,
+            "next_attempt_in": max(0, round(self.next_attempt - time.time())) if self.state in ("offline", "backoff", "throttled") else 0,
+        }
+
+    def _run(self):
+        while True:
+            self._wake.wait(FIREBASE_FLUSH_INTERVAL)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print("Firebase writer error:", e)
+
+
+class CaptureUploader:
+    """Background, resumable upload of capture JPEGs to Firebase Storage.
+
+    enqueue() records the capture in the storage_upload table of SYNC_OUTBOX_PATH and
+    returns at once. Rows are keyed by the JPEG's sha256 and the object path is
+    derived from it, so the same frame is uploaded once however often it is
+    captured. A daemon thread sends the oldest pending JPEG in STORAGE_CHUNK_BYTES
+    pieces through a GCS resumable session. The session URL and confirmed offset are
+    stored after every chunk, so a dropped link or a restart resumes mid-file. Chunks
+    are sent as priority class STORAGE_UPLOAD_CLASS through the link's token bucket.
+    Once the object is complete it is made public: the URL goes into the capture
+    metadata, and one capture event per capture is queued on firebase_writer.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()   # guards the connection
+        self._con = None
+        self._wake = threading.Event()
+        self._thread = None
+        self._failures = 0
+        self.next_attempt = 0.0
+        self.state = "idle"
+        self.last_error = None
+        self.uploaded_bytes = 0
+
+    def _db(self):
+        if self._con is None:
+            con = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS storage_upload (
+                    sha256 TEXT PRIMARY KEY,
+                    object_path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    captures TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    session_url TEXT,
+                    session_created REAL,
+                    confirmed INTEGER NOT NULL DEFAULT 0,
+                    public_url TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created REAL NOT NULL
+                )
+            """)
+            if "attempts" not in {r[1] for r in con.execute("PRAGMA table_info(storage_upload)")}:
+                con.execute("ALTER TABLE storage_upload ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            self._con = con
+        return self._con
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def request_upload(self, *_):
+        self._failures = 0
+        self.next_attempt = 0.0
+        self._wake.set()
+
+    def enqueue(self, sha, size, report_type, capture_id, encoding=None):
+        """Queue one capture for upload; returns {"state": pending|done|failed, "url": ...}."""
+        capture = {"id": capture_id, "report_type": report_type, "encoding": encoding or {}}
+        done = None
+        with self._lock:
+            con = self._db()
+            with con:
+                row = con.execute("SELECT state, public_url, object_path, captures FROM storage_upload WHERE sha256=?",
+                                  (sha,)).fetchone()
+                if row is None:
+                    con.execute(
+                        "INSERT INTO storage_upload (sha256, object_path, size, captures, state, created) "
+                        "VALUES (?, ?, ?, ?, 'pending', ?)",
+                        (sha, f"vessels/{VESSEL_ID}/captures/{report_type}/{sha}.jpg", size,
+                         json.dumps([capture]), time.time()),
+                    )
+                    state, url = "pending", None
+                else:
+                    state, url, object_path, captures = row
+                    if state == "done":
+                        done = (url, object_path)   # already in Storage: just report this capture
+                    else:
+                        if state == "failed":
+                            state = "pending"
+                        captures = json.loads(captures) + [capture]
+                        con.execute("UPDATE storage_upload SET captures=?, state=?, error=NULL, attempts=0 "
+                                    "WHERE sha256=?",
+                                    (json.dumps(captures), state, sha))
+        if done:
+            self._publish_captures(sha, done[0], done[1], [capture])
+        else:
+            self._wake.set()
+        return {"state": state, "url": url}
+
+    def lookup(self, sha):
+        with self._lock:
+            row = self._db().execute(
+                "SELECT state, public_url, confirmed, size, error FROM storage_upload WHERE sha256=?", (sha,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("state", "url", "confirmed", "size", "error"), row))
+
+    def _next(self):
+        with self._lock:
+            return self._db().execute(
+                "SELECT sha256, object_path, size, captures, session_url, session_created, attempts "
+                "FROM storage_upload WHERE state IN ('pending', 'uploading') ORDER BY created LIMIT 1"
+            ).fetchone()
+
+    def _update(self, sha, **fields):
+        cols = ", ".join(f"{k}=?" for k in fields)
+        with self._lock:
+            con = self._db()
+            with con:
+                con.execute(f"UPDATE storage_upload SET {cols} WHERE sha256=?", (*fields.values(), sha))
+
+    def _wait_for_link(self, nbytes):
+        """Block until the link may carry `nbytes` of class STORAGE_UPLOAD_CLASS; returns the link name."""
+        while True:
+            link = connectivity.active
+            if connectivity.allowed_class() < STORAGE_UPLOAD_CLASS:
+                raise SyncUnavailable(f"captures wait for a cheaper link than {link}")
+            wait = connectivity.bucket.wait_time(nbytes)
+            if wait is None:
+                raise SyncUnavailable(f"no budget on {link}")
+            if wait <= 0:
+                return link
+            self.state = "throttled"
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def upload_once(self):
+        """Upload (or resume) the oldest pending JPEG; returns its sha256, or None if nothing is pending.
+
+        Link outages propagate (the drain backs off and retries the same row). Any other
+        error counts against the row; after STORAGE_MAX_ATTEMPTS it is marked failed and
+        the queue moves on, so one bad capture cannot block the ones behind it.
+        """
+        row = self._next()
+        if row is None:
+            return None
+        sha, object_path, size, captures, session_url, session_created, attempts = row
+        data = capture_store.get(sha)
+        if data is None:
+            self._update(sha, state="failed", error="capture deleted before upload")
+            return sha
 
-def simulate_weather():
-    global weather_current
-    base_temp, base_humid, base_press, base_wind, base_dir = 28.0, 75.0, 1013.25, 5.0, 180.0
-    while True:
         try:
-            base_wind = max(0, base_wind + random.uniform(-1, 1))
-            base_dir = (base_dir + random.uniform(-5, 5)) % 360
-            base_temp = max(20, min(40, base_temp + random.uniform(-0.2, 0.2)))
-            base_humid = max(40, min(100, base_humid + random.uniform(-0.5, 0.5)))
-            base_press = max(990, min(1030, base_press + random.uniform(-0.1, 0.1)))
+            url = self._transfer(sha, object_path, size, data, session_url, session_created)
+        except (SyncUnavailable, requests.ConnectionError, requests.Timeout):
+            raise
+        except Exception as e:
+            attempts += 1
+            if attempts < STORAGE_MAX_ATTEMPTS:
+                self._update(sha, attempts=attempts, error=str(e))
+                raise
+            print("Capture upload failed for good:", object_path, e)
+            self._update(sha, state="failed", attempts=attempts, error=str(e), session_url=None)
+            return sha
+        self._update(sha, state="done", public_url=url, session_url=None, error=None)
+        self._publish_captures(sha, url, object_path, json.loads(captures))
+        return sha
+
+    def _transfer(self, sha, object_path, size, data, session_url, session_created):
+        """Send `data` through a (resumed or new) resumable session and make it public; returns the URL."""
+        self.state = "uploading"
+        if session_url and time.time() - (session_created or 0) < STORAGE_SESSION_TTL:
+            offset = _storage_put(session_url, b"", 0, size)   # the server's view wins over ours
+        else:
+            offset = None
+        while offset is None or offset < size:
+            if offset is None:
+                self._wait_for_link(1024)
+                session_url = _storage_session(object_path, size)
+                offset = 0
+                self._update(sha, state="uploading", session_url=session_url,
+                             session_created=time.time(), confirmed=0)
+            chunk = data[offset:offset + STORAGE_CHUNK_BYTES]
+            link = self._wait_for_link(len(chunk))
+            done = _storage_put(session_url, chunk, offset, size)
+            connectivity.bucket.consume(len(chunk))
+            connectivity.record(link, len(chunk))
+            if done is not None:
+                self.uploaded_bytes += max(0, done - offset)
+                self._update(sha, confirmed=done)
+            offset = done
+        return _storage_publish(object_path)
+
+    @staticmethod
+    def _publish_captures(sha, url, object_path, captures):
+        with image_lock:
+            for arr in captured_images.values():
+                for it in arr:
+                    if it.get("sha256") == sha:
+                        it["remote_url"] = url
+            _persist_captured_images()
+        for c in captures:
+            push_capture_event_to_firebase(c["report_type"], url, object_path, c["encoding"])
+
+    def status(self):
+        try:
+            with self._lock:
+                rows = self._db().execute(
+                    "SELECT state, COUNT(*), SUM(size - confirmed) FROM storage_upload GROUP BY state").fetchall()
+        except sqlite3.Error:
+            rows = []
+        counts = {state: n for state, n, _ in rows}
+        return {
+            "state": self.state,
+            "pending": counts.get("pending", 0) + counts.get("uploading", 0),
+            "pending_bytes": sum(left or 0 for state, _, left in rows if state in ("pending", "uploading")),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "uploaded_bytes": self.uploaded_bytes,
+            "last_error": self.last_error,
+            "next_attempt_in": max(0, round(self.next_attempt - time.time())) if self.state in ("offline", "backoff") else 0,
+        }
 
-            with weather_lock:
-                weather_current = {
-                    "wind_speed": round(base_wind, 1),
-                    "wind_direction": round(base_dir, 0),
-                    "temperature": round(base_temp, 1),
-                    "humidity": round(base_humid, 1),
-                    "pressure": round(base_press, 2),
-                    "illumination": 50000,
-                    "timestamp": datetime.now().strftime("%H:%M:%S")
-                }
-            time.sleep(2)
-        except Exception:
-            time.sleep(2)
+    def _run(self):
+        while True:
+            if time.time() >= self.next_attempt:
+                self._drain()
+            if self.state in ("offline", "backoff"):
+                delay = max(0.0, self.next_attempt - time.time())
+            else:
+                delay = SYNC_IDLE_INTERVAL
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def _drain(self):
+        try:
+            while self.upload_once() is not None:
+                pass
+            self.state = "idle"
+            self._failures = 0
+            self.last_error = None
+        except Exception as e:
+            self._failures += 1
+            backoff = min(SYNC_BACKOFF_MAX, SYNC_BACKOFF_MIN * 2 ** (self._failures - 1))
+            self.next_attempt = time.time() + backoff * random.uniform(0.8, 1.2)
+            self.state = "offline" if isinstance(e, SyncUnavailable) else "backoff"
+            self.last_error = str(e)
 
-#threading.Thread(target=simulate_navigation, daemon=True).start()
-#threading.Thread(target=simulate_weather, daemon=True).start()
-#threading.Thread(target=firebase_weather_listener, daemon=True).start()
-#threading.Thread(target=firebase_marinelite_listener, daemon=True).start()
 
+sync_engine = SyncEngine(SYNC_OUTBOX_PATH)
+firebase_writer = FirebaseWriter(SYNC_OUTBOX_PATH)
+capture_uploader = CaptureUploader(SYNC_OUTBOX_PATH)
+atexit.register(firebase_writer.close)
+connectivity.on_change(sync_engine.request_sync)
+connectivity.on_change(firebase_writer.request_flush)
+connectivity.on_change(capture_uploader.request_upload)
 
 
 # ------------------------------------------------------------------------------
@@ -4496,46 +2944,74 @@ def simulate_weather():
 # ------------------------------------------------------------------------------
 @app.route("/api/connectivity/status")
 def api_connectivity_status():
+    """Uplinks seen in the route table, the active one and the sync policy.
+
+    Only the route table is read: ssid/operator/signal stay null, the interface
+    names are under "interfaces" and "uplink".
     """
-    Stub API.
-    Later this will read Wi-Fi + SIM + Ethernet status from RPi.
-    """
+    st = connectivity.status()
+    links = st["links"]
+    active = st["active"]
     return jsonify({
         "wifi": {
             "available": True,
-            "connected": False,
+            "connected": "wifi" in links,
             "ssid": None,
             "signal": None
         },
         "sim": {
             "available": True,
-            "connected": False,
+            "connected": "sim" in links,
             "operator": None,
             "country": None,
             "signal": None
         },
-        "internet": False
+        "ethernet": {"connected": "ethernet" in links},
+        "interfaces": [{"interface": iface, "kind": kind} for kind, iface in links.items()],
+        "uplink": {"interface": links.get(active), "kind": active} if active != "none" else None,
+        "internet": active != "none",
+        "active_path": active.upper() if active != "none" else None,
+        "policy": st["policy"],
+        "budget": {k: st[k] for k in ("rate_bytes_per_sec", "daily_budget_bytes", "used_today_bytes")},
     })
+
+
+@app.route("/api/connectivity/policy", methods=["GET"])
+def api_connectivity_policy():
+    """Current policy, active link and the per-link sync profiles."""
+    st = connectivity.status()
+    return jsonify({"status": "ok", "policy": st["policy"], "active": st["active"], "profiles": LINK_PROFILES})
+
+
+@app.route("/api/connectivity/policy", methods=["POST"])
+@require_role("Operator")
+def api_connectivity_set_policy():
+    """{mode: auto|manual, preferred: wifi|sim|ethernet}; manual pins the sync budget to that link."""
+    data = request.json or {}
+    mode = data.get("mode", "auto")
+    preferred = data.get("preferred")
+    if mode not in ("auto", "manual") or preferred not in (None, "wifi", "sim", "ethernet"):
+        return jsonify({"error": "mode must be auto|manual, preferred one of wifi|sim|ethernet"}), 400
+    connectivity.set_policy(mode, preferred)
+    return api_connectivity_policy()
+
+
+def _sync_status_payload():
+    return dict(sync_engine.status(), firebase_writer=firebase_writer.status(), captures=capture_uploader.status())
+
 @app.route("/api/sync/status")
 def api_sync_status():
-    """
-    Stub API.
-    Later this will reflect SQLite sync state.
-    """
-    return jsonify({
-        "pending_records": 0,
-        "last_sync": None,
-        "sync_state": "idle"
-    })
+    """Outbox depth per feed, last sync time, throughput and uploader state."""
+    return jsonify(_sync_status_payload())
 @app.route("/api/sync/start", methods=["POST"])
 def api_sync_start():
-    """
-    Stub API.
-    Later this will trigger background sync.
-    """
+    """Wake the uploader now (resets the backoff)."""
+    if not SYNC_ENABLED:
+        return jsonify({"status": "disabled", "message": "Sync is disabled"})
+    sync_engine.request_sync()
     return jsonify({
         "status": "accepted",
-        "message": "Sync will start when connectivity is available"
+        "message": "Sync started" if init_firebase() else "Sync will start when connectivity is available"
     })
 
 @app.route("/")
@@ -4552,14 +3028,62 @@ def index():
 def api_me():
     return jsonify({"user": current_user(), "role": current_role(), "weasyprint": WEASYPRINT_AVAILABLE})
 
+def _queue_capture_sync(report_type, items, upload_firebase, encoding):
+    """Queue capture metadata for sync and, if asked, the JPEGs for Storage; returns the last upload state."""
+    upload = {"state": "disabled", "url": None}
+    for it in items:
+        sync_engine.enqueue("capture", dict(it, report_type=report_type), key=it["id"])
+        if upload_firebase:
+            upload = capture_uploader.enqueue(it["sha256"], it["size"], report_type, it["id"], encoding)
+    return upload
+
+
+def _store_pretrigger_frames(report_type, trigger_id, frames, max_width, quality, upload_firebase):
+    """Re-encode pre-trigger ring frames that were over CAPTURE_MAX_KB and file them behind their trigger."""
+    encoded = []
+    for meta, raw in frames:
+        try:
+            jpg, used_q, used_w = _encode_jpeg_to_budget(raw, CAPTURE_MAX_KB * 1024,
+                                                         max_width=max_width, quality=quality)
+        except Exception as e:
+            print("Pre-trigger encode failed:", e)
+            continue
+        if len(jpg) <= CAPTURE_MAX_KB * 1024:
+            meta["size"] = len(jpg)
+            encoded.append((meta, jpg, {"jpg_quality": used_q, "width": used_w}))
+    if not encoded:
+        return
+
+    key = "vjr_images" if report_type == "vjr" else "vdr_images"
+    with image_lock:
+        arr = captured_images[key]
+        pos = next((i for i, it in enumerate(arr) if it.get("id") == trigger_id), None)
+        if pos is None:
+            return                  # trigger deleted or trimmed meanwhile
+        for meta, jpg, _ in encoded:
+            meta["sha256"] = capture_store.put(jpg)
+            # newest first: after the trigger and its newer pre-trigger frames
+            j = pos + 1
+            while j < len(arr) and arr[j].get("trigger_id") == trigger_id and arr[j]["created"] > meta["created"]:
+                j += 1
+            arr.insert(j, meta)
+        dropped = arr[MAX_CAPTURE_IMAGES:]
+        del arr[MAX_CAPTURE_IMAGES:]
+        _persist_captured_images(dropped)
+    gone = {it["id"] for it in dropped}
+    for meta, _, encoding in encoded:
+        if meta["id"] not in gone:
+            _queue_capture_sync(report_type, [meta], upload_firebase, encoding)
+
+
 @app.route("/camera/capture", methods=["POST"])
 @require_role("Operator")
 def capture_image():
     data = request.json or {}
     report_type = data.get("report_type", "vdr")
 
-    # OFFLINE MODE: Firebase disabled here
-    upload_firebase = False
+    # Storage upload is queued (capture_uploader), never done inline
+    upload_firebase = FIREBASE_ENABLED and bool(data.get("upload_firebase", False))
 
     try:
         jpg_quality = int(data.get("jpg_quality", 75))
@@ -4574,17 +3098,32 @@ def capture_image():
     jpg_quality = max(35, min(95, jpg_quality))
     max_width = max(320, min(1920, max_width))
 
+    try:
+        pre_trigger = int(data.get("pre_trigger", 0))
+    except Exception:
+        pre_trigger = 0
+    pre_trigger = max(0, min(FRAME_RING_SIZE - 1, pre_trigger))
+
     # ---- Capture image ----
-    content = _fetch_camera_snapshot_bytes()
+    # Newest frame from the background grabber's ring buffer (plus the K frames
+    # before it in pre-trigger mode); only hit the camera if the ring is empty.
+    frames = camera_relay.recent_frames(pre_trigger + 1, max_age=FRAME_RING_MAX_AGE)
+    if frames:
+        frame_ts, content = frames[0]
+        earlier = frames[1:]
+    else:
+        frame_ts, content, earlier = time.time(), _fetch_camera_snapshot_bytes(), []
     if not content:
         content = _demo_camera_frame("CAPTURED (FALLBACK)")
 
-    content = _compress_jpeg(content, max_width=max_width, quality=jpg_quality)
-    base64_data = base64.b64encode(content).decode()
+    # Best quality/width (at most the requested ones) that fits the DB-only budget
+    content, used_quality, used_width = _encode_jpeg_to_budget(
+        content, CAPTURE_MAX_KB * 1024, max_width=max_width, quality=jpg_quality
+    )
 
     # ---- SIZE GUARD (INSIDE FUNCTION) ----
-    size_kb = len(base64_data) * 0.75 / 1024
-    if size_kb > 80:
+    size_kb = len(content) / 1024
+    if size_kb > CAPTURE_MAX_KB:
         return jsonify({
             "status": "error",
             "message": f"Image too large for DB-only mode ({size_kb:.1f} KB)"
@@ -4592,22 +3131,66 @@ def capture_image():
 
     item = {
         "id": uuid.uuid4().hex,
-        "data": base64_data,
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "size": len(content),
+        "created": round(frame_ts, 3),
+        "timestamp": datetime.fromtimestamp(frame_ts).strftime("%Y-%m-%d %H:%M:%S"),
         "type": "jpeg"
     }
 
+    # Pre-trigger frames, oldest first, linked to the trigger frame by id. Ring frames
+    # that already fit the budget are stored as they are; the others are re-encoded
+    # on a background thread so the capture itself costs at most one encode.
+    pre_items, deferred = [], []
+    blobs = [(item, content)]
+    for ts, raw in reversed(earlier):
+        meta = {
+            "id": uuid.uuid4().hex,
+            "size": len(raw),
+            "created": round(ts, 3),
+            "timestamp": datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"),
+            "type": "jpeg",
+            "trigger_id": item["id"],
+            "pre_trigger_ms": int(round((frame_ts - ts) * 1000)),
+        }
+        if len(raw) <= CAPTURE_MAX_KB * 1024:
+            pre_items.append(meta)
+            blobs.append((meta, raw))
+        else:
+            deferred.append((meta, raw))
+
     # ---- Store locally for UI ----
+    # Blob and metadata go in under one image_lock hold: a concurrent trim/delete
+    # computes its live set under the same lock, so it cannot drop a blob that a
+    # capture is about to reference.
     with image_lock:
+        for blob_item, blob in blobs:
+            blob_item["sha256"] = capture_store.put(blob)
         key = "vjr_images" if report_type == "vjr" else "vdr_images"
-        captured_images[key].insert(0, item)
-        if len(captured_images[key]) > MAX_CAPTURE_IMAGES:
-            captured_images[key].pop()
+        for it in pre_items + [item]:
+            captured_images[key].insert(0, it)
+        dropped = captured_images[key][MAX_CAPTURE_IMAGES:]
+        del captured_images[key][MAX_CAPTURE_IMAGES:]
+        _persist_captured_images(dropped)
+    _queue_capture_sync(report_type, pre_items, upload_firebase, {"ring_frame": True})
+    upload = _queue_capture_sync(report_type, [item], upload_firebase,
+                                 {"jpg_quality": used_quality, "width": used_width})
+    if deferred:
+        threading.Thread(
+            target=_store_pretrigger_frames,
+            args=(report_type, item["id"], deferred, max_width, jpg_quality, upload_firebase),
+            daemon=True,
+        ).start()
 
     return jsonify({
         "status": "success",
         "report_type": report_type,
-        "size_kb": round(size_kb, 2)
+        "size_kb": round(size_kb, 2),
+        "jpg_quality": used_quality,
+        "width": used_width,
+        "id": item["id"],
+        "pre_trigger_saved": len(pre_items),
+        "pre_trigger_pending": len(deferred),
+        "upload": dict(upload, status_url=f"/camera/captures/{item['id']}/upload"),
     })
 
 
@@ -4653,18 +3236,24 @@ def control_camera():
 
     return jsonify({"status": "ok", "message": f"Action executed: {action}", "controls": control_copy})
 
-@app.route("/camera/status")
-def get_camera_status():
+def _camera_status_payload():
     with camera_lock:
         st = camera_status.copy()
         st["controls"] = camera_controls.copy()
     with sync_lock:
         st["ptz_sync_enabled"] = ptz_sync_enabled
-    return jsonify(st)
+    st["stream_viewers"] = camera_relay.viewers()
+    st["camera_connections"] = camera_client.in_use()
+    return st
+
+@app.route("/camera/status")
+def get_camera_status():
+    return jsonify(_camera_status_payload())
 
 @app.route("/camera/reconnect", methods=["POST"])
 @require_role("Operator")
 def reconnect_camera():
+    camera_client.reset()
     result = check_camera_connection()
     with camera_lock:
         status_copy = camera_status.copy()
@@ -4680,91 +3269,516 @@ def camera_sync_cog():
     return jsonify({"status": "ok", "enabled": ptz_sync_enabled})
 
 
+JPEG_SOI = b"\xff\xd8"
+JPEG_EOI = b"\xff\xd9"
+
+
+class MjpegDemuxer:
+    """Incremental demuxer for multipart/x-mixed-replace JPEG streams.
+
+    feed() takes raw chunks and returns the frames they complete as memoryviews
+    into the internal buffer; a view stays valid until the next feed() call, so
+    copy it (bytes(view)) if it has to live longer. Each part's Content-Length
+    is used when the camera sends one (Android IP Webcam does); otherwise the
+    frame ends at the next boundary marker, or at the JPEG EOI marker when no
+    boundary is known. Every search resumes where the previous one stopped, so
+    each byte is scanned once instead of once per chunk.
+    """
+
+    MAX_HEADER_BYTES = 8192
+
+    def __init__(self, boundary=None, max_frame_bytes=3_000_000):
+        token = (boundary or "").strip().strip('"').lstrip("-")
+        self.marker = b"--" + token.encode("latin-1") if token else None
+        self.max_frame_bytes = max_frame_bytes
+        self._buf = bytearray()
+        self._pos = 0          # start of unconsumed data
+        self._scan = 0         # where the next search resumes
+        self._in_body = False
+        self._length = None    # Content-Length of the current part, if sent
+
+    @classmethod
+    def from_content_type(cls, content_type, **kwargs):
+        boundary = None
+        for param in (content_type or "").split(";")[1:]:
+            k, _, v = param.partition("=")
+            if k.strip().lower() == "boundary":
+                boundary = v
+        return cls(boundary, **kwargs)
+
+    def feed(self, chunk):
+        if self._pos:
+            # Slicing makes a new buffer; views handed out earlier keep the old one alive.
+            self._buf = self._buf[self._pos:]
+            self._scan = max(0, self._scan - self._pos)
+            self._pos = 0
+        self._buf.extend(chunk)
+
+        frames = []
+        while True:
+            frame = self._next_body() if self._in_body else self._next_header()
+            if frame is False:
+                break
+            if frame is not None:
+                frames.append(frame)
+        return frames
+
+    def _next_header(self):
+        """Consume one part header block. Returns None on progress, False if more data is needed."""
+        buf = self._buf
+        n = len(buf)
+        while self._pos < n and buf[self._pos] in (0x0d, 0x0a):
+            self._pos += 1
+        if n - self._pos < 2:
+            return False
+
+        # Bare concatenated JPEGs (no multipart headers at all)
+        if buf[self._pos] == 0xff and buf[self._pos + 1] == 0xd8:
+            self._begin_body(None)
+            return None
+
+        end = buf.find(b"\r\n\r\n", max(self._pos, self._scan))
+        if end < 0:
+            if n - self._pos > self.MAX_HEADER_BYTES:
+                self._resync()
+                return None
+            self._scan = max(self._pos, n - 3)
+            return False
+
+        length = None
+        for line in bytes(buf[self._pos:end]).split(b"\r\n"):
+            k, _, v = line.partition(b":")
+            if k.strip().lower() == b"content-length":
+                try:
+                    length = int(v.strip())
+                except ValueError:
+                    length = None
+        self._pos = end + 4
+        self._begin_body(length)
+        return None
+
+    def _begin_body(self, length):
+        self._in_body = True
+        self._length = length if length and length <= self.max_frame_bytes else None
+        self._scan = self._pos
+
+    def _next_body(self):
+        """Return the next complete frame, or False if more data is needed."""
+        buf = self._buf
+        start = self._pos
+        n = len(buf)
+
+        if self._length is not None:
+            if n - start < self._length:
+                return False
+            end = start + self._length
+            if buf[start:start + 2] == JPEG_SOI:
+                return self._emit(start, end, end)
+            # Header lied about the length; fall back to scanning.
+            self._length = None
+
+        if self.marker is not None:
+            m = buf.find(self.marker, max(start, self._scan))
+            if m >= 0:
+                end = m
+                while end > start and buf[end - 1] in (0x0d, 0x0a):
+                    end -= 1
+                return self._emit(start, end, m)
+            self._scan = max(start, n - len(self.marker) + 1)
+        else:
+            e = buf.find(JPEG_EOI, max(start + 2, self._scan))
+            if e >= 0:
+                return self._emit(start, e + 2, e + 2)
+            self._scan = max(start, n - 1)
+
+        if n - start > self.max_frame_bytes:
+            self._resync()
+        return False
+
+    def _emit(self, start, end, consumed):
+        self._pos = consumed
+        self._scan = consumed
+        self._in_body = False
+        self._length = None
+        if end - start < 4 or self._buf[start:start + 2] != JPEG_SOI:
+            return None
+        return memoryview(self._buf)[start:end]
+
+    def _resync(self):
+        """Drop garbage up to the next JPEG start marker."""
+        s = self._buf.find(JPEG_SOI, self._pos + 1)
+        self._pos = s if s >= 0 else max(self._pos, len(self._buf) - 1)
+        self._scan = self._pos
+        self._in_body = s >= 0
+        self._length = None
+
+
+def _iter_mjpeg_frames(resp, chunk_size=16384):
+    """Yield successive JPEG frames (memoryviews, valid until the next one) from an MJPEG response."""
+    demux = MjpegDemuxer.from_content_type(resp.headers.get("Content-Type"))
+    for chunk in resp.iter_content(chunk_size=chunk_size):
+        if chunk:
+            yield from demux.feed(chunk)
+
+
 def _extract_first_jpeg_from_mjpeg(resp, max_bytes=3_000_000, max_seconds=1.5):
     """Extract the first JPEG frame from an MJPEG stream response.
 
     Hard-stops after max_seconds to avoid UI feeling 'stuck' when the IP camera
     stalls or buffers.
     """
-    buf = bytearray()
-    start = -1
+    demux = MjpegDemuxer.from_content_type(resp.headers.get("Content-Type"), max_frame_bytes=max_bytes)
     t0 = time.time()
-    for chunk in resp.iter_content(chunk_size=4096):
+    seen = 0
+    for chunk in resp.iter_content(chunk_size=16384):
         if (time.time() - t0) > max_seconds:
             break
         if not chunk:
             continue
-        buf.extend(chunk)
-        if start < 0:
-            s = buf.find(b"\xff\xd8")
-            if s >= 0:
-                start = s
-        if start >= 0:
-            e = buf.find(b"\xff\xd9", start)
-            if e >= 0:
-                return bytes(buf[start:e+2])
-        if len(buf) > max_bytes:
+        frames = demux.feed(chunk)
+        if frames:
+            return bytes(frames[0])
+        seen += len(chunk)
+        if seen > max_bytes:
             break
     return None
 
 
+# libjpeg's standard luminance quantization table (quality 50)
+_STD_LUMA_QTABLE = (
+    16, 11, 12, 14, 12, 10, 16, 14, 13, 14, 18, 17, 16, 19, 24, 40,
+    26, 24, 22, 22, 24, 49, 35, 37, 29, 40, 58, 51, 61, 60, 57, 51,
+    56, 55, 64, 72, 92, 78, 64, 68, 87, 69, 55, 56, 80, 109, 81, 87,
+    95, 98, 103, 104, 103, 62, 77, 113, 121, 112, 100, 120, 92, 101, 103, 99,
+)
+
+
+def _estimate_jpeg_quality(im):
+    """Approximate libjpeg quality (1-100) from the luminance table, or None if unknown."""
+    try:
+        table = im.quantization.get(0)
+    except Exception:
+        return None
+    if not table or len(table) != 64:
+        return None
+    scale = 100.0 * sum(table) / sum(_STD_LUMA_QTABLE)
+    if scale <= 100:
+        return int(round((200 - scale) / 2))
+    return int(round(5000 / scale))
+
+
 def _compress_jpeg(jpg_bytes: bytes, max_width=1280, quality=75):
-    """Downscale and recompress JPEG for faster UI + smaller base64."""
+    """Downscale and recompress JPEG for faster UI + smaller base64.
+
+    Frames that are already narrow enough and encoded at or below the target
+    quality are returned untouched. Otherwise the decoder's DCT scaling (draft
+    mode) decodes straight to the nearest size >= max_width, so a 1920 frame
+    bound for 640 is decoded at 1/2 or 1/4 scale instead of in full.
+    """
     try:
         im = Image.open(BytesIO(jpg_bytes))
+        w, h = im.size
+        if im.format == "JPEG":
+            src_q = _estimate_jpeg_quality(im)
+            if w <= max_width and im.mode in ("RGB", "L") and src_q is not None and src_q <= quality:
+                return jpg_bytes
+            if w > max_width:
+                im.draft("RGB", (max_width, int(h * (max_width / float(w)))))
         im = im.convert("RGB")
         w, h = im.size
         if w > max_width:
             nh = int(h * (max_width / float(w)))
-            im = im.resize((max_width, nh))
+            im = im.resize((max_width, nh), Image.BILINEAR, reducing_gap=2.0)
         out = BytesIO()
         im.save(out, format="JPEG", quality=quality, optimize=True)
         return out.getvalue()
     except Exception:
         return jpg_bytes
 
+def _encode_jpeg_to_budget(jpg_bytes: bytes, max_bytes: int, max_width=1280, quality=75,
+                           min_quality=None, max_encodes=None):
+    """Highest-quality JPEG of at most max_bytes, returned as (bytes, quality, width).
+
+    Tries the requested settings first. If that is too big, the frame is decoded
+    once and the cached pixels are re-encoded: bisection over quality in
+    [min_quality, quality), and if even min_quality does not fit, the width is
+    cut in proportion to the overshoot and the search repeats. Never exceeds
+    max_encodes encodes; if nothing fits, the smallest attempt is returned.
+    """
+    min_quality = CAPTURE_MIN_QUALITY if min_quality is None else min_quality
+    max_encodes = CAPTURE_MAX_ENCODES if max_encodes is None else max_encodes
+    min_quality = min(min_quality, quality)
+
+    first = _compress_jpeg(jpg_bytes, max_width=max_width, quality=quality)
+    try:
+        src = Image.open(BytesIO(first if len(first) <= max_bytes else jpg_bytes))
+        w, h = src.size
+        # _compress_jpeg hands back the source untouched when it is already narrow and
+        # at or below `quality`: report the quality it really has.
+        first_q = (_estimate_jpeg_quality(src) or quality) if first is jpg_bytes else quality
+        if len(first) <= max_bytes:
+            return first, first_q, min(w, max_width)
+        if w > max_width:
+            src.draft("RGB", (max_width, int(h * (max_width / float(w)))))
+        src = src.convert("RGB")
+    except Exception:
+        return first, quality, max_width
+
+    def encode(im, q):
+        out = BytesIO()
+        im.save(out, format="JPEG", quality=q, optimize=True)
+        return out.getvalue()
+
+    encodes = 1
+    width = min(max_width, src.size[0])
+    smallest = (first, first_q, width)     # (bytes, quality, width) actually encoded
+    rejected_width = width                 # `quality` already failed at this width (the first encode)
+    while encodes < max_encodes:
+        if width < src.size[0]:
+            im = src.resize((width, int(src.size[1] * width / float(src.size[0]))), Image.BILINEAR)
+        else:
+            im = src
+
+        floor = encode(im, min_quality)
+        encodes += 1
+        if len(floor) < len(smallest[0]):
+            smallest = (floor, min_quality, width)
+        if len(floor) > max_bytes:
+            # Size scales roughly with pixel count: shrink width by sqrt of the overshoot.
+            new_width = int(width * math.sqrt(max_bytes / float(len(floor))) * 0.95)
+            if new_width < 160 or new_width >= width:
+                break
+            width = new_width
+            continue
+
+        best, best_q = floor, min_quality
+        lo, hi = min_quality + 1, quality - 1 if width == rejected_width else quality
+        while lo <= hi and encodes < max_encodes:
+            mid = (lo + hi) // 2
+            data = encode(im, mid)
+            encodes += 1
+            if len(data) <= max_bytes:
+                best, best_q, lo = data, mid, mid + 1
+            else:
+                hi = mid - 1
+        return best, best_q, width
+
+    return smallest
+
+
 def _fetch_camera_snapshot_bytes():
-    """Fast snapshot: get a single JPEG frame (works for MJPEG and JPEG endpoints)."""
+    """Fast snapshot: get a single JPEG frame (works for MJPEG and JPEG endpoints).
+
+    If the stream relay is already running its newest frame is used (at most one
+    frame interval old); otherwise the pooled camera client fetches one. The
+    frame is returned as sent by the camera; the caller compresses it once.
+    """
     with camera_lock:
         mode = camera_status.get("mode", "demo")
 
     if mode == "demo":
         return _demo_camera_frame("CAPTURED (DEMO MODE)")
 
-    try:
-        auth = (CAMERA_USERNAME, CAMERA_PASSWORD) if CAMERA_USERNAME else None
+    frame = camera_relay.latest_frame(max_age=STREAM_FRESH_FRAME_AGE)
+    if frame:
+        return frame
 
+    try:
         # Use streaming so we can cut after the first JPEG instead of downloading the full MJPEG feed
-        resp = requests.get(
-            IP_CAMERA_URL,
-            auth=auth,
-            stream=True,
-            timeout=(CAMERA_CONNECTION_TIMEOUT, 2),
-            headers={"User-Agent": "GDS-VMS/1.0"},
-        )
-        if resp.status_code != 200:
-            return None
+        with camera_client.open(CAMERA_SNAPSHOT_URL or IP_CAMERA_URL) as resp:
+            if resp.status_code != 200:
+                return None
 
-        ctype = (resp.headers.get("Content-Type") or "").lower()
-        if "multipart" in ctype or "mjpeg" in ctype or "x-mixed-replace" in ctype:
-            frame = _extract_first_jpeg_from_mjpeg(resp)
-            if frame:
-                return _compress_jpeg(frame)
-            return None
+            ctype = (resp.headers.get("Content-Type") or "").lower()
+            if "multipart" in ctype or "mjpeg" in ctype or "x-mixed-replace" in ctype:
+                return _extract_first_jpeg_from_mjpeg(resp)
 
-        # Non-multipart: assume direct JPEG snapshot endpoint
-        data = resp.content
+            # Non-multipart: assume direct JPEG snapshot endpoint
+            data = resp.content
         if data:
-            return _compress_jpeg(data)
+            return data
     except Exception:
         return None
 
     return None
 
 
+# ------------------------------------------------------------------------------
+# CAMERA STREAM RELAY (one upstream connection, many viewers)
+# ------------------------------------------------------------------------------
+
+STREAM_IDLE_TIMEOUT = 10      # seconds the upstream reader lingers after the last viewer leaves
+STREAM_DEMO_FPS = 2           # frame rate of the generated demo feed
+STREAM_RETRY_DELAY = 2        # seconds between upstream reconnect attempts
+STREAM_BOUNDARY = "frame"
+STREAM_FRESH_FRAME_AGE = 1.0  # a relay frame younger than this is good enough for a snapshot
+CAMERA_BACKGROUND_GRAB = True # keep the reader running while the IP camera is up (zero-latency capture)
+FRAME_RING_SIZE = 30          # last N camera frames kept for capture / pre-trigger
+FRAME_RING_MAX_AGE = 5.0      # ring frames older than this are stale (camera dropped)
+
+
+class MjpegRelay:
+    """Single background reader of IP_CAMERA_URL fanned out to N browser clients.
+
+    The reader publishes into one shared latest-frame slot. Every viewer waits for
+    a sequence number newer than the last one it sent, so a slow client just skips
+    the frames it missed instead of holding the reader (or the other viewers) back.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._frame_ts = 0.0
+        self._live = False
+        self._seq = 0
+        self._ring = deque(maxlen=FRAME_RING_SIZE)
+        self._background = False
+        self._viewers = 0
+        self._idle_since = time.time()
+        self._thread = None
+
+    def _ensure_reader(self):
+        # caller holds self._cond
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._reader_loop, daemon=True)
+            self._thread.start()
+
+    def subscribe(self):
+        with self._cond:
+            self._viewers += 1
+            self._ensure_reader()
+
+    def set_background(self, enabled: bool):
+        """Keep the reader (and ring buffer) running even with no viewers."""
+        with self._cond:
+            self._background = bool(enabled)
+            if self._background:
+                self._ensure_reader()
+            else:
+                self._idle_since = time.time()
+
+    def unsubscribe(self):
+        with self._cond:
+            self._viewers = max(0, self._viewers - 1)
+            if self._viewers == 0:
+                self._idle_since = time.time()
+
+    def viewers(self):
+        with self._cond:
+            return self._viewers
+
+    def publish(self, frame: bytes, live=True):
+        """Make frame the latest one. live=False marks generated placeholder frames."""
+        with self._cond:
+            self._frame = frame
+            self._frame_ts = time.time()
+            self._live = live
+            self._seq += 1
+            if live:
+                self._ring.append((self._frame_ts, frame))
+            self._cond.notify_all()
+
+    def latest_frame(self, max_age=None):
+        """Newest camera frame, or None if there is none (or it is older than max_age seconds)."""
+        with self._cond:
+            if self._frame is None or not self._live:
+                return None
+            if max_age is not None and (time.time() - self._frame_ts) > max_age:
+                return None
+            return self._frame
+
+    def recent_frames(self, count: int, max_age=None):
+        """Up to count (timestamp, frame) pairs from the ring buffer, newest first."""
+        with self._cond:
+            if not self._live:
+                return []
+            now = time.time()
+            out = []
+            for ts, frame in reversed(self._ring):
+                if len(out) >= count or (max_age is not None and now - ts > max_age):
+                    break
+                out.append((ts, frame))
+            return out
+
+    def wait_frame(self, last_seq: int, timeout=5.0):
+        """Return (seq, frame) for the newest frame after last_seq, or (last_seq, None) on timeout."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq != last_seq, timeout=timeout)
+            if self._seq == last_seq:
+                return last_seq, None
+            return self._seq, self._frame
+
+    def _should_run(self):
+        with self._cond:
+            if self._viewers > 0 or self._background:
+                return True
+            return (time.time() - self._idle_since) < STREAM_IDLE_TIMEOUT
+
+    def _keep_running(self):
+        """_should_run() for the reader loop; a reader that stops clears _thread under the
+        same lock, so a viewer subscribing a moment later starts a new one instead of
+        waiting on a reader that is about to exit."""
+        with self._cond:          # Condition's RLock: _should_run() may re-enter
+            if self._should_run():
+                return True
+            if self._thread is threading.current_thread():
+                self._thread = None
+            return False
 
+    def _reader_loop(self):
+        while self._keep_running():
+            with camera_lock:
+                mode = camera_status.get("mode", "demo")
 
+            if mode == "demo":
+                self.publish(_demo_camera_frame("LIVE (DEMO MODE)"), live=False)
+                time.sleep(1.0 / STREAM_DEMO_FPS)
+                continue
 
+            try:
+                with camera_client.open(read_timeout=5) as resp:
+                    if resp.status_code != 200:
+                        raise Exception(f"Status {resp.status_code}")
+                    for frame in _iter_mjpeg_frames(resp):
+                        self.publish(bytes(frame))
+                        if not self._should_run():
+                            break
+            except Exception as e:
+                print("Camera relay error:", e)
+                self.publish(_demo_camera_frame("NO SIGNAL - RECONNECTING"), live=False)
+                time.sleep(STREAM_RETRY_DELAY)
+
+
+camera_relay = MjpegRelay()
+
+
+def _mjpeg_client_stream():
+    """Per-viewer multipart generator; frames the client is too slow for are dropped."""
+    camera_relay.subscribe()
+    last_seq = 0
+    try:
+        while True:
+            seq, frame = camera_relay.wait_frame(last_seq)
+            if frame is None:
+                continue
+            last_seq = seq
+            yield (
+                f"--{STREAM_BOUNDARY}\r\n"
+                f"Content-Type: image/jpeg\r\n"
+                f"Content-Length: {len(frame)}\r\n\r\n"
+            ).encode() + frame + b"\r\n"
+    finally:
+        camera_relay.unsubscribe()
+
+
+@app.route("/camera/stream")
+def camera_stream():
+    """Live MJPEG feed for <img src="/camera/stream">. The camera only ever sees one connection."""
+    return Response(
+        _mjpeg_client_stream(),
+        mimetype=f"multipart/x-mixed-replace; boundary={STREAM_BOUNDARY}",
+        headers={"Cache-Control": "no-cache, no-store", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route("/camera/captured_images")
@@ -4775,13 +3789,135 @@ def get_captured_images_count():
 @app.route("/camera/captured_images_full")
 def get_captured_images_full():
     """
-    Used by UI galleries (VJR & VDR) to display thumbnails.
+    Full base64 payload of every capture (legacy; the galleries now use
+    /camera/captures + thumbnails). Base64 is produced here, at the API edge.
     """
     with image_lock:
-        return jsonify({
-            "vjr": captured_images["vjr_images"],
-            "vdr": captured_images["vdr_images"]
-        })
+        vjr = [dict(it) for it in captured_images["vjr_images"]]
+        vdr = [dict(it) for it in captured_images["vdr_images"]]
+    for it in vjr + vdr:
+        it["data"] = _capture_b64(it)
+    return jsonify({"vjr": vjr, "vdr": vdr})
+
+CAPTURE_PAGE_SIZE = 24       # default page size of /camera/captures
+CAPTURE_THUMB_WIDTH = 320
+
+
+def _find_capture(capture_id):
+    """(report_type, metadata) for a capture id, or (None, None)."""
+    with image_lock:
+        for key, rt in (("vjr_images", "vjr"), ("vdr_images", "vdr")):
+            for it in captured_images[key]:
+                if str(it.get("id")) == str(capture_id):
+                    return rt, dict(it)
+    return None, None
+
+
+@lru_cache(maxsize=MAX_CAPTURE_IMAGES * 2)
+def _capture_thumb(sha):
+    """Small JPEG preview of a stored capture; cached by content hash.
+
+    A missing blob raises instead of returning None, so the miss is not cached.
+    """
+    data = capture_store.get(sha)
+    if not data:
+        raise LookupError(f"capture blob {sha} not found")
+    im = Image.open(BytesIO(data))
+    im.draft("RGB", (CAPTURE_THUMB_WIDTH, CAPTURE_THUMB_WIDTH))
+    im = im.convert("RGB")
+    im.thumbnail((CAPTURE_THUMB_WIDTH, CAPTURE_THUMB_WIDTH), Image.BILINEAR)
+    out = BytesIO()
+    im.save(out, format="JPEG", quality=70, optimize=True)
+    return out.getvalue()
+
+
+def _capture_modified(item):
+    ts = item.get("created")
+    return datetime.fromtimestamp(int(ts), timezone.utc) if ts else None
+
+
+@app.route("/camera/captures")
+def list_captures():
+    """Metadata-only capture listing, newest first, with cursor pagination.
+
+    ?report_type=vjr|vdr  ?limit=N  ?cursor=<next_cursor of the previous page>
+
+    The cursor is "<created>_<id>" of the last item sent; if that capture has been
+    deleted since, the listing resumes at the first older one.
+    """
+    report_type = (request.args.get("report_type") or "vdr").lower()
+    if report_type not in ("vjr", "vdr"):
+        return jsonify({"error": "Invalid report_type"}), 400
+    try:
+        limit = max(1, min(100, int(request.args.get("limit", CAPTURE_PAGE_SIZE))))
+    except Exception:
+        limit = CAPTURE_PAGE_SIZE
+    cursor = request.args.get("cursor")
+
+    key = "vjr_images" if report_type == "vjr" else "vdr_images"
+    with image_lock:
+        arr = captured_images[key]
+        total = len(arr)
+        start = 0
+        if cursor:
+            created, _, cursor_id = cursor.rpartition("_")
+            for i, it in enumerate(arr):
+                if str(it.get("id")) == cursor_id:
+                    start = i + 1
+                    break
+            else:
+                try:
+                    created = float(created)
+                except ValueError:
+                    return jsonify({"error": "cursor not found"}), 404
+                start = next((i for i, it in enumerate(arr) if (it.get("created") or 0) < created), total)
+        page = [dict(it) for it in arr[start:start + limit]]
+        more = start + limit < total
+
+    for it in page:
+        it["url"] = f"/camera/captures/{it['id']}"
+        it["thumb_url"] = f"/camera/captures/{it['id']}/thumb"
+    return jsonify({
+        "report_type": report_type,
+        "items": page,
+        "total": total,
+        "next_cursor": f"{page[-1].get('created') or 0}_{page[-1]['id']}" if (page and more) else None,
+    })
+
+
+@app.route("/camera/captures/<capture_id>")
+def get_capture(capture_id):
+    _, item = _find_capture(capture_id)
+    data = _capture_bytes(item) if item else None
+    if not data:
+        return jsonify({"error": "capture not found"}), 404
+    return _cached_response(data, "image/jpeg", item["sha256"], _capture_modified(item), private=True)
+
+
+@app.route("/camera/captures/<capture_id>/thumb")
+def get_capture_thumb(capture_id):
+    _, item = _find_capture(capture_id)
+    try:
+        data = _capture_thumb(item["sha256"]) if item else None
+    except Exception:
+        data = None
+    if not data:
+        return jsonify({"error": "capture not found"}), 404
+    return _cached_response(data, "image/jpeg", f"{item['sha256']}-t{CAPTURE_THUMB_WIDTH}",
+                            _capture_modified(item), private=True)
+
+
+@app.route("/camera/captures/<capture_id>/upload")
+def get_capture_upload(capture_id):
+    """Storage upload of a capture: pending|uploading|done|failed, with the public URL once done."""
+    _, item = _find_capture(capture_id)
+    if not item:
+        return jsonify({"error": "capture not found"}), 404
+    st = capture_uploader.lookup(item["sha256"])
+    if st is None:
+        return jsonify({"state": "disabled" if not FIREBASE_ENABLED else "not_queued", "url": item.get("remote_url")})
+    return jsonify(st)
+
 
 @app.route("/camera/clear_captures", methods=["POST"])
 @require_role("Operator")
@@ -4793,7 +3929,9 @@ def clear_captures():
 
     key = "vjr_images" if report_type == "vjr" else "vdr_images"
     with image_lock:
+        removed = list(captured_images[key])
         captured_images[key].clear()
+        _persist_captured_images(removed)
 
     return jsonify({"status": "success", "cleared": report_type})
 
@@ -4823,7 +3961,7 @@ def delete_capture():
         if capture_id:
             for i, it in enumerate(arr):
                 if str(it.get("id")) == str(capture_id):
-                    arr.pop(i)
+                    _persist_captured_images([arr.pop(i)])
                     return jsonify({"status": "success", "deleted_id": capture_id, "report_type": report_type})
             return jsonify({"error": "capture_id not found"}), 404
 
@@ -4837,54 +3975,509 @@ def delete_capture():
 
         if idx < 0 or idx >= len(arr):
             return jsonify({"error": "index out of range"}), 400
-        arr.pop(idx)
+        _persist_captured_images([arr.pop(idx)])
 
     return jsonify({"status": "success", "deleted_index": idx, "report_type": report_type})
 
 
 
-@app.route("/nav_data")
-def get_navigation_data():
+def _nav_payload():
     if LOCAL_DB_ENABLED:
-        return jsonify(db_get_latest_marinelite())
+        return sensor_cache.get("nav_data")
 
     # fallback (old behavior)
     with nav_lock:
-        return jsonify({
+        return {
             "latitude": nav_current.get("latitude"),
             "longitude": nav_current.get("longitude"),
             "heading": nav_current.get("heading"),
             "timestamp": nav_current.get("timestamp")
-        })
+        }
+
+
+def _weather_payload():
+    if LOCAL_DB_ENABLED:
+        return sensor_cache.get("weather_data")
+
+    with weather_lock:
+        return dict(weather_current)
+
+
+@app.route("/nav_data")
+def get_navigation_data():
+    return jsonify(_nav_payload())
 
 
 
 @app.route("/weather_data")
 def get_weather_data():
-    if LOCAL_DB_ENABLED:
-        return jsonify(db_get_latest_weather())
+    return jsonify(_weather_payload())
 
-    with weather_lock:
-        return jsonify(weather_current)
 
 
 
+# ------------------------------------------------------------------------------
+# NAV TRACK HISTORY
+# ------------------------------------------------------------------------------
+
+TRACK_DEFAULT_HOURS = 24
+TRACK_DEFAULT_POINTS = 2000
+TRACK_MAX_POINTS = 10000
+TRACK_OVERSAMPLE = 4      # SQL pre-bucketing keeps this many candidates per output point
+TRACK_EXTRA_FIELDS = ("speed", "cog")   # opt-in columns (?fields=) after timestamp/lat/lon/heading
+
+
+def _parse_time_arg(value, default):
+    """Epoch seconds from an epoch number or ISO-8601 string (naive = local time)."""
+    if value in (None, ""):
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return dt.timestamp()
+
+
+def _lttb_track(points, threshold):
+    """Largest-Triangle-Three-Buckets decimation of a [(ts, lat, lon, ...)] track.
+
+    Triangle areas are taken in the lat/lon plane (longitude scaled by cos(lat)),
+    so turns and manoeuvres survive while straight legs collapse. O(n).
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+
+    kx = math.cos(math.radians(points[0][1] or 0.0))
+    xs = [p[2] * kx for p in points]
+    ys = [p[1] for p in points]
+
+    out = [points[0]]
+    every = (n - 2) / float(threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # average of the next bucket is the third triangle vertex
+        nxt_start = int((i + 1) * every) + 1
+        nxt_end = min(int((i + 2) * every) + 1, n)
+        cnt = max(1, nxt_end - nxt_start)
+        avg_x = sum(xs[nxt_start:nxt_end]) / cnt if nxt_end > nxt_start else xs[-1]
+        avg_y = sum(ys[nxt_start:nxt_end]) / cnt if nxt_end > nxt_start else ys[-1]
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        out.append(points[best])
+        a = best
+    out.append(points[-1])
+    return out
+
+
+def db_get_nav_track(t_from, t_to, max_points, extra=()):
+    """Decimated track between two epoch times: (points, raw_count).
+
+    Points are (ts, lat, lon, heading, *extra), extra being TRACK_EXTRA_FIELDS
+    columns. SQLite does the heavy lifting: rows are grouped into
+    TRACK_OVERSAMPLE * max_points time buckets (first fix per bucket), so Python
+    only runs LTTB on a few thousand candidates even for a week of 1 Hz data.
+    """
+    buckets = max(1, max_points * TRACK_OVERSAMPLE)
+    width = max((t_to - t_from) / buckets, 1e-6)
+    cols = "".join(f", {c}" for c in extra if c in TRACK_EXTRA_FIELDS)
+    with db_read_pool.connection() as con:
+        rows = con.execute(f"""
+            SELECT CAST((ts - ?) / ? AS INTEGER) AS b, count(*), min(ts), latitude, longitude, heading{cols}
+            FROM nav_data
+            WHERE ts >= ? AND ts <= ? AND latitude IS NOT NULL AND longitude IS NOT NULL
+            GROUP BY b
+            ORDER BY b
+        """, (t_from, width, t_from, t_to)).fetchall()
+        last = con.execute(f"""
+            SELECT ts, latitude, longitude, heading{cols}
+            FROM nav_data
+            WHERE ts >= ? AND ts <= ? AND latitude IS NOT NULL AND longitude IS NOT NULL
+            ORDER BY ts DESC LIMIT 1
+        """, (t_from, t_to)).fetchone()
+
+    points = [tuple(r[2:]) for r in rows]
+    raw_count = sum(r[1] for r in rows)
+    if last and (not points or points[-1][0] != last[0]):
+        points.append(tuple(last))
+    return _lttb_track(points, max_points), raw_count
+
+
+@app.route("/api/nav/track")
+def api_nav_track():
+    """Historical track: ?from=&to= (epoch seconds or ISO-8601) &max_points=N &fields=speed,cog."""
+    now = time.time()
+    try:
+        t_to = _parse_time_arg(request.args.get("to"), now)
+        t_from = _parse_time_arg(request.args.get("from"), t_to - TRACK_DEFAULT_HOURS * 3600)
+        max_points = int(request.args.get("max_points", TRACK_DEFAULT_POINTS))
+    except Exception:
+        return jsonify({"error": "from/to must be epoch seconds or ISO-8601, max_points an int"}), 400
+    if t_from > t_to:
+        return jsonify({"error": "from must be before to"}), 400
+    max_points = max(2, min(TRACK_MAX_POINTS, max_points))
+    extra = [f for f in (request.args.get("fields") or "").split(",") if f]
+    unknown = [f for f in extra if f not in TRACK_EXTRA_FIELDS]
+    if unknown:
+        return jsonify({"error": f"unknown fields {unknown}", "fields": list(TRACK_EXTRA_FIELDS)}), 400
+
+    try:
+        points, raw_count = db_get_nav_track(t_from, t_to, max_points, extra)
+    except sqlite3.Error as e:
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({
+        "from": t_from,
+        "to": t_to,
+        "raw_count": raw_count,
+        "fields": ["timestamp", "latitude", "longitude", "heading"] + extra,
+        "points": [list(p) for p in points],
+    })
+
+
+@app.route("/api/nav/recent")
+def api_nav_recent():
+    """Last N in-memory NAV samples, oldest first: ?n=100&fields=a,b&format=json|csv (columnar JSON)."""
+    try:
+        n = max(0, min(MAX_NAV_HISTORY, int(request.args.get("n", 100))))
+    except ValueError:
+        return jsonify({"error": "n must be an int"}), 400
+    fields = [f for f in (request.args.get("fields") or "").split(",") if f] or list(NavRing.FIELDS)
+    unknown = [f for f in fields if f not in NavRing.FIELDS]
+    if unknown:
+        return jsonify({"error": f"unknown fields {unknown}", "fields": list(NavRing.FIELDS)}), 400
+
+    cols = nav_history.columns(n, fields)
+    if request.args.get("format") == "csv":
+        out = StringIO()
+        w = csv.writer(out)
+        w.writerow(fields)
+        w.writerows(zip(*(cols[f] for f in fields)))
+        return Response(out.getvalue(), mimetype="text/csv")
+    return jsonify({"fields": fields, "count": len(cols[fields[0]]), "columns": cols})
+
+
+# ------------------------------------------------------------------------------
+# LIVE PUSH (Server-Sent Events)
+# ------------------------------------------------------------------------------
+
+EVENT_POLL_INTERVAL = 0.5       # how often the single producer samples the sources
+EVENT_KEEPALIVE_SECONDS = 15    # comment line sent to idle clients (keeps proxies/NAT open)
+EVENT_HISTORY = 64              # deltas kept for catching up slow / reconnecting clients
+EVENT_IDLE_TIMEOUT = 30         # producer stops this long after the last subscriber leaves
+EVENT_SYNC_INTERVAL = 5         # sync status runs COUNT(*) queries on sync_outbox.db; sample it less often
+
+
+class EventHub:
+    """One producer thread, many SSE subscribers.
+
+    The producer samples NAV, weather, camera and sync status and publishes a
+    per-channel delta (only the keys that changed) when something changed. Each
+    subscriber follows a sequence number; one that falls further behind than the
+    delta history (or reconnects with an unknown Last-Event-ID) gets a full
+    snapshot instead, so a slow client never holds the producer back.
+    """
+
+    SOURCES = {
+        "nav": _nav_payload,
+        "weather": _weather_payload,
+        "camera": _camera_status_payload,
+        "sync": _sync_status_payload,
+    }
+    INTERVALS = {"sync": EVENT_SYNC_INTERVAL}   # default EVENT_POLL_INTERVAL
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._state = {}
+        self._history = deque(maxlen=EVENT_HISTORY)
+        self._subscribers = 0
+        self._idle_since = time.time()
+        self._thread = None
+
+    def subscribe(self):
+        with self._cond:
+            self._subscribers += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._producer_loop, daemon=True)
+                self._thread.start()
+
+    def unsubscribe(self):
+        with self._cond:
+            self._subscribers = max(0, self._subscribers - 1)
+            if self._subscribers == 0:
+                self._idle_since = time.time()
+
+    def publish(self, channel, value):
+        """Record the channel's new value; emits a delta event only if it changed."""
+        value = json.loads(json.dumps(value, default=str))
+        with self._cond:
+            old = self._state.get(channel)
+            if old == value:
+                return
+            if old is None:
+                delta = value
+            else:
+                delta = {k: v for k, v in value.items() if old.get(k) != v}
+                delta.update({k: None for k in old if k not in value})
+            self._state[channel] = value
+            self._seq += 1
+            self._history.append((self._seq, channel, delta))
+            self._cond.notify_all()
+
+    def _snapshot(self):
+        # caller holds self._cond
+        return self._seq, [(self._seq, ch, {"full": True, "v": v}) for ch, v in self._state.items()]
+
+    def events_after(self, last_seq, timeout=EVENT_KEEPALIVE_SECONDS):
+        """(seq, [(seq, channel, message)]) newer than last_seq; waits up to timeout."""
+        with self._cond:
+            if last_seq is None:
+                return self._snapshot()
+            self._cond.wait_for(lambda: self._seq != last_seq, timeout=timeout)
+            if self._seq == last_seq:
+                return last_seq, []
+            if last_seq > self._seq or not self._history or self._history[0][0] > last_seq + 1:
+                return self._snapshot()
+            return self._seq, [(s, ch, {"v": d}) for s, ch, d in self._history if s > last_seq]
+
+    def _should_run(self):
+        with self._cond:
+            return self._subscribers > 0 or (time.time() - self._idle_since) < EVENT_IDLE_TIMEOUT
+
+    def _producer_loop(self):
+        sampled = {}
+        while self._should_run():
+            with self._cond:
+                idle = self._subscribers == 0
+            if idle:
+                # Linger without sampling; the next subscriber gets fresh values straight away.
+                sampled.clear()
+                time.sleep(EVENT_POLL_INTERVAL)
+                continue
+            now = time.time()
+            for channel, source in self.SOURCES.items():
+                if now - sampled.get(channel, 0) < self.INTERVALS.get(channel, EVENT_POLL_INTERVAL):
+                    continue
+                sampled[channel] = now
+                try:
+                    self.publish(channel, source())
+                except Exception:
+                    pass
+            time.sleep(EVENT_POLL_INTERVAL)
+
+
+event_hub = EventHub()
+
+
+def _sse_client_stream(last_event_id):
+    event_hub.subscribe()
+    try:
+        try:
+            seq = int(last_event_id) if last_event_id else None
+        except ValueError:
+            seq = None
+        yield "retry: 3000\n\n"
+        while True:
+            seq, events = event_hub.events_after(seq)
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            for s, channel, message in events:
+                yield f"id: {s}\nevent: {channel}\ndata: {json.dumps(message, separators=(',', ':'))}\n\n"
+    finally:
+        event_hub.unsubscribe()
+
+
+@app.route("/api/stream")
+def api_stream():
+    """SSE channel pushing nav / weather / camera / sync changes (replaces UI polling)."""
+    return Response(
+        _sse_client_stream(request.headers.get("Last-Event-ID")),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+NAV_EXPORT_CHUNK = 64 * 1024
+
+
+def _iter_csv_body(f, limit=None, chunk=NAV_EXPORT_CHUNK):
+    """Yield a CSV file's bytes without its header line, up to `limit` bytes of file."""
+    header = f.readline()
+    remaining = None if limit is None else limit - len(header)
+    while remaining is None or remaining > 0:
+        data = f.read(chunk if remaining is None else min(chunk, remaining))
+        if not data:
+            break
+        if remaining is not None:
+            remaining -= len(data)
+        yield data
+
+
+def _nav_line_epoch(line):
+    parts = line.split(b",", 2)
+    if len(parts) < 3:
+        return None
+    return _nav_row_epoch(parts[0].decode("ascii", "replace"), parts[1].decode("ascii", "replace"))
+
+
+def _nav_log_seek(f, lo, hi, t_from):
+    """Line-start offset at or before the first row >= t_from, by bisection.
+
+    The log is appended in time order, so a multi-GB live file costs ~log2(size)
+    short reads instead of a scan. Stops at 64 KB; the row filter does the rest.
+    """
+    while hi - lo > NAV_EXPORT_CHUNK:
+        mid = (lo + hi) // 2
+        f.seek(mid)
+        f.readline()                    # finish the partial line
+        pos = f.tell()
+        ts = _nav_line_epoch(f.readline())
+        if ts is None or pos >= hi:
+            break
+        if ts < t_from:
+            lo = pos
+        else:
+            hi = mid
+    return lo
+
+
+def _nav_log_lines(src, limit=None, t_from=None):
+    """Decoded data lines of one log file, given as a path or an open binary file (header
+    skipped); the live file is bisected to t_from."""
+    with (src if hasattr(src, "read") else _nav_open_log(src)) as f:
+        f.readline()
+        pos = f.tell()
+        if limit is not None:
+            if t_from is not None:
+                pos = _nav_log_seek(f, pos, limit, t_from)
+                f.seek(pos)
+            for line in f:
+                pos += len(line)
+                if pos > limit:
+                    break
+                yield line.decode("utf-8", "replace")
+        else:
+            for line in f:
+                yield line.decode("utf-8", "replace")
+
+
+def _nav_segment_lines(seg):
+    """_nav_log_lines of a rotated segment; a corrupt or truncated one is cut short, not the export."""
+    try:
+        yield from _nav_log_lines(seg["path"])
+    except (OSError, EOFError) as e:
+        print("NAV export: skipping segment", seg["file"], e)
+
+
+def _nav_export_filtered(sources, t_from, t_to, cols, every):
+    """CSV chunks of the rows in `sources` inside [t_from, t_to], projected to `cols`,
+    at most one row per `every` seconds. Sources are chronological, so the first row
+    past t_to ends the export.
+    """
+    out = StringIO()
+    w = csv.writer(out)
+    w.writerow([NAV_LOG_FIELDS[i] for i in cols])
+    yield out.getvalue().encode("utf-8")        # first byte goes out before any scanning
+    out.seek(0)
+    out.truncate()
+
+    need_ts = t_from is not None or t_to is not None or every
+    last_kept = None
+    for lines in sources:
+        for row in csv.reader(lines):
+            if len(row) < 2:
+                continue
+            if need_ts:
+                ts = _nav_row_epoch(row[0], row[1])
+                if ts is None or (t_from is not None and ts < t_from):
+                    continue
+                if t_to is not None and ts > t_to:
+                    lines.close()
+                    if out.tell():
+                        yield out.getvalue().encode("utf-8")
+                    return
+                if every:
+                    if last_kept is not None and ts - last_kept < every:
+                        continue
+                    last_kept = ts
+            w.writerow([row[i] if i < len(row) else "" for i in cols])
+            if out.tell() >= NAV_EXPORT_CHUNK:
+                yield out.getvalue().encode("utf-8")
+                out.seek(0)
+                out.truncate()
+    if out.tell():
+        yield out.getvalue().encode("utf-8")
+
 
 @app.route("/export_nav_csv")
 def export_nav_csv():
-    """Browser download of the persistent navigation log (CSV)."""
+    """Browser download of the navigation log (CSV), streamed.
+
+    Optional: ?from=&to= (epoch or ISO-8601), fields=a,b (columns, in the order given),
+    every=N (at most one row per N seconds). Only rotated
+    segments whose manifest range overlaps the window are decompressed; the live
+    file is bisected to `from`. Without parameters the log is copied byte for byte.
+    """
     if not current_user():
         return redirect(url_for("login"))
-    _ensure_nav_log_header()
     try:
-        return send_file(
-            NAV_LOG_FILE,
-            as_attachment=True,
-            download_name=f"NAV_Log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mimetype="text/csv",
-        )
+        t_from = _parse_time_arg(request.args.get("from"), None)
+        t_to = _parse_time_arg(request.args.get("to"), None)
+        every = float(request.args.get("every") or 0)
+    except Exception:
+        return jsonify({"error": "from/to must be epoch seconds or ISO-8601, every a number of seconds"}), 400
+    if request.args.get("every") and not every > 0:
+        return jsonify({"error": "every must be a positive number of seconds"}), 400
+    fields = [f for f in (request.args.get("fields") or "").split(",") if f]
+    unknown = [f for f in fields if f not in NAV_LOG_FIELDS]
+    if unknown:
+        return jsonify({"error": f"unknown fields {unknown}", "fields": NAV_LOG_FIELDS}), 400
+    cols = [NAV_LOG_FIELDS.index(f) for f in fields] or list(range(len(NAV_LOG_FIELDS)))
+
+    try:
+        segments, live_f, live_size, live_start = nav_log_writer.export_snapshot(t_from, t_to)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    include_live = t_to is None or live_start is None or live_start <= t_to
+    if not include_live:
+        live_f.close()
+
+    if t_from is None and t_to is None and not every and not fields:
+        def generate():
+            yield (",".join(NAV_LOG_FIELDS) + "\r\n").encode("utf-8")
+            for seg in segments:
+                try:
+                    with _nav_open_log(seg["path"]) as f:
+                        yield from _iter_csv_body(f)
+                except (OSError, EOFError) as e:
+                    print("NAV export: skipping segment", seg["file"], e)
+            if include_live:
+                with live_f:
+                    yield from _iter_csv_body(live_f, limit=live_size)
+    else:
+        sources = [_nav_segment_lines(seg) for seg in segments]
+        if include_live:
+            sources.append(_nav_log_lines(live_f, limit=live_size, t_from=t_from))
+
+        def generate():
+            yield from _nav_export_filtered(sources, t_from, t_to, cols, every)
+
+    return Response(
+        generate(),
+        mimetype="text/csv",
+        headers={"Content-Disposition":
+                 f"attachment; filename=NAV_Log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"},
+    )
 
 # ------------------------------------------------------------------------------
 # VDR RECORDS + EXPORTS
@@ -4909,6 +4502,7 @@ def save_vdr_record():
         record["id"] = (vdr_records[0]["id"] + 1) if vdr_records else 1
         record["timestamp"] = datetime.now().isoformat()
         vdr_records.insert(0, record)
+    sync_engine.enqueue("vdr", record)
     return jsonify({"status": "ok", "total": len(vdr_records)})
 
 @app.route("/clear_vdr", methods=["POST"])
@@ -4983,9 +4577,7 @@ def export_vdr_csv():
                     headers={"Content-Disposition": "attachment; filename=VDR_Report.csv"})
 
 def _logo_b64():
-    if os.path.exists(LOGO_FILE):
-        return base64.b64encode(open(LOGO_FILE, "rb").read()).decode()
-    return FALLBACK_LOGO_PNG_BASE64
+    return base64.b64encode(_logo_asset()[0]).decode()
 
 @app.route("/export_vdr_pdf", methods=["POST"])
 @require_role("Operator")
@@ -5058,9 +4650,8 @@ def export_vdr_pdf():
                 img_data = []
                 for img in images[:18]:
                     try:
-                        img_b64 = img.get('data', '')
-                        if img_b64:
-                            img_bytes = base64.b64decode(img_b64)
+                        img_bytes = _capture_bytes(img)
+                        if img_bytes:
                             pil_img = Image.open(BytesIO(img_bytes))
                             pil_img.thumbnail((1.2*inch, 1.2*inch))
                             img_path = f'/tmp/vdr_img_{int(time.time()*1000)}.png'
@@ -5124,7 +4715,7 @@ def export_vdr_pdf():
         for img in images:
             gallery += f"""
             <div class="card">
-              <img src="data:image/jpeg;base64,{img['data']}" />
+              <img src="data:image/jpeg;base64,{_capture_b64(img)}" />
               <div class="cap">{img['timestamp']}</div>
             </div>
             """
@@ -5246,15 +4837,31 @@ def export_vjr_pdf():
             ]))
             story.append(details_table)
             story.append(Spacer(1, 0.2*inch))
-            
+
+            # Navigation log (decimated track from /api/nav/track)
+            nav_data = [['#', 'Date', 'Time', 'Latitude', 'Longitude', 'Speed', 'COG']]
+            for i, n in enumerate(navlog[:40], start=1):
+                nav_data.append([str(i), n.get('date', ''), n.get('time', ''), n.get('latitude', ''),
+                                 n.get('longitude', ''), n.get('speed', ''), n.get('cog', '')])
+            if len(nav_data) == 1:
+                nav_data.append(['', 'No navigation samples', '', '', '', '', ''])
+            nav_table = Table(nav_data, repeatRows=1)
+            nav_table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f0f0f0')),
+                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, -1), 7),
+            ]))
+            story.append(nav_table)
+            story.append(Spacer(1, 0.2*inch))
+
             # Images
             if images:
                 img_data = []
                 for img in images[:16]:
                     try:
-                        img_b64 = img.get('data', '')
-                        if img_b64:
-                            img_bytes = base64.b64decode(img_b64)
+                        img_bytes = _capture_bytes(img)
+                        if img_bytes:
                             pil_img = Image.open(BytesIO(img_bytes))
                             pil_img.thumbnail((1.2*inch, 1.2*inch))
                             img_path = f'/tmp/vjr_img_{int(time.time()*1000)}.png'
@@ -5318,7 +4925,7 @@ def export_vjr_pdf():
         for img in images:
             gallery += f"""
             <div class="card">
-              <img src="data:image/jpeg;base64,{img['data']}" />
+              <img src="data:image/jpeg;base64,{_capture_b64(img)}" />
               <div class="cap">{img['timestamp']}</div>
             </div>
             """
@@ -5435,7 +5042,7 @@ LOGIN_HTML = r"""
 <body>
   <div class="card">
     <div class="head">
-      <img src="/assets/logo" alt="GDS">
+      <img src="{{ logo_url }}" alt="GDS">
       <div>
         <h1>GDS Vessel Management System</h1>
         <div class="sub">Black/Red Operational Console</div>
@@ -6033,7 +5640,7 @@ HTML_DASHBOARD = r'''<!DOCTYPE html>
 <body>
   <div class="header">
     <div class="brand">
-      <img src="/assets/logo" alt="GDS">
+      <img src="{{ logo_url }}" alt="GDS">
       <div>
         <h1>GDS Vessel Management System</h1>
         <p>Black/Red Operational Console</p>
@@ -6418,6 +6025,16 @@ HTML_DASHBOARD = r'''<!DOCTYPE html>
         <option value="1280" selected>1280</option>
       </select>
     </label>
+
+    <label class="hint">
+      Pre-trigger
+      <select id="preTrigger">
+        <option value="0" selected>Off</option>
+        <option value="3">3 frames</option>
+        <option value="5">5 frames</option>
+        <option value="10">10 frames</option>
+      </select>
+    </label>
   </div>
 </div>
 
@@ -6769,6 +6386,18 @@ L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
 
 navMarker = L.marker([3.006633, 101.380133]).addTo(mapNav);
 
+// last 24 h track, decimated server-side; refreshed every few minutes
+const navTrack = L.polyline([], { color: '#0d6efd', weight: 3, opacity: 0.7 }).addTo(mapNav);
+async function loadNavTrack(){
+  try{
+    const res = await fetch("/api/nav/track?max_points=1500");
+    const j = await res.json();
+    navTrack.setLatLngs((j.points || []).map(p => [p[1], p[2]]));
+  }catch(e){}
+}
+loadNavTrack();
+setInterval(loadNavTrack, 5 * 60 * 1000);
+
 
     // Map - Weather
     let mapWeather, weatherMarker;
@@ -6871,6 +6500,7 @@ function captureFromPTZ(reportType) {
 const fbUpload = false;
   const jpgQuality = Number(document.getElementById("jpgQuality")?.value || 75);
   const jpgWidth = Number(document.getElementById("jpgWidth")?.value || 1280);
+  const preTrigger = Number(document.getElementById("preTrigger")?.value || 0);
 
   fetch("/camera/capture", {
     method: "POST",
@@ -6879,15 +6509,16 @@ const fbUpload = false;
       report_type: reportType,
       upload_firebase: fbUpload,
       jpg_quality: jpgQuality,
-      max_width: jpgWidth
+      max_width: jpgWidth,
+      pre_trigger: preTrigger
     })
   })
   .then(r => r.json())
   .then(d => {
     console.log("Capture result:", d);
 
-    if (d.firebase_uploaded) {
-      console.log("Uploaded to Firebase:", d.firebase_url);
+    if (d.upload && d.upload.state !== "disabled") {
+      console.log("Firebase upload " + d.upload.state + ":", d.upload.url || d.upload.status_url);
     }
   })
   .catch(err => console.error("Capture error:", err));
@@ -6939,10 +6570,10 @@ async function deleteLastCapture(reportType) {
   if (!can("Operator")) return notify("Permission denied (Operator required).", "err");
 
   try {
-    const res = await fetch("/camera/captured_images_full");
+    const res = await fetch("/camera/captures?limit=1&report_type=" + reportType);
     const data = await res.json().catch(() => ({}));
 
-    const list = (reportType === "vjr") ? (data.vjr || []) : (data.vdr || []);
+    const list = data.items || [];
 
     if (!list.length) {
       return notify("No images to delete for " + reportType.toUpperCase(), "warn");
@@ -7043,40 +6674,39 @@ async function deleteLastCapture(reportType) {
         notify("Clear error: " + e, "err");
       }
     }
-    async function loadCapturedImages(){
-      try{
-        const res = await fetch("/camera/captured_images_full");
+    // Metadata pages only; thumbnails are cached by the browser (ETag) and the
+    // full JPEG is fetched only when a thumbnail is opened.
+    async function fetchAllCaptures(type){
+      let items = [], cursor = null;
+      do {
+        const res = await fetch("/camera/captures?report_type=" + type + (cursor ? "&cursor=" + cursor : ""));
         const j = await res.json().catch(()=>({}));
-        const vjr = j.vjr || [];
-        const vdr = j.vdr || [];
-
-        const vjrG = document.getElementById("vjrGallery");
-        const vdrG = document.getElementById("vdrGallery");
-        vjrG.innerHTML = "";
-        vdrG.innerHTML = "";
-
-        vjr.forEach((img, idx)=>{
-          const d = document.createElement("div");
-          d.className = "thumb";
-          d.innerHTML = `
-            <img src="data:image/jpeg;base64,${img.data}" />
-<button class="xbtn" title="Delete" onclick="deleteCapture('vjr', '${img.id || ''}', ${idx})">&times;</button>
-            <div class="cap">${img.timestamp || ""}</div>
-          `;
-          vjrG.appendChild(d);
-        });
-
-        vdr.forEach((img, idx)=>{
-          const d = document.createElement("div");
-          d.className = "thumb";
-          d.innerHTML = `
-            <img src="data:image/jpeg;base64,${img.data}" />
-<button class="xbtn" title="Delete" onclick="deleteCapture('vdr', '${img.id || ''}', ${idx})">&times;</button>
-            <div class="cap">${img.timestamp || ""}</div>
-          `;
-          vdrG.appendChild(d);
-        });
+        items = items.concat(j.items || []);
+        cursor = j.next_cursor;
+      } while (cursor);
+      return items;
+    }
+
+    function renderGallery(type, items){
+      const g = document.getElementById(type + "Gallery");
+      g.innerHTML = "";
+      items.forEach((img, idx)=>{
+        const d = document.createElement("div");
+        d.className = "thumb";
+        d.innerHTML = `
+          <a href="${img.url}" target="_blank"><img src="${img.thumb_url}" loading="lazy" /></a>
+<button class="xbtn" title="Delete" onclick="deleteCapture('${type}', '${img.id || ''}', ${idx})">&times;</button>
+          <div class="cap">${img.timestamp || ""}</div>
+        `;
+        g.appendChild(d);
+      });
+    }
 
+    async function loadCapturedImages(){
+      try{
+        const [vjr, vdr] = await Promise.all([fetchAllCaptures("vjr"), fetchAllCaptures("vdr")]);
+        renderGallery("vjr", vjr);
+        renderGallery("vdr", vdr);
       }catch(e){
         console.warn("loadCapturedImages error", e);
       }
@@ -7085,26 +6715,35 @@ async function deleteLastCapture(reportType) {
     async function updateCameraStatusUI(){
       try{
         const res = await fetch("/camera/status");
-        const j = await res.json().catch(()=>({}));
-        document.getElementById("camMode").textContent = (j.mode || "demo").toUpperCase();
-        document.getElementById("camStatus").textContent = JSON.stringify(j, null, 2);
-        const note = document.getElementById("camNote");
-        if (j.mode === "ip"){
-          note.textContent = "Connected to IP camera. Snapshot capture uses first JPEG frame extraction.";
-        } else {
-          note.textContent = "Demo mode (no live camera). Controls remain functional.";
-        }
+        renderCameraStatus(await res.json().catch(()=>({})));
       }catch(e){
         document.getElementById("camStatus").textContent = "Status error: " + e;
       }
     }
 
+    function renderCameraStatus(j){
+      document.getElementById("camMode").textContent = (j.mode || "demo").toUpperCase();
+      document.getElementById("camStatus").textContent = JSON.stringify(j, null, 2);
+      const note = document.getElementById("camNote");
+      if (j.mode === "ip"){
+        note.textContent = "Connected to IP camera. Captures are taken from the live frame buffer.";
+      } else {
+        note.textContent = "Demo mode (no live camera). Controls remain functional.";
+      }
+    }
+
     // NAV + WEATHER polling
     async function fetchNavigationData(){
   try{
     const res = await fetch("/nav_data");
-    const n = await res.json().catch(()=>({}));
+    renderNav(await res.json().catch(()=>({})));
+  }catch(e){
+    console.error("NAV fetch failed", e);
+  }
+}
 
+    function renderNav(n){
+  try{
     if(!n.latitude || !n.longitude) return;
 
     // Update NAV text fields
@@ -7143,7 +6782,7 @@ mapWeather.panTo([n.latitude, n.longitude], { animate: true });
 
 
   }catch(e){
-    console.error("NAV fetch failed", e);
+    console.error("NAV render failed", e);
   }
 }
 
@@ -7151,7 +6790,14 @@ mapWeather.panTo([n.latitude, n.longitude], { animate: true });
     async function fetchWeatherData(){
   try{
     const res = await fetch("/weather_data");
-    const j = await res.json();
+    renderWeather(await res.json());
+  }catch(e){
+    console.error("Weather fetch failed", e);
+  }
+}
+
+    function renderWeather(j){
+  try{
 
     document.getElementById("wspd").innerText  = j.wind_speed ?? "--";
     document.getElementById("wdir").innerText  = j.wind_direction ?? "--";
@@ -7171,10 +6817,50 @@ mapWeather.panTo([n.latitude, n.longitude], { animate: true });
     }
 
   }catch(e){
-    console.error("Weather fetch failed", e);
+    console.error("Weather render failed", e);
   }
 }
 
+    // Live push: one SSE connection replaces the NAV/weather/status polling.
+    // Each event carries only the keys that changed ({v}), or a full snapshot ({full, v}).
+    const liveState = {};
+    const liveRender = {
+      nav: (v)=>renderNav(v),
+      weather: (v)=>renderWeather(v),
+      camera: (v)=>renderCameraStatus(v),
+      sync: (v)=>renderSyncStatus(v)
+    };
+    let pollTimers = [];
+
+    function startPolling(){
+      if (pollTimers.length) return;
+      pollTimers = [setInterval(fetchNavigationData, 1000), setInterval(fetchWeatherData, 2000)];
+      fetchNavigationData(); fetchWeatherData();
+    }
+
+    function stopPolling(){
+      pollTimers.forEach(clearInterval);
+      pollTimers = [];
+    }
+
+    function startLiveStream(){
+      if (!window.EventSource) return startPolling();
+      const es = new EventSource("/api/stream");
+      Object.keys(liveRender).forEach((ch)=>{
+        es.addEventListener(ch, (ev)=>{
+          const msg = JSON.parse(ev.data);
+          liveState[ch] = msg.full ? msg.v : Object.assign({}, liveState[ch] || {}, msg.v);
+          liveRender[ch](liveState[ch]);
+        });
+      });
+      es.onopen = ()=>stopPolling();
+      es.onerror = ()=>{
+        // EventSource retries by itself; poll meanwhile so the screen never freezes.
+        startPolling();
+        if (es.readyState === EventSource.CLOSED) setTimeout(startLiveStream, 5000);
+      };
+    }
+
 
     // Export VJR PDF
     async function exportVJRPDF(){
@@ -7189,12 +6875,20 @@ mapWeather.panTo([n.latitude, n.longitude], { animate: true });
         arrival: document.getElementById("vjr_arrival").value
       };
 
-      // take nav samples from the live endpoint (most recent)
+      // decimated track of the last 24 h (newest first), as rows for the PDF table
       let nav = [];
       try{
-        const resNav = await fetch("/nav_data");
+        const resNav = await fetch("/api/nav/track?max_points=40&fields=speed,cog");
         const jNav = await resNav.json().catch(()=>({}));
-        nav = (jNav.history || []).slice(0, 40);
+        const fmt = (v, d) => (v ?? "") === "" ? "" : Number(v).toFixed(d);
+        nav = (jNav.points || []).reverse().map(([ts, lat, lon, hdg, spd, cog])=>{
+          const t = new Date(ts * 1000);
+          return {
+            date: t.toLocaleDateString(), time: t.toLocaleTimeString(),
+            latitude: fmt(lat, 6), longitude: fmt(lon, 6),
+            speed: fmt(spd, 1), cog: fmt(cog, 0)
+          };
+        });
       }catch(e){}
 
       try{
@@ -7432,9 +7126,8 @@ mapWeather.panTo([n.latitude, n.longitude], { animate: true });
     loadCapturedImages();
     loadVDRList();
 
-    setInterval(fetchNavigationData, 1000);
-    setInterval(fetchWeatherData, 2000);
     fetchNavigationData(); fetchWeatherData();
+    startLiveStream();
   /* ================= PTZ JOYSTICK LOGIC ================= */
 
 let joyActive = false;
@@ -7486,10 +7179,6 @@ document.addEventListener("DOMContentLoaded", () => {
     stick.style.transform = "translate(-50%, -50%)";
   });
 });
-document.addEventListener("DOMContentLoaded", () => {
-    fetchWeatherData();
-    setInterval(fetchWeatherData, 2000);
-  });
   let currentConnMode = "auto";
 
 /* ---- Refresh connectivity status ---- */
@@ -7526,7 +7215,7 @@ function refreshConnectivity(){
 
       // Active path
       document.getElementById("active_path").innerText =
-        d.active_path || "None";
+        d.active_path ? d.active_path + (d.uplink && d.uplink.interface ? " (" + d.uplink.interface + ")" : "") : "None";
 
       // Policy
       currentConnMode = d.policy?.mode || "auto";
@@ -7545,15 +7234,19 @@ function refreshConnectivity(){
 function refreshSyncStatus(){
   fetch("/api/sync/status")
     .then(r => r.json())
-    .then(d => {
-      document.getElementById("sync_pending").innerText =
-        d.pending_records;
-      document.getElementById("sync_last").innerText =
-        d.last_sync || "--";
-    })
+    .then(renderSyncStatus)
     .catch(()=>{});
 }
 
+function renderSyncStatus(d){
+  const deferred = (d.deferred || []).length ? ` (${d.deferred.join(", ")} wait for a cheaper link)` : "";
+  const images = d.captures && d.captures.pending ? ` + ${d.captures.pending} image(s) to upload` : "";
+  document.getElementById("sync_pending").innerText =
+    d.pending_records + images + deferred;
+  document.getElementById("sync_last").innerText =
+    d.last_sync || "--";
+}
+
 function requestSync(){
   fetch("/api/sync/start", {method:"POST"})
     .then(r => r.json())
@@ -7672,7 +7365,15 @@ threading.Thread(
 
 if __name__ == "__main__":
     init_camera()
+    # Background workers start here, not at import: benchmarks and tools that
+    # `import rpi` must not migrate the ship DB or talk to the uplink, and the
+    # uplink threads call helpers defined further down this module.
+    threading.Thread(target=schema_maintenance_worker, daemon=True).start()
+    threading.Thread(target=rollup_worker, daemon=True).start()
+    threading.Thread(target=recover_nav_segments, daemon=True).start()
+    connectivity.start()
+    sync_engine.start()
+    firebase_writer.start()
+    capture_uploader.start()
     app.run(host="0.0.0.0", port=5000, debug=False)
 
-
-